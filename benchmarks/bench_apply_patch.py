@@ -0,0 +1,81 @@
+"""
+Compares the output tokens and latency of an edit made through `apply_patch`
+(a unified diff) with rewriting the whole file through `write_to_file`, for
+some of the repository's own source files.
+
+Latency = time to generate the tool call's arguments at GENERATION_TOKENS_PER_SECOND
+plus the measured time of the tool itself.
+
+    uv run python benchmarks/bench_apply_patch.py
+"""
+import difflib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from context_budget import count_tokens
+from tools import apply_patch, write_to_file
+
+GENERATION_TOKENS_PER_SECOND = 60
+FILES = ["config.py", "file_reader.py", "tools.py", "pty_manager.py", "magi.py"]
+EDITS_PER_FILE = 3
+
+
+def edited(text, rng):
+    """`text` with a few lines changed or inserted, like a typical agent edit."""
+    lines = text.splitlines(keepends=True)
+    for _ in range(EDITS_PER_FILE):
+        i = rng.randrange(len(lines))
+        if rng.random() < 0.5:
+            lines[i] = lines[i].rstrip("\n") + "  # reviewed\n"
+        else:
+            lines.insert(i, "# TODO: revisit this block\n")
+    return "".join(lines)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    rng = random.Random(0)
+    print(f"{'file':>16} {'lines':>6} {'write tokens':>13} {'patch tokens':>13} "
+          f"{'write ms':>9} {'patch ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in FILES:
+            with open(os.path.join(ROOT, name), encoding="utf-8") as f:
+                original = f.read()
+            new = edited(original, rng)
+            target = os.path.join(tmp, name)
+            patch = "".join(difflib.unified_diff(original.splitlines(True), new.splitlines(True),
+                                                 f"a/{name}", f"b/{name}"))
+
+            write_tokens = count_tokens(json.dumps({"path": target, "content": new}))
+            patch_tokens = count_tokens(json.dumps({"path": target, "patch": patch}))
+
+            shutil.copy(os.path.join(ROOT, name), target)
+            _, write_tool_ms = timed(write_to_file, target, new)
+            shutil.copy(os.path.join(ROOT, name), target)
+            result, patch_tool_ms = timed(apply_patch, patch, target)
+            assert result.startswith("Patched"), result
+            with open(target, encoding="utf-8") as f:
+                assert f.read() == new
+
+            write_ms = write_tokens * 1000 / GENERATION_TOKENS_PER_SECOND + write_tool_ms
+            patch_ms = patch_tokens * 1000 / GENERATION_TOKENS_PER_SECOND + patch_tool_ms
+            print(f"{name:>16} {original.count(chr(10)):>6} {write_tokens:>13} {patch_tokens:>13} "
+                  f"{write_ms:>9.0f} {patch_ms:>9.0f}")
+    print(f"(generation at {GENERATION_TOKENS_PER_SECOND} tokens/s; tool time measured)")
+
+
+if __name__ == "__main__":
+    main()
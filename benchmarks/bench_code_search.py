@@ -0,0 +1,100 @@
+"""
+Compares repeated queries through the indexed in-process search (the `grep`
+tool) against ripgrep, or `grep -rn` when ripgrep isn't installed, on a
+synthetic workspace or on a directory given as argument.
+
+    uv run python benchmarks/bench_code_search.py [directory]
+"""
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_search import CodeSearch
+
+FILES = 3000
+LINES_PER_FILE = 300
+RUNS = 5
+QUERIES = [
+    ("rare literal", "handler_2718_x", True),
+    ("regex", r"def process_\d+_item\(", False),
+    ("common word", "return", False),
+]
+WORDS = ["value", "result", "item", "config", "buffer", "index", "state", "count", "name", "path"]
+
+
+def make_workspace(root):
+    rng = random.Random(0)
+    for i in range(FILES):
+        directory = os.path.join(root, f"pkg{i % 50}")
+        os.makedirs(directory, exist_ok=True)
+        lines = []
+        for j in range(LINES_PER_FILE):
+            a, b = rng.sample(WORDS, 2)
+            kind = rng.random()
+            if kind < 0.05:
+                lines.append(f"def process_{i}_{a}(self, {b}):")
+            elif kind < 0.3:
+                lines.append(f"    return {a}_{j} + {b}")
+            else:
+                lines.append(f"    {a}_{rng.randrange(10000)} = {b}.get('{a}', {j})")
+        if i == FILES // 2:
+            lines.append("handler_2718_x = None")
+        with open(os.path.join(directory, f"mod{i}.py"), "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def external_search(root, pattern, literal):
+    if shutil.which("rg"):
+        cmd = ["rg", "-n", "-m", "50", "-F" if literal else "-e", pattern, root]
+    else:
+        regex = pattern.replace(r"\d", "[0-9]")
+        cmd = ["grep", "-rn", "-m", "50", "-F" if literal else "-E", regex, root]
+    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def median_ms(func):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return sorted(times)[RUNS // 2]
+
+
+def run(root):
+    search = CodeSearch()
+    start = time.perf_counter()
+    search.search("warmup", root)
+    print(f"initial index build: {(time.perf_counter() - start) * 1000:.0f} ms")
+    tool = "rg" if shutil.which("rg") else "grep -rn"
+    print(f"{'query':>14} {tool + ' (ms)':>14} {'indexed (ms)':>13} {'after a command (ms)':>21}")
+    for label, pattern, literal in QUERIES:
+        external = median_ms(lambda: external_search(root, pattern, literal))
+        indexed = median_ms(lambda: search.search(pattern, root, literal=literal, max_results=50))
+
+        def after_command():
+            # A command may have changed anything: the query walks the tree again
+            search.invalidate()
+            search.search(pattern, root, literal=literal, max_results=50)
+
+        walked = median_ms(after_command)
+        print(f"{label:>14} {external:>14.1f} {indexed:>13.1f} {walked:>21.1f}")
+
+
+def main():
+    if len(sys.argv) > 1:
+        run(os.path.abspath(sys.argv[1]))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        make_workspace(tmp)
+        run(tmp)
+
+
+if __name__ == "__main__":
+    main()
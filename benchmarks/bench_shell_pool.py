@@ -0,0 +1,39 @@
+"""
+Compares run_command throughput with the warm shell pool against spawning a
+fresh PTY and bash for every command.
+
+    uv run python benchmarks/bench_shell_pool.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pty_manager import CommandManager
+
+COMMANDS = ("true", "echo hello", "ls /")
+RUNS_PER_COMMAND = 200
+
+
+def bench(manager, command):
+    manager.run(command, timeout=5)
+    start = time.perf_counter()
+    for _ in range(RUNS_PER_COMMAND):
+        manager.run(command, timeout=5)
+    return RUNS_PER_COMMAND / (time.perf_counter() - start)
+
+
+def main():
+    fork = CommandManager(use_shell_pool=False)
+    pooled = CommandManager(use_shell_pool=True)
+    print(f"{'command':>12} {'fork (cmds/s)':>14} {'pool (cmds/s)':>14}")
+    for command in COMMANDS:
+        print(f"{command:>12} {bench(fork, command):>14.0f} {bench(pooled, command):>14.0f}")
+    pool = pooled.shell_pool
+    print(f"pool: {pool.hits} warm starts, {pool.spawned} shells spawned")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Compares the per-save cost of the journaled agent state against the legacy
+full JSON rewrite as the history grows.
+
+    uv run python benchmarks/bench_state_journal.py
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from state_journal import StateJournal
+
+MESSAGE = {"role": "user", "content": "Tool 'read_file' Output:\n" + "some file line\n" * 40}
+SAVES_PER_SIZE = 50
+
+
+def legacy_save(path, state):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=4)
+
+
+def bench(history_size, tmp):
+    history = [dict(MESSAGE) for _ in range(history_size)]
+    state = {"name": "Bench", "description": "", "status": "RUNNING", "stm": [], "stm_content": "", "history": history}
+
+    legacy_path = os.path.join(tmp, f"legacy_{history_size}.json")
+    start = time.perf_counter()
+    for _ in range(SAVES_PER_SIZE):
+        history.append(dict(MESSAGE))
+        legacy_save(legacy_path, state)
+    legacy_ms = (time.perf_counter() - start) * 1000 / SAVES_PER_SIZE
+
+    del history[history_size:]
+    journal = StateJournal(os.path.join(tmp, f"journal_{history_size}_state.json"), compact_every=10**9)
+    journal.save(state)
+    start = time.perf_counter()
+    for _ in range(SAVES_PER_SIZE):
+        history.append(dict(MESSAGE))
+        journal.save(state)
+    journal_ms = (time.perf_counter() - start) * 1000 / SAVES_PER_SIZE
+    return legacy_ms, journal_ms
+
+
+def main():
+    print(f"{'history':>8} {'full rewrite (ms/save)':>24} {'journal (ms/save)':>19}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (50, 100, 250, 500, 1000, 2000):
+            legacy_ms, journal_ms = bench(size, tmp)
+            print(f"{size:>8} {legacy_ms:>24.3f} {journal_ms:>19.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+import os
+import re
+import stat
+import time
+import threading
+from array import array
+from collections import OrderedDict
+from re import _parser
+from config import CODE_SEARCH_MAX_FILE_BYTES, CODE_SEARCH_MAX_INDEXES, CODE_SEARCH_REFRESH_INTERVAL
+
+# Directories that are never searched, besides hidden ones
+SKIP_DIRS = {"node_modules", "__pycache__"}
+# Longer lines are cut in results (minified files would flood the context)
+MAX_LINE_CHARS = 500
+
+_BINARY = -1
+
+
+def _skipped(rel: str) -> bool:
+    """Whether the walk of an index skips the relative path `rel` (hidden or in SKIP_DIRS)."""
+    return any(part.startswith(".") or part in SKIP_DIRS for part in rel.split(os.sep))
+
+
+def required_literals(pattern: str, flags: int = 0) -> list:
+    """
+    Literal strings that every match of the regex `pattern` must contain.
+
+    Only runs of plain characters that are always part of a match count;
+    anything inside an alternation, a class or an optional part is ignored.
+    Returns an empty list when nothing is required or the pattern can't be parsed.
+    """
+    try:
+        parsed = _parser.parse(pattern, flags)
+    except Exception:
+        return []
+    runs = []
+    _collect_literals(parsed, runs)
+    return [run for run in runs if run]
+
+
+def _collect_literals(items, runs):
+    run = []
+    for op, arg in items:
+        if op is _parser.LITERAL:
+            run.append(chr(arg))
+            continue
+        runs.append("".join(run))
+        run = []
+        if op is _parser.SUBPATTERN:
+            # A scoped (?i:...) group isn't in the compiled flags, so its literals can't be trusted for case
+            if not arg[1] & re.IGNORECASE:
+                _collect_literals(arg[-1], runs)
+        elif op in (_parser.MAX_REPEAT, _parser.MIN_REPEAT) and arg[0] >= 1:
+            _collect_literals(arg[2], runs)
+    runs.append("".join(run))
+
+
+def _trigrams(data: bytes) -> set:
+    data = data.lower()
+    return {data[i:i + 3] for i in range(len(data) - 2)}
+
+
+class TrigramIndex:
+    """
+    Trigram index of the text files under one directory.
+
+    Every file gets an integer id; for each trigram of its (ASCII-lowercased)
+    bytes the index keeps an array of the ids of the files containing it. A
+    query only opens the files that contain all trigrams of the literals its
+    pattern requires.
+
+    `refresh()` compares every file's mtime and size with what was indexed and
+    re-reads only files that changed. That walk is what a query costs, so
+    `ensure_fresh()` trusts a walk for a few seconds and in between re-checks
+    only the files reported through `mark_changed()`; `expire()` forces the
+    next query to walk again. A changed or deleted file's old id is
+    left in the posting arrays and filtered out at query time; the arrays are
+    compacted once dead ids outnumber live ones. Files larger than
+    `max_file_bytes` are not indexed and always scanned; binary files are skipped.
+    """
+
+    def __init__(self, root: str, max_file_bytes: int = CODE_SEARCH_MAX_FILE_BYTES):
+        self.root = root
+        self.max_file_bytes = max_file_bytes
+        # relative path -> (id, mtime_ns, size)
+        self._files = {}
+        # live id -> relative path
+        self._paths = {}
+        self._postings = {}
+        self._unindexed = set()
+        self._next_id = 0
+        self._dead = 0
+        self._refreshed_at = None
+        self._changed = set()
+        self.lock = threading.Lock()
+
+    def _walk(self):
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS:
+                            stack.append(entry.path)
+                    elif entry.is_file():
+                        yield entry.path, entry.stat()
+                except OSError:
+                    continue
+
+    def ensure_fresh(self, interval: float = CODE_SEARCH_REFRESH_INTERVAL):
+        """
+        Walks the tree if the last walk is older than `interval` seconds (or was expired),
+        otherwise re-checks only the files marked as changed. Call with `lock` held.
+        """
+        if self._refreshed_at is None or time.monotonic() - self._refreshed_at >= interval:
+            self.refresh()
+        else:
+            changed, self._changed = self._changed, set()
+            for rel in changed:
+                self._refresh_file(rel)
+
+    def mark_changed(self, path: str):
+        """Notes that the file at absolute `path` was written or deleted; the next query re-checks it."""
+        rel = os.path.relpath(path, self.root)
+        if rel.startswith(os.pardir) or _skipped(rel):
+            return
+        with self.lock:
+            self._changed.add(rel)
+
+    def expire(self):
+        """Makes the next query walk the whole tree (e.g. after a command that may have changed anything)."""
+        self._refreshed_at = None
+
+    def _refresh_file(self, rel):
+        path = os.path.join(self.root, rel)
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        known = self._files.get(rel)
+        if st is None or not stat.S_ISREG(st.st_mode):
+            if known is not None:
+                self._forget(rel)
+            return
+        if known is not None:
+            if known[1] == st.st_mtime_ns and known[2] == st.st_size:
+                return
+            self._forget(rel)
+        self._add(rel, path, st)
+
+    def refresh(self):
+        """Brings the index up to date with the files on disk. Call with `lock` held."""
+        # Taken before the walk: whatever changes during it is seen by the next one
+        self._refreshed_at = time.monotonic()
+        self._changed.clear()
+        seen = set()
+        prefix = len(self.root) + 1
+        for path, st in self._walk():
+            rel = path[prefix:]
+            seen.add(rel)
+            known = self._files.get(rel)
+            if known is not None and known[1] == st.st_mtime_ns and known[2] == st.st_size:
+                continue
+            if known is not None:
+                self._forget(rel)
+            self._add(rel, path, st)
+        for rel in [rel for rel in self._files if rel not in seen]:
+            self._forget(rel)
+        if self._dead > max(1024, len(self._paths)):
+            self._compact()
+
+    def _add(self, rel, path, st):
+        if st.st_size > self.max_file_bytes:
+            file_id = self._new_id(rel)
+            self._unindexed.add(file_id)
+        else:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                return
+            if b"\0" in data[:8192]:
+                file_id = _BINARY
+            else:
+                file_id = self._new_id(rel)
+                for trigram in _trigrams(data):
+                    posting = self._postings.get(trigram)
+                    if posting is None:
+                        posting = self._postings[trigram] = array("I")
+                    posting.append(file_id)
+        self._files[rel] = (file_id, st.st_mtime_ns, st.st_size)
+
+    def _new_id(self, rel):
+        file_id = self._next_id
+        self._next_id += 1
+        self._paths[file_id] = rel
+        return file_id
+
+    def _forget(self, rel):
+        file_id = self._files.pop(rel)[0]
+        if file_id >= 0:
+            del self._paths[file_id]
+            if file_id in self._unindexed:
+                self._unindexed.discard(file_id)
+            else:
+                self._dead += 1
+
+    def _compact(self):
+        live = self._paths
+        for trigram, posting in list(self._postings.items()):
+            kept = array("I", (file_id for file_id in posting if file_id in live))
+            if kept:
+                self._postings[trigram] = kept
+            else:
+                del self._postings[trigram]
+        self._dead = 0
+
+    def candidates(self, literals, ignore_case=False) -> list:
+        """Relative paths of the files that may match, given the literals a match requires."""
+        trigrams = set()
+        for literal in literals:
+            for trigram in _trigrams(literal.encode("utf-8")):
+                # ASCII lowercasing can't fold other scripts, so their trigrams can't filter ignore-case queries
+                if not ignore_case or trigram.isascii():
+                    trigrams.add(trigram)
+
+        if trigrams:
+            postings = sorted((self._postings.get(t, ()) for t in trigrams), key=len)
+            ids = set(postings[0])
+            for posting in postings[1:]:
+                if not ids:
+                    break
+                ids.intersection_update(posting)
+            ids.intersection_update(self._paths)
+            ids.update(self._unindexed)
+        else:
+            ids = self._paths
+        return sorted(self._paths[file_id] for file_id in ids)
+
+
+class CodeSearch:
+    """
+    In-process regex and literal search over directory trees.
+
+    Keeps one `TrigramIndex` per searched root (the `max_indexes` most recently
+    used ones). A search below an indexed root reuses that root's index, unless
+    the searched directory is one that index skips (hidden or in SKIP_DIRS);
+    such a directory gets an index of its own.
+
+    An index is trusted for `CODE_SEARCH_REFRESH_INTERVAL` seconds between
+    walks. The file tools report what they write with `file_changed()`, and the
+    command tools call `invalidate()`, since a command may change any file.
+    """
+
+    def __init__(self, max_indexes: int = CODE_SEARCH_MAX_INDEXES):
+        self.max_indexes = max_indexes
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _covers(root, directory):
+        """Whether the index of `root` includes `directory`."""
+        if directory == root:
+            return True
+        return directory.startswith(root + os.sep) and not _skipped(directory[len(root) + 1:])
+
+    def _index_for(self, directory):
+        with self._lock:
+            for root, index in self._indexes.items():
+                if self._covers(root, directory):
+                    self._indexes.move_to_end(root)
+                    return index
+            # A new root replaces the indexes of the subdirectories it covers
+            for root in [root for root in self._indexes if self._covers(directory, root)]:
+                del self._indexes[root]
+            index = self._indexes[directory] = TrigramIndex(directory)
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+            return index
+
+    def _indexes_holding(self, path):
+        with self._lock:
+            return [index for root, index in self._indexes.items() if path.startswith(root + os.sep)]
+
+    def file_changed(self, path: str):
+        """Tells the indexes holding `path` that the file was written or deleted."""
+        path = os.path.abspath(path)
+        for index in self._indexes_holding(path):
+            index.mark_changed(path)
+
+    def invalidate(self):
+        """Makes every index walk its tree on the next query."""
+        with self._lock:
+            indexes = list(self._indexes.values())
+        for index in indexes:
+            index.expire()
+
+    def search(self, pattern, path, literal=False, ignore_case=False, context=0, max_results=50) -> dict:
+        """
+        Finds the lines matching `pattern` under `path` (a directory or a file).
+
+        Args:
+            pattern (str): Regular expression, or plain text when `literal` is set.
+            path (str): Absolute path of a directory or file.
+            literal (bool): Match `pattern` as plain text.
+            ignore_case (bool): Case-insensitive matching.
+            context (int): Lines of context before and after each hit.
+            max_results (int): Stop after this many matching lines.
+
+        Returns:
+            {"matches": [{"file", "line", "text", "before", "after"}, ...], "truncated": bool}.
+            Raises `re.error` for an invalid pattern.
+        """
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        if literal:
+            pattern = re.escape(pattern)
+        regex = re.compile(pattern, flags)
+
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            index = self._index_for(path)
+            with index.lock:
+                index.ensure_fresh()
+                # Inline (?i) flags make the search case-insensitive too
+                files = index.candidates(required_literals(pattern, flags), bool(regex.flags & re.IGNORECASE))
+            root = index.root
+            if path != root:
+                below = os.path.relpath(path, root) + os.sep
+                files = [rel for rel in files if rel.startswith(below)]
+        else:
+            root, files = os.path.dirname(path), [os.path.basename(path)]
+
+        matches = []
+        for rel in files:
+            if _scan_file(os.path.join(root, rel), regex, context, max_results - len(matches), matches):
+                return {"matches": matches, "truncated": True}
+        return {"matches": matches, "truncated": False}
+
+
+def _scan_file(path, regex, context, limit, matches):
+    """Appends the hits of `regex` in `path` to `matches`. Returns True once `limit` hits were added."""
+    try:
+        with open(path, "rb") as f:
+            text = f.read().decode("utf-8", errors="replace")
+    except OSError:
+        return False
+    display = os.path.relpath(path) if path.startswith(os.getcwd() + os.sep) else path
+
+    line_no = 1
+    counted = 0
+    pos = 0
+    while True:
+        match = regex.search(text, pos)
+        if match is None:
+            return False
+        start = text.rfind("\n", 0, match.start()) + 1
+        end = text.find("\n", match.start())
+        end = len(text) if end < 0 else end
+        line_no += text.count("\n", counted, start)
+        counted = start
+        hit = {"file": display, "line": line_no, "text": _cut(text[start:end])}
+        if context:
+            hit["before"] = _lines_before(text, start, context)
+            hit["after"] = _lines_after(text, end, context)
+        matches.append(hit)
+        if len(matches) >= limit:
+            return True
+        pos = end + 1
+        if pos > len(text):
+            return False
+
+
+def _cut(line):
+    line = line.rstrip("\r")
+    return line if len(line) <= MAX_LINE_CHARS else line[:MAX_LINE_CHARS] + "..."
+
+
+def _lines_before(text, start, n):
+    lines = []
+    while n and start > 0:
+        prev = text.rfind("\n", 0, start - 1) + 1
+        lines.append(_cut(text[prev:start - 1]))
+        start = prev
+        n -= 1
+    return lines[::-1]
+
+
+def _lines_after(text, end, n):
+    lines = []
+    while n and end < len(text) - 1:
+        nxt = text.find("\n", end + 1)
+        nxt = len(text) if nxt < 0 else nxt
+        lines.append(_cut(text[end + 1:nxt]))
+        end = nxt
+        n -= 1
+    return lines
+
+
+# Module-level singleton
+code_search = CodeSearch()
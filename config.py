@@ -1,6 +1,61 @@
 SHOW_THOUGHTS = True
 SHOW_TOOL_CALLS = False
 USER_NAME = "Kelsier"
-SUMMARIZE_THRESHOLD = 15
 MESSAGE_LOG_PATH = "messages_log/"
-MAX_STM_LENGTH = 1500
\ No newline at end of file
+# Token budgets that trigger summarization / STM compression
+HISTORY_TOKEN_BUDGET = 20000
+STM_TOKEN_BUDGET = 400
+CONTEXT_TOKEN_BUDGET = 100000
+MAX_CONCURRENT_LLM_REQUESTS = 4
+STATE_COMPACT_EVERY = 200
+STATE_FLUSH_INTERVAL = 1.0
+STATE_MAX_PENDING_SAVES = 100
+# Tool calls of one step run concurrently on a shared pool
+MAX_PARALLEL_TOOL_CALLS = 4
+TOOL_CALL_TIMEOUT = 120
+TOOL_WORKER_THREADS = 16
+# Per-command output: newest bytes kept in memory, older ones spilled to a temp file
+COMMAND_OUTPUT_MEMORY_BYTES = 256 * 1024
+COMMAND_OUTPUT_SPILL_BYTES = 16 * 1024 * 1024
+# Output lines included when a backgrounded command reports its completion
+COMPLETION_TAIL_LINES = 20
+# Opt-in pool of warm bash sessions for run_command (per working directory)
+SHELL_POOL_ENABLED = False
+SHELL_POOL_SIZE = 2
+SHELL_POOL_MAX_USES = 100
+# Leading lines kept when command output is cut to its line limit; the rest are the newest lines
+COMMAND_OUTPUT_HEAD_LINES = 10
+# In-process code search (grep tool): trigram indexes kept per searched root
+CODE_SEARCH_MAX_INDEXES = 4
+CODE_SEARCH_MAX_FILE_BYTES = 2 * 1024 * 1024
+CODE_SEARCH_MAX_RESULTS = 50
+# read_file: line indexes cached for the most recently read files, and the bytes returned per call
+READ_FILE_INDEX_CACHE = 32
+READ_FILE_MAX_BYTES = 32 * 1024
+# apply_patch: context lines a hunk may drop from each end when it does not match exactly
+PATCH_MAX_FUZZ = 2
+# LTM retrieval: visible memories relevant to the recent conversation are injected into the prompt
+LTM_TOP_K = 3
+LTM_TOKEN_BUDGET = 1500
+# Recent messages used as the retrieval query
+LTM_QUERY_MESSAGES = 6
+LTM_EMBEDDING_DIM = 256
+# Share of the embedding similarity in the relevance score (the rest is BM25)
+LTM_VECTOR_WEIGHT = 0.3
+# Short-term memory store: entry cap, lifetime in seconds (x (priority + 1)), near-duplicate threshold
+STM_MAX_ENTRIES = 50
+STM_ENTRY_TTL = 24 * 3600
+STM_DEDUP_SIMILARITY = 0.8
+# Background history summarization: worker threads, and messages kept verbatim after a summary
+SUMMARY_WORKER_THREADS = 2
+SUMMARY_KEEP_MESSAGES = 8
+# Summaries per tree level before the oldest ones are rolled up into one summary a level higher
+SUMMARY_FANOUT = 4
+# LLM response cache: in-memory LRU bounds, optional directory persisting entries, call kinds never cached
+LLM_CACHE_MAX_ENTRIES = 512
+LLM_CACHE_MAX_BYTES = 32 * 1024 * 1024
+LLM_CACHE_DIR = None
+LLM_CACHE_DISK_MAX_BYTES = 256 * 1024 * 1024
+LLM_CACHE_BYPASS = ()
+# Seconds a search index is trusted without walking its tree; file tools and commands invalidate it sooner
+CODE_SEARCH_REFRESH_INTERVAL = 2.0
\ No newline at end of file
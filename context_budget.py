@@ -0,0 +1,124 @@
+import json
+import threading
+from collections import OrderedDict
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Framing tokens the chat format adds around every message (role, separators)
+MESSAGE_OVERHEAD = 4
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    # o-series models use the o200k vocabulary
+                    _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception:
+                    _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text) -> int:
+    """
+    Counts the tokens in a string.
+    Uses tiktoken when installed, otherwise estimates ~4 characters per token.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+class TokenCounter:
+    """
+    Token counts with a per-text cache, so a message is tokenized once no
+    matter how many prompts it ends up in.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, text) -> int:
+        if not text:
+            return 0
+        with self._lock:
+            n = self._cache.get(text)
+            if n is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return n
+        n = count_tokens(text)
+        with self._lock:
+            self.misses += 1
+            self._cache[text] = n
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return n
+
+    def count_message(self, message: dict) -> int:
+        """Tokens of one chat message including its framing."""
+        content = message.get("content")
+        if content is not None and not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        n = MESSAGE_OVERHEAD + self.count(content) + self.count(message.get("name"))
+        if message.get("tool_calls"):
+            n += self.count(json.dumps(message["tool_calls"], ensure_ascii=False))
+        return n
+
+    def count_messages(self, messages) -> int:
+        return sum(self.count_message(m) for m in messages)
+
+
+class PromptCacheStats:
+    """
+    Instrumentation for provider-side prompt caching.
+
+    Records whether the cacheable prefix of each request was byte-identical to
+    the previous one, and how many prompt tokens the API reported as served
+    from its cache (`usage.prompt_tokens_details.cached_tokens`).
+    """
+
+    def __init__(self):
+        self._last_prefix = None
+        self.requests = 0
+        self.stable_prefixes = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def record_prefix(self, prefix: str):
+        if self._last_prefix is not None and prefix == self._last_prefix:
+            self.stable_prefixes += 1
+        self._last_prefix = prefix
+        self.requests += 1
+
+    def record_usage(self, usage):
+        if usage is None:
+            return
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_tokens += getattr(details, "cached_tokens", 0) or 0
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests,
+            "stable_prefixes": self.stable_prefixes,
+            "prefix_stability": self.stable_prefixes / (self.requests - 1) if self.requests > 1 else None,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cached_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else None,
+        }
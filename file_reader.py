@@ -0,0 +1,124 @@
+import mmap
+import os
+import stat
+import threading
+from collections import OrderedDict
+from line_index import LineIndex
+from config import READ_FILE_INDEX_CACHE, READ_FILE_MAX_BYTES
+
+# Bytes fed to the line index per step on the first scan of a file
+_SCAN_CHUNK = 4 * 1024 * 1024
+# Bytes read from a file that can't be mapped (procfs/sysfs, FIFOs, devices); the rest is not seen
+_STREAM_MAX_BYTES = 8 * 1024 * 1024
+
+
+class FileReader:
+    """
+    Line-range reads of files through `mmap`.
+
+    The first read of a file scans it once into a sparse `LineIndex`; the index
+    is cached per path together with the file's mtime and size, for the
+    `max_files` most recently read files. Later reads jump to the nearest
+    checkpoint and touch only the requested range, so reading lines 100-150
+    of a 2 GB log does not load the log.
+
+    Files that can't be mapped are read as a stream instead, up to
+    `_STREAM_MAX_BYTES`: procfs/sysfs entries (which report a size of 0),
+    FIFOs and devices.
+    """
+
+    def __init__(self, max_files: int = READ_FILE_INDEX_CACHE):
+        self.max_files = max_files
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index(self, path, st, mm):
+        key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._indexes.get(path)
+            if cached is not None and cached[0] == key:
+                self._indexes.move_to_end(path)
+                return cached[1]
+
+        index = LineIndex()
+        for offset in range(0, len(mm), _SCAN_CHUNK):
+            index.feed(mm[offset:offset + _SCAN_CHUNK])
+
+        with self._lock:
+            self._indexes[path] = (key, index)
+            self._indexes.move_to_end(path)
+            while len(self._indexes) > self.max_files:
+                self._indexes.popitem(last=False)
+        return index
+
+    def read_lines(self, path, start_line=1, end_line=None, max_bytes=READ_FILE_MAX_BYTES):
+        """
+        Reads lines `start_line`..`end_line` (1-indexed, inclusive) of a file.
+
+        Args:
+            path (str): Absolute path of the file.
+            start_line (int): First line to read.
+            end_line (int): Last line to read; None for the end of the file.
+            max_bytes (int): Stop before the line that would exceed this many bytes.
+                A first line longer than that is cut.
+
+        Returns:
+            (text, start_line, last_line, total_lines, truncated, cut_line_bytes): `last_line`
+            is the last line included (`start_line - 1` for an empty file); `truncated` is True
+            when `max_bytes` stopped the read before the clamped `end_line` or cut the first
+            line. `cut_line_bytes` is the full length of a first line that was cut, else None.
+            Raises ValueError when `start_line` is after `end_line`.
+        """
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if stat.S_ISREG(st.st_mode) and st.st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return self._slice(mm, self._index(path, st, mm), start_line, end_line, max_bytes)
+            data = f.read(_STREAM_MAX_BYTES)
+        if not data:
+            return "", start_line, start_line - 1, 0, False, None
+        # Not cached: the content of such a file can change without its mtime or size changing
+        index = LineIndex()
+        index.feed(data)
+        return self._slice(data, index, start_line, end_line, max_bytes)
+
+    def _slice(self, buf, index, start_line, end_line, max_bytes):
+        """read_lines() over `buf` (an mmap or bytes) and its line index."""
+        total = index.line_count
+        start_line = max(1, start_line)
+        end_line = total if end_line is None else min(end_line, total)
+        if start_line > end_line:
+            raise ValueError(f"Start line {start_line} is greater than end line {end_line}.")
+
+        start = self._line_start(buf, index, start_line - 1)
+        limit = start + max_bytes
+        pos, last = start, start_line - 1
+        truncated = False
+        cut_line_bytes = None
+        while last < end_line:
+            newline = buf.find(b"\n", pos)
+            stop = len(buf) if newline < 0 else newline + 1
+            if stop > limit:
+                truncated = True
+                if last < start_line:
+                    # Even the first line is over budget; show what fits of it
+                    cut_line_bytes = (len(buf) if newline < 0 else newline) - start
+                    pos, last = limit, start_line
+                break
+            pos, last = stop, last + 1
+        data = buf[start:pos]
+
+        text = data.decode("utf-8", errors="replace").replace("\r\n", "\n")
+        return text, start_line, last, total, truncated, cut_line_bytes
+
+    @staticmethod
+    def _line_start(mm, index, line):
+        offset, skip = index.locate(line)
+        while skip > 0:
+            offset = mm.find(b"\n", offset) + 1
+            skip -= 1
+        return offset
+
+
+# Module-level singleton
+file_reader = FileReader()
@@ -0,0 +1,68 @@
+import re
+from array import array
+from bisect import bisect_left
+from itertools import islice
+
+_NEWLINE = re.compile(b"\n")
+
+
+class LineIndex:
+    """
+    Sparse line-offset index of a byte stream, built incrementally.
+
+    Only the start offset of every `stride`-th line is stored, so the index
+    costs 8 bytes per `stride` lines. Finding line `n` jumps to the nearest
+    checkpoint at or before it and leaves fewer than `stride` lines to skip.
+
+    Lines are 0-indexed. Offsets are absolute positions in the stream, so the
+    same index serves a file and a buffer whose head has been discarded.
+    """
+
+    def __init__(self, stride: int = 64):
+        self.stride = stride
+        # _checkpoints[i] is the start offset of line (_first_checkpoint + i) * stride
+        self._checkpoints = array("q", [0])
+        self._first_checkpoint = 0
+        self.newlines = 0
+        self.size = 0
+        self._ends_with_newline = False
+
+    def feed(self, data: bytes):
+        """Indexes `data`, which must directly follow the bytes fed so far."""
+        if not data:
+            return
+        count = data.count(b"\n")
+        # Newlines still needed before the next checkpoint line starts
+        need = self.stride - self.newlines % self.stride
+        if count >= need:
+            # Every stride-th newline from there, without a Python-level step per newline
+            for match in islice(_NEWLINE.finditer(data), need - 1, None, self.stride):
+                self._checkpoints.append(self.size + match.end())
+        self.newlines += count
+        self.size += len(data)
+        self._ends_with_newline = data.endswith(b"\n")
+
+    @property
+    def line_count(self) -> int:
+        """Number of lines, counting an unterminated last line."""
+        if self.size == 0:
+            return 0
+        return self.newlines + (0 if self._ends_with_newline else 1)
+
+    def locate(self, line: int):
+        """
+        Returns (offset, skip): where to start scanning for `line` and how many
+        newlines to skip from there. Returns None if no checkpoint at or before
+        `line` is known any more.
+        """
+        k = min(line // self.stride, self._first_checkpoint + len(self._checkpoints) - 1) - self._first_checkpoint
+        if k < 0 or not self._checkpoints:
+            return None
+        return self._checkpoints[k], line - (self._first_checkpoint + k) * self.stride
+
+    def drop_before(self, offset: int):
+        """Forgets checkpoints that point before `offset`, after the stream's head was discarded."""
+        drop = bisect_left(self._checkpoints, offset)
+        if drop:
+            del self._checkpoints[:drop]
+            self._first_checkpoint += drop
@@ -0,0 +1,212 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+from config import LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_BYTES, LLM_CACHE_DIR, LLM_CACHE_DISK_MAX_BYTES, LLM_CACHE_BYPASS
+
+
+def _canonical(obj):
+    """json.dumps fallback for the non-JSON objects a prompt may hold (pydantic models, SDK objects)."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
+
+
+# Clock lines the agent puts in its prompts ("time: ..." in the system data, "Current Time: ..."
+# in summary requests); they change every second, so the key ignores their value
+_CLOCK_LINE = re.compile(r"^([ \t]*(?:time|Current Time): )\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}[ \t]*$", re.MULTILINE)
+
+
+def _without_clock(message):
+    if isinstance(message, dict) and isinstance(message.get("content"), str):
+        return {**message, "content": _CLOCK_LINE.sub(r"\1<now>", message["content"])}
+    return message
+
+
+def cache_key(model: str, messages: list, response_format=None, tools: Optional[list] = None) -> str:
+    """
+    Content address of an LLM request: sha256 of the canonical JSON of everything
+    that decides the response. `response_format` may be a pydantic model class,
+    which is keyed by its name and JSON schema. Timestamp lines are keyed without
+    their value, so a repeated request hits at any time.
+    """
+    if isinstance(response_format, type) and hasattr(response_format, "model_json_schema"):
+        response_format = {"name": response_format.__name__, "schema": response_format.model_json_schema()}
+    messages = [_without_clock(m) for m in messages]
+    payload = {"model": model, "messages": messages, "response_format": response_format, "tools": tools}
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_canonical)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("data", "seconds", "size")
+
+    def __init__(self, data: str, seconds: float):
+        self.data = data          # JSON of the cached value
+        self.seconds = seconds    # latency of the request that produced it
+        self.size = len(data.encode("utf-8"))
+
+
+class LLMCache:
+    """
+    Content-addressed cache of LLM responses.
+
+    Values are JSON-serializable (callers convert SDK objects with `model_dump()`
+    and back). The in-memory tier is an LRU bounded by `max_entries` and
+    `max_bytes`; with a `directory`, entries are also written to
+    `<directory>/<key[:2]>/<key>.json` so they survive restarts, and the oldest
+    files are pruned beyond `disk_max_bytes`.
+
+    Requests are grouped by kind (e.g. "summary", "compress", "step"); kinds in
+    `bypass` are never looked up or stored. Hits, misses, bypasses and the
+    request time saved by hits are counted per kind.
+    """
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, max_bytes: int = LLM_CACHE_MAX_BYTES,
+                 directory: Optional[str] = LLM_CACHE_DIR, disk_max_bytes: int = LLM_CACHE_DISK_MAX_BYTES,
+                 bypass: Iterable[str] = LLM_CACHE_BYPASS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self.bypass = set(bypass)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = None  # scanned on the first write
+        self._stats = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _count(self, kind: str, field: str, amount=1):
+        stats = self._stats.setdefault(kind, {"hits": 0, "misses": 0, "bypassed": 0, "saved_seconds": 0.0})
+        stats[field] += amount
+
+    def get(self, kind: str, key: str) -> Optional[Any]:
+        """The cached value for `key`, or None on a miss (or if `kind` is bypassed)."""
+        with self._lock:
+            if kind in self.bypass:
+                self._count(kind, "bypassed")
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            else:
+                entry = self._read_disk(key)
+                if entry is not None:
+                    self._insert(key, entry)
+            if entry is None:
+                self._count(kind, "misses")
+                return None
+            self._count(kind, "hits")
+            self._count(kind, "saved_seconds", entry.seconds)
+            return json.loads(entry.data)
+
+    def put(self, kind: str, key: str, value: Any, seconds: float = 0.0):
+        """Stores a successful response; values too large for the cache are skipped."""
+        if value is None or kind in self.bypass:
+            return
+        try:
+            data = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            print(f"[System] Response not cached: {e}", flush=True)
+            return
+        entry = _Entry(data, seconds)
+        with self._lock:
+            if entry.size > self.max_bytes:
+                return
+            self._insert(key, entry)
+            self._write_disk(key, entry)
+
+    def _insert(self, key: str, entry: _Entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def _read_disk(self, key: str) -> Optional[_Entry]:
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            os.utime(path)  # pruning goes by last use
+            return _Entry(json.dumps(record["value"], ensure_ascii=False), record.get("seconds", 0.0))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[System] Ignoring unreadable LLM cache entry {path}: {e}", flush=True)
+            return None
+
+    def _write_disk(self, key: str, entry: _Entry):
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            existed = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write('{"seconds": %r, "value": %s}' % (entry.seconds, entry.data))
+            os.replace(tmp_path, path)
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_bytes += os.path.getsize(path) - existed
+            if self._disk_bytes > self.disk_max_bytes:
+                self._prune_disk()
+        except OSError as e:
+            print(f"[System] Failed to persist LLM cache entry: {e}", flush=True)
+
+    def _disk_files(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _prune_disk(self):
+        """Deletes the least recently used files until the directory is back under 90% of its limit."""
+        target = self.disk_max_bytes * 0.9
+        for _, size, path in sorted(self._disk_files()):
+            if self._disk_bytes <= target:
+                break
+            os.remove(path)
+            self._disk_bytes -= size
+
+    def clear(self):
+        """Empties the memory tier and the statistics (files on disk are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._stats = {}
+
+    def stats(self) -> dict:
+        """Totals and per-kind hits, misses, bypasses, hit ratio and seconds saved, plus the cache size."""
+        with self._lock:
+            kinds = {kind: dict(stats) for kind, stats in self._stats.items()}
+            total = {"hits": 0, "misses": 0, "bypassed": 0, "saved_seconds": 0.0}
+            for stats in kinds.values():
+                for field in total:
+                    total[field] += stats[field]
+            for stats in list(kinds.values()) + [total]:
+                lookups = stats["hits"] + stats["misses"]
+                stats["hit_ratio"] = stats["hits"] / lookups if lookups else None
+            return {**total, "entries": len(self._entries), "bytes": self._bytes, "kinds": kinds}
+
+
+# Module-level singleton shared by all agents
+llm_cache = LLMCache()
@@ -0,0 +1,259 @@
+import hashlib
+import math
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+from ltm_loader import LTM_DIR, get_catalog
+from models import ltm
+from config import LTM_EMBEDDING_DIM, LTM_VECTOR_WEIGHT
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_WORD = re.compile(r"\w+")
+
+# BM25 parameters: term-frequency saturation and document-length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Cosine similarity an embedding needs to make a memory a result without any shared word
+MIN_SIMILARITY = 0.2
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of a string."""
+    return _WORD.findall(text.lower())
+
+
+def _document_text(memory: ltm) -> str:
+    # Name and description say what a memory is for; repeating them weighs them above the body
+    header = f"{memory.name} {memory.description}"
+    return f"{header}\n{header}\n{memory.content}"
+
+
+class HashingEmbedder:
+    """
+    Offline embedder: words and word pairs are hashed into `dim` signed buckets
+    and the vector is L2-normalized.
+
+    It only captures word overlap, but needs no model and no network. Any
+    callable with the same signature (a list of texts in, one vector per text
+    out, all of one length) can replace it in `LTMIndex`.
+    """
+
+    def __init__(self, dim: int = LTM_EMBEDDING_DIM):
+        self.dim = dim
+
+    def __call__(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def _embed(self, text):
+        vector = [0.0] * self.dim
+        words = tokenize(text)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        return _normalized(vector)
+
+
+def _normalized(vector):
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+
+class _Document:
+    __slots__ = ("memory", "text", "length", "terms", "vector")
+
+    def __init__(self, memory, text, terms, vector):
+        self.memory = memory
+        self.text = text
+        self.length = sum(terms.values())
+        self.terms = terms
+        self.vector = vector
+
+
+class LTMIndex:
+    """
+    Relevance index over the LTM files of one directory.
+
+    Scores combine BM25 over each memory's name, description and content with
+    the cosine similarity of embeddings; `vector_weight` sets the share of the
+    embedding score. Embeddings come from `embedder` (the offline
+    `HashingEmbedder` by default) and are scored as one matrix product when
+    numpy is installed.
+
+    `sync()` follows the `LTMCatalog`: only files whose text changed are
+    re-tokenized and re-embedded, and a metadata-only change (visibility,
+    activation) just swaps the parsed memory.
+    """
+
+    def __init__(self, directory: str = LTM_DIR, embedder: Optional[Callable] = None,
+                 vector_weight: float = LTM_VECTOR_WEIGHT):
+        self.catalog = get_catalog(directory)
+        self.embedder = embedder or HashingEmbedder()
+        self.vector_weight = vector_weight
+        self._lock = threading.RLock()
+        # path -> _Document
+        self._docs: Dict[str, _Document] = {}
+        # term -> {path: term frequency}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._version = None
+        self._matrix = None
+        self.indexed = 0
+
+    def set_embedder(self, embedder: Callable):
+        """Replaces the embedder and re-embeds every memory with it."""
+        with self._lock:
+            self.embedder = embedder
+            docs = list(self._docs.values())
+            for doc, vector in zip(docs, self._embed([doc.text for doc in docs])):
+                doc.vector = vector
+            self._matrix = None
+
+    def sync(self) -> bool:
+        """Brings the index up to date with the catalog. Returns True if any memory was (re)indexed or dropped."""
+        with self._lock:
+            memories = self.catalog.all()
+            if self.catalog.version == self._version:
+                return False
+            self._version = self.catalog.version
+
+            changed = False
+            fresh = []
+            seen = set()
+            for memory in memories:
+                seen.add(memory.path)
+                text = _document_text(memory)
+                doc = self._docs.get(memory.path)
+                if doc is not None and doc.text == text:
+                    doc.memory = memory
+                    continue
+                if doc is not None:
+                    self._remove(memory.path)
+                fresh.append((memory, text))
+            for path in [path for path in self._docs if path not in seen]:
+                self._remove(path)
+                changed = True
+
+            if fresh:
+                vectors = self._embed([text for _, text in fresh])
+                for (memory, text), vector in zip(fresh, vectors):
+                    self._add(memory, text, vector)
+                changed = True
+            if changed:
+                self._matrix = None
+            return changed
+
+    def _embed(self, texts):
+        if not texts:
+            return []
+        return [_normalized([float(x) for x in vector]) for vector in self.embedder(texts)]
+
+    def _add(self, memory, text, vector):
+        terms = {}
+        for term in tokenize(text):
+            terms[term] = terms.get(term, 0) + 1
+        doc = self._docs[memory.path] = _Document(memory, text, terms, vector)
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[memory.path] = count
+        self._total_length += doc.length
+        self.indexed += 1
+
+    def _remove(self, path):
+        doc = self._docs.pop(path)
+        for term in doc.terms:
+            posting = self._postings[term]
+            del posting[path]
+            if not posting:
+                del self._postings[term]
+        self._total_length -= doc.length
+
+    def _bm25(self, terms):
+        scores = {}
+        count = len(self._docs)
+        average = self._total_length / count if count else 0
+        for term in set(terms):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for path, tf in posting.items():
+                length = self._docs[path].length
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average)
+                scores[path] = scores.get(path, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return scores
+
+    def _cosine(self, query_vector):
+        paths = list(self._docs)
+        if np is not None:
+            if self._matrix is None or self._matrix[0] != paths:
+                self._matrix = (paths, np.asarray([self._docs[p].vector for p in paths], dtype=np.float32))
+            if not paths:
+                return {}
+            sims = self._matrix[1] @ np.asarray(query_vector, dtype=np.float32)
+            return dict(zip(paths, sims.tolist()))
+        return {p: sum(a * b for a, b in zip(self._docs[p].vector, query_vector)) for p in paths}
+
+    def search(self, query: str, k: int = 5, allowed: Optional[Callable[[ltm], bool]] = None) -> List[tuple]:
+        """
+        Ranks the memories by relevance to `query`.
+
+        Args:
+            query (str): Free text, e.g. the recent conversation.
+            k (int): Number of results.
+            allowed (callable): Predicate on an ltm; others are skipped.
+
+        Returns:
+            [(score, ltm), ...], best first. A memory that shares no word with the query
+            is only included when its embedding similarity reaches MIN_SIMILARITY.
+        """
+        self.sync()
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            lexical = self._bm25(terms)
+            top = max(lexical.values(), default=1.0)
+            semantic = {}
+            if self.vector_weight > 0:
+                semantic = self._cosine(self._embed([query])[0])
+
+            ranked = []
+            for path, doc in self._docs.items():
+                if allowed is not None and not allowed(doc.memory):
+                    continue
+                similarity = semantic.get(path, 0.0)
+                if path not in lexical and similarity < MIN_SIMILARITY:
+                    continue
+                score = (1 - self.vector_weight) * lexical.get(path, 0.0) / top
+                score += self.vector_weight * max(similarity, 0.0)
+                ranked.append((score, doc.memory))
+        ranked.sort(key=lambda item: (-item[0], item[1].path))
+        return ranked[:k]
+
+
+def best_line(memory: ltm, query: str, max_chars: int = 200) -> str:
+    """The line of a memory's content sharing the most words with `query`, cut to `max_chars`."""
+    wanted = set(tokenize(query))
+    best, best_hits = "", 0
+    for line in memory.content.splitlines():
+        hits = len(wanted.intersection(tokenize(line)))
+        if hits > best_hits:
+            best, best_hits = line.strip(), hits
+    return best if len(best) <= max_chars else best[:max_chars] + "..."
+
+
+_indexes: Dict[str, LTMIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_ltm_index(directory: str = LTM_DIR) -> LTMIndex:
+    """Returns the process-wide index for a directory, creating it on first use."""
+    directory = get_catalog(directory).directory
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = _indexes[directory] = LTMIndex(directory)
+        return index
@@ -1,131 +1,230 @@
 import os
+import threading
 import frontmatter
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from models import ltm
 
+LTM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ltm")
+
+
+def _normalize_list(raw) -> List[str]:
+    """Normalize a frontmatter list field to lowercase strings."""
+    if isinstance(raw, str):
+        raw = [raw]
+    return [str(x).lower() for x in raw] if raw else []
+
+
+def parse_ltm_file(filepath: str) -> ltm:
+    """
+    Parses a single LTM Markdown file.
+
+    Returns an ltm object. Raises on unreadable or malformed files.
+    """
+    # python-frontmatter loads the file and parses YAML
+    post = frontmatter.load(filepath)
+    metadata = post.metadata
+    filename = os.path.basename(filepath)
+
+    return ltm(
+        name=metadata.get('name', filename),
+        description=metadata.get('description', ''),
+        content=post.content,
+        path=filepath,
+        # Normalize lists to lowercase for comparison
+        active_for=_normalize_list(metadata.get('active_for', [])),
+        visible_to=_normalize_list(metadata.get('visible_to', [])),
+        except_for=_normalize_list(metadata.get('except_for', [])),
+    )
+
+
+class LTMCatalog:
+    """
+    Thread-safe cache of the LTM files in one directory.
+
+    Each file is parsed once and only re-parsed when its mtime, size or inode
+    changes, so a refresh costs one stat() per file. Lookups by memory name or
+    filename go through an index instead of a rescan.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.RLock()
+        # filename -> (stat key, parsed ltm or None if the file failed to parse)
+        self._entries: Dict[str, Tuple[tuple, Optional[ltm]]] = {}
+        self._ordered: List[ltm] = []
+        self._index: Dict[str, ltm] = {}
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def refresh(self) -> bool:
+        """Re-stat the directory and re-parse changed files. Returns True if anything changed."""
+        with self._lock:
+            try:
+                scanned = [e for e in os.scandir(self.directory) if e.name.endswith(".md")]
+            except FileNotFoundError:
+                scanned = []
+
+            changed = False
+            seen = set()
+            for entry in scanned:
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                seen.add(entry.name)
+                key = (st.st_mtime_ns, st.st_size, st.st_ino)
+                cached = self._entries.get(entry.name)
+                if cached is not None and cached[0] == key:
+                    self.hits += 1
+                    continue
+
+                self.misses += 1
+                try:
+                    memory = parse_ltm_file(entry.path)
+                except Exception as e:
+                    print(f"Error loading LTM file {entry.name}: {e}")
+                    memory = None
+                self._entries[entry.name] = (key, memory)
+                changed = True
+
+            for filename in set(self._entries) - seen:
+                del self._entries[filename]
+                changed = True
+
+            if changed:
+                self._rebuild()
+            return changed
+
+    def _rebuild(self):
+        self._ordered = [m for _, (_, m) in sorted(self._entries.items()) if m is not None]
+        index = {}
+        for m in self._ordered:
+            index.setdefault(m.name, m)
+        # Filenames are a fallback so names in frontmatter always win
+        for filename, (_, m) in self._entries.items():
+            if m is not None:
+                index.setdefault(filename, m)
+        self._index = index
+        self.version += 1
+
+    def all(self) -> List[ltm]:
+        """Returns every parsed LTM in filename order."""
+        with self._lock:
+            self.refresh()
+            return list(self._ordered)
+
+    def get(self, name: str) -> Optional[ltm]:
+        """Looks up an LTM by frontmatter name or filename, with or without '.md'."""
+        with self._lock:
+            self.refresh()
+            memory = self._index.get(name)
+            if memory is None:
+                alt = name[:-3] if name.endswith(".md") else f"{name}.md"
+                memory = self._index.get(alt)
+            return memory
+
+    def invalidate(self, path: Optional[str] = None):
+        """Forces a re-parse of one file (or every file) on the next refresh."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.basename(path), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "entries": len(self._entries),
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_catalogs: Dict[str, LTMCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(directory: str = LTM_DIR) -> LTMCatalog:
+    """Returns the process-wide catalog for a directory, creating it on first use."""
+    directory = os.path.abspath(directory)
+    with _catalogs_lock:
+        catalog = _catalogs.get(directory)
+        if catalog is None:
+            catalog = _catalogs[directory] = LTMCatalog(directory)
+        return catalog
+
+
 def load_ltm_files(directory: str) -> List[ltm]:
     """
     Loads all LTM files from a directory.
-    
-    Returns a list of ltm objects.
+
+    Returns a list of ltm objects. Files are served from the shared catalog
+    and only re-parsed when they change on disk.
     """
-    all_ltms = []
-    
-    if not os.path.exists(directory):
-        return all_ltms
-        
-    for filename in sorted(os.listdir(directory)):
-        if filename.endswith(".md"):
-            filepath = os.path.join(directory, filename)
-            try:
-                # python-frontmatter loads the file and parses YAML
-                post = frontmatter.load(filepath)
-                metadata = post.metadata
-                content = post.content
-                
-                # Normalize lists to lowercase for comparison
-                visible_to_raw = metadata.get('visible_to', [])
-                if isinstance(visible_to_raw, str):
-                     visible_to_raw = [visible_to_raw]
-                visible_to = [str(x).lower() for x in visible_to_raw] if visible_to_raw else []
-
-                active_for_raw = metadata.get('active_for', [])
-                if isinstance(active_for_raw, str):
-                     active_for_raw = [active_for_raw]
-                active_for = [str(x).lower() for x in active_for_raw] if active_for_raw else []
-
-                except_for_raw = metadata.get('except_for', [])
-                if isinstance(except_for_raw, str):
-                     except_for_raw = [except_for_raw]
-                except_for = [str(x).lower() for x in except_for_raw] if except_for_raw else []
-
-                memory_name = metadata.get('name', filename)
-                description = metadata.get('description', '')
-                
-                memory = ltm(
-                    name=memory_name,
-                    description=description,
-                    content=content,
-                    path=filepath,
-                    active_for=active_for,
-                    visible_to=visible_to,
-                    except_for=except_for
-                )
-                
-                all_ltms.append(memory)
-                     
-            except Exception as e:
-                print(f"Error loading LTM file {filename}: {e}")
-                
-    return all_ltms
-
-def update_ltm_metadata(memory_name: str, agent_name: str, field: str, action: str = "add") -> str:
+    return get_catalog(directory).all()
+
+def update_ltm_metadata(memory_name: str, agent_name: str, field: str, action: str = "add", directory: str = LTM_DIR) -> str:
     """
     Updates the metadata of an LTM file.
-    
+
     Args:
         memory_name (str): The name of the memory (filename without .md or 'name' in frontmatter).
         agent_name (str): The name of the agent.
         field (str): 'active_for' or 'visible_to'.
         action (str): 'add' or 'remove'.
     """
-    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ltm")
-    target_file = None
-    
-    # Find the file
-    for filename in os.listdir(directory):
-        if filename.endswith(".md"):
-            try:
-                filepath = os.path.join(directory, filename)
-                post = frontmatter.load(filepath)
-                if post.metadata.get('name') == memory_name or filename == f"{memory_name}.md":
-                    target_file = filepath
-                    break
-            except:
-                continue
-                
-    if not target_file:
+    catalog = get_catalog(directory)
+    memory = catalog.get(memory_name)
+    if not memory:
         return f"Memory '{memory_name}' not found."
+    target_file = memory.path
 
     try:
         post = frontmatter.load(target_file)
         current_list = post.metadata.get(field, [])
         if isinstance(current_list, str):
             current_list = [current_list]
-        
+
         if current_list is None:
             current_list = []
-        
+
         # Ensure list
         current_list = list(current_list)
-        
+
         if action == "add":
             if agent_name not in current_list:
                 current_list.append(agent_name)
         elif action == "remove":
             if agent_name in current_list:
                 current_list.remove(agent_name)
-        
+
         # Add a newline at the end if it's missing (common issue with frontmatter)
         if not post.content.endswith('\n'):
              post.content += '\n'
 
         post.metadata[field] = current_list
-        
+
         # Write back
         # frontmatter.dump uses UTF-8 by default
         with open(target_file, 'w', encoding='utf-8') as f:
             f.write(frontmatter.dumps(post))
-        
+        catalog.invalidate(target_file)
+        # Imported here: ltm_index builds on this module
+        from ltm_index import get_ltm_index
+        get_ltm_index(directory).sync()
+
         return f"Successfully updated {memory_name}"
-            
+
     except Exception as e:
         import traceback
         traceback.print_exc()
         return f"Error updating metadata: {e}"
 
 if __name__ == "__main__":
-   test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ltm")
-   test = load_ltm_files(test_dir)
+   test = load_ltm_files(LTM_DIR)
    for t in test:
        print(t.name,t.visible_to,t.active_for, t.except_for)
+   print(get_catalog().stats())
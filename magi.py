@@ -1,13 +1,29 @@
 import os,json
+import time
+import asyncio
+import contextlib
+import threading
 from datetime import datetime
 import config
-from openai import AzureOpenAI,OpenAI
+from openai import AzureOpenAI,AsyncAzureOpenAI,OpenAI
+from openai.types.chat import ChatCompletion
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from tools import available_tools
-from models import AgentStep
-from ltm_loader import load_ltm_files, update_ltm_metadata
-from config import SUMMARIZE_THRESHOLD, MESSAGE_LOG_PATH, MAX_STM_LENGTH
+from tools import available_tools, async_tools, sequential_tools, current_agent_name
+from pty_manager import command_manager
+from models import AgentStep, ToolCall
+from tool_registry import tool_registry
+from tool_executor import tool_executor
+from state_journal import StateJournal, state_persister
+from ltm_loader import LTM_DIR, get_catalog, update_ltm_metadata
+from ltm_index import get_ltm_index, best_line
+from config import MESSAGE_LOG_PATH, HISTORY_TOKEN_BUDGET, STM_TOKEN_BUDGET, CONTEXT_TOKEN_BUDGET
+from config import LTM_TOP_K, LTM_TOKEN_BUDGET, LTM_QUERY_MESSAGES, SUMMARY_KEEP_MESSAGES
+from context_budget import TokenCounter, PromptCacheStats
+from stm_store import STMStore
+from summary_tree import SummaryTree
+from summarizer import LatencyStats, summarizer
+from llm_cache import cache_key, llm_cache
 load_dotenv()
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -19,48 +35,134 @@ client = AzureOpenAI(
     timeout=60.0,
 )
 
+# Used by the asyncio scheduler so LLM calls of different agents can overlap
+async_client = AsyncAzureOpenAI(
+    api_key=AZURE_OPENAI_API_KEY,
+    azure_endpoint=AZURE_OPENAI_ENDPOINT,
+    api_version="2025-03-01-preview",
+    timeout=60.0,
+)
+
 memory_cleaner_prompt = "Summarize the following conversation history into a concise paragraph using the second person 'You'. Focus on key actions taken, important discoveries, decisions made, and the current state of any ongoing tasks. Do not record trivial details or failed attempts."
+summary_rollup_prompt = "The following are consecutive summaries of your work, oldest first. Merge them into one concise paragraph using the second person 'You'. Keep decisions, discoveries and the state of unfinished tasks; drop details that later summaries made obsolete."
 # ex:remember chat if needed
 
-def ai_request(messages,text_format=None):
+MODEL = "o4-mini"
+
+def ai_request(messages,text_format=None,kind="request"):
+    """
+    Text (or structured, with a pydantic `text_format`) generation.
+    Byte-identical requests are answered from `llm_cache`; `kind` names the call type for bypass and metrics.
+    """
+    key = cache_key(MODEL, messages, text_format)
+    cached = llm_cache.get(kind, key)
+    if cached is not None:
+        return text_format.model_validate(cached) if text_format is not None else cached
+    started = time.perf_counter()
     try:
-        print("[DEBUG] Sending ai_request to o4-mini...", flush=True)
+        print(f"[DEBUG] Sending ai_request to {MODEL}...", flush=True)
         if text_format is not None:
             response = client.responses.parse(
-            model="o4-mini",
+            model=MODEL,
             input=messages,
             text_format=text_format,
             )
             print("[DEBUG] Received structured response.", flush=True)
-            return response.output_parsed
+            result = response.output_parsed
+            value = result.model_dump() if result is not None else None
         else:
             response = client.responses.parse(
-            model="o4-mini",
+            model=MODEL,
             input=messages,
             )
-            return response.output_text
+            result = response.output_text
+            # An empty answer counts as a failure upstream, so it is not cached
+            value = result or None
     except Exception as e:
         print(f"Error in ai request: {e}")
         return "error"
+    llm_cache.put(kind, key, value, time.perf_counter() - started)
+    return result
+
+def _cached_completion(key):
+    """A cached tool-call completion for `key`, without usage (no tokens were billed for it)."""
+    cached = llm_cache.get("step", key)
+    if cached is None:
+        return None
+    return ChatCompletion.model_validate({**cached, "usage": None})
 
 def ai_tool_request(messages,tools_schema):
+    key = cache_key(MODEL, messages, tools=tools_schema)
+    cached = _cached_completion(key)
+    if cached is not None:
+        return cached
+    started = time.perf_counter()
     try:
         response = client.chat.completions.create(
-            model="o4-mini",
+            model=MODEL,
             messages=messages,
             tools=tools_schema,
             tool_choice="auto"
         )
-        return response
     except Exception as e:
         print(f"Error in ai tool request: {e}")
         return "error"
+    llm_cache.put("step", key, response.model_dump(mode="json"), time.perf_counter() - started)
+    return response
+
+async def async_ai_tool_request(messages,tools_schema):
+    key = cache_key(MODEL, messages, tools=tools_schema)
+    cached = _cached_completion(key)
+    if cached is not None:
+        return cached
+    started = time.perf_counter()
+    try:
+        response = await async_client.chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            tools=tools_schema,
+            tool_choice="auto"
+        )
+    except Exception as e:
+        print(f"Error in ai tool request: {e}")
+        return "error"
+    llm_cache.put("step", key, response.model_dump(mode="json"), time.perf_counter() - started)
+    return response
+
+def _history_tail(history, keep):
+    """The last `keep` messages, widened so no tool result is cut off from the assistant message that requested it."""
+    start = max(len(history) - keep, 0)
+    while start > 0 and history[start].get("role") == "tool":
+        start -= 1
+    return history[start:]
 
 
  
 # Global agent registry
 agents = {}
 
+# Callables invoked (from any thread) whenever an agent has new work; the scheduler registers here
+wakeup_hooks = []
+
+def _append_merged(messages, message):
+    """Appends a message, folding it into the previous one if both are user messages from the same sender."""
+    last = messages[-1] if messages else None
+    if (last is not None and last.get("role") == "user" and message.get("role") == "user"
+            and last.get("name") == message.get("name")
+            and isinstance(last.get("content"), str) and isinstance(message.get("content"), str)):
+        messages[-1] = {**last, "content": f"{last['content']}\n{message['content']}"}
+    else:
+        messages.append(message)
+
+def _deliver_command_event(agent_name, text):
+    """Posts the completion event of a backgrounded command to the agent that started it."""
+    target = agents.get(agent_name)
+    if target is not None:
+        print(f"[System] Notifying {agent_name}: {text.splitlines()[0]}", flush=True)
+        target.post({"role": "user", "name": "System", "content": text})
+
+command_manager.completion_listeners.append(_deliver_command_event)
+
 class agent:
 
     def __init__(self, name,description=""):
@@ -86,10 +188,35 @@ class agent:
 
 
         #memory
-        self.stm = []
+        self.stm = STMStore()
         self.history = []
+        # Summaries of messages dropped from the history; the first `summarized_messages` of `history`
+        # are already covered by them and are never sent to the summarizer again
+        self.summaries = SummaryTree()
+        self.summarized_messages = 0
         self.ltm_content = ""
-        self.stm_content = "\n\nShort-Term Memories:\n"
+
+        # Messages posted while a step is in flight wait here until the step ends
+        self._inbox = []
+        self._inbox_lock = threading.Lock()
+        self._stepping = False
+
+        # Per-message token counts are cached, so budgeting re-tokenizes only new text
+        self._tokens = TokenCounter()
+
+        # Memoized prompt segments; re-rendered only when their inputs change
+        self._ltm_version = None
+        self._relevant_ltm = None
+        self._tool_schemas = None
+        self.prompt_stats = PromptCacheStats()
+
+        # Background history summary in flight: (future, frozen history snapshot, summary frontier it extends)
+        self._summary_job = None
+        # Summaries run off the step, so their latency is tracked apart from the steps'
+        self.step_latency = LatencyStats()
+        self.summary_latency = LatencyStats()
+
+        self._journal = StateJournal(self.get_state_file_path())
         self.load_state()
         self.load_my_ltm()
 
@@ -98,83 +225,125 @@ class agent:
         os.makedirs(state_dir, exist_ok=True)
         return os.path.join(state_dir, f"{self.name}_state.json")
 
-    def save_state(self):
+    def write_state(self):
+        """Writes the current state to disk. Called by the persister thread or state_persister.flush()."""
         state = {
             "name": self.name,
             "description": self.description,
             "status": self.status,
-            "stm": self.stm,
+            "stm": self.stm.to_list(),
             "history": self.history,
-            "stm_content": self.stm_content
+            "summaries": self.summaries.to_list(),
+            "summarized_messages": self.summarized_messages,
         }
         try:
-            with open(self.get_state_file_path(), "w", encoding="utf-8") as f:
-                json.dump(state, f, ensure_ascii=False, indent=4)
+            # Only the delta since the last save is appended to the journal
+            self._journal.save(state)
         except Exception as e:
             print(f"[Error] Failed to save agent state for {self.name}: {e}")
 
+    def save_state(self):
+        """Queues this agent for the background persister; repeated saves before a flush are coalesced."""
+        state_persister.mark_dirty(self)
+
     def load_state(self):
-        state_file = self.get_state_file_path()
-        if os.path.exists(state_file):
-            try:
-                with open(state_file, "r", encoding="utf-8") as f:
-                    state = json.load(f)
-                    self.description = state.get("description", self.description)
-                    self.status = state.get("status", self.status)
-                    self.stm = state.get("stm", self.stm)
-                    self.history = state.get("history", self.history)
-                    self.stm_content = state.get("stm_content", self.stm_content)
-                print(f"[System] Loaded state for agent '{self.name}' from {state_file}")
-            except Exception as e:
-                print(f"[Error] Failed to load agent state for {self.name}: {e}")
+        try:
+            state = self._journal.load()
+            if state is not None:
+                self.description = state.get("description", self.description)
+                self.status = state.get("status", self.status)
+                self.history = state.get("history", self.history)
+                if state.get("stm"):
+                    self.stm.load(state["stm"])
+                elif state.get("stm_content"):
+                    # State saved before STM entries existed
+                    self.stm.load_text(state["stm_content"], source="legacy")
+                self.summaries.load(state.get("summaries", []))
+                self.summarized_messages = state.get("summarized_messages", 0)
+                print(f"[System] Loaded state for agent '{self.name}' from {self._journal.snapshot_path}")
+        except Exception as e:
+            print(f"[Error] Failed to load agent state for {self.name}: {e}")
 
-    def read_ltm(self, name):
+    def read_ltm(self, name=None, search=None):
         """
-        Reads the content of a specific Long Term Memory.
+        Reads the content of a specific Long Term Memory, or searches the memories visible to you.
         
         Args:
-            name (str): The name of the memory to read. (required)
+            name (str): The name of the memory to read.
+            search (str): Words describing what you need; lists the most relevant memories instead of reading one.
         """
-        ltm_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ltm")
+        agent_name_lower = self.name.lower()
+        if search is not None:
+            results = get_ltm_index(LTM_DIR).search(
+                search, k=LTM_TOP_K * 2,
+                allowed=lambda m: agent_name_lower in m.visible_to or "all" in m.visible_to)
+            if not results:
+                return f"No memories match '{search}'."
+            lines = []
+            for score, m in results:
+                lines.append(f"- {m.name} (score {score:.2f}): {m.description}")
+                snippet = best_line(m, search)
+                if snippet:
+                    lines.append(f"  {snippet}")
+            return "\n".join(lines)
+        if not name:
+            return "Error: Provide either name or search."
+
         try:
-            all_ltms = load_ltm_files(ltm_path)
-            agent_name_lower = self.name.lower()
-            
-            for m in all_ltms:
-                if m.name == name or f"{m.name}.md" == name or m.name == f"{name}.md":
-                    if agent_name_lower in m.visible_to or "all" in m.visible_to:
-                        return f"--- Memory: {m.name} ---\nDescription: {m.description}\n\nContent:\n{m.content}"
+            m = get_catalog(LTM_DIR).get(name)
+
+            if m and (agent_name_lower in m.visible_to or "all" in m.visible_to):
+                return f"--- Memory: {m.name} ---\nDescription: {m.description}\n\nContent:\n{m.content}"
 
-            
             return f"Error: LTM '{name}' not found."
         except Exception as e:
             return f"Error reading LTM: {e}"
 
-    def remember(self, text):
+    @property
+    def stm_content(self):
+        """The rendered STM block; assigning text replaces every STM entry with its lines."""
+        return self.stm.render()
+
+    @stm_content.setter
+    def stm_content(self, text):
+        self.stm.load_text(text, source="edit")
+
+    def remember(self, text, priority=0):
         """
         Adds a new memory to the agent's short-term memory.
         
         Args:
             text (str): The memory content to add. (required)
             use second person perspective(you) to record the memory
+            priority (int): 0 for ordinary notes; higher keeps the memory longer and drops it last.
         """
-        # Append to stm_content for persistence
-        self.stm_content += f"\n[Memory] {text}"
+        # Near-duplicates of an existing memory update it instead of piling up
+        self.stm.add(text, source="remember", priority=priority)
 
         print(f"[System] Remembered: {text}", flush=True)
 
-        if len(self.stm_content) > MAX_STM_LENGTH:
-            self.compress_stm()
+        self._fit_stm()
 
         return "Remembered successfully."
 
+    def _fit_stm(self):
+        """Over STM_TOKEN_BUDGET, compresses the changed STM entries, then evicts the least important ones."""
+        if self._tokens.count(self.stm_content) <= STM_TOKEN_BUDGET:
+            return
+        self.compress_stm()
+        while len(self.stm) > 1 and self._tokens.count(self.stm_content) > STM_TOKEN_BUDGET:
+            dropped = self.stm.evict_one()
+            print(f"[System] STM over budget; dropped: {dropped.text}", flush=True)
+
     def summarize_history(self):
         """
         Summarizes the current conversation history to free up the context window. 
         Note: This automatically condenses past messages into Short-Term Memory and keeps the last few messages for continuity. Use 'remember' BEFORE calling this if you need to retain highly specific facts or constraints.
+        The summary is written in the background; you can keep working meanwhile.
         """
-        self.force_summarize()
-        return "History summarized successfully."
+        if self.summarize_in_background() is None:
+            return "History is too short to summarize."
+        return "History summarization started in the background."
 
 
 # add time
@@ -183,8 +352,8 @@ class agent:
         Pauses agent execution indefinitely.
         """
         self.status = "STOPPED"
-        if len(self.history) > SUMMARIZE_THRESHOLD:
-            self.force_summarize()
+        if self._tokens.count_messages(self.history) > HISTORY_TOKEN_BUDGET:
+            self.summarize_in_background()
         
         return "Agent paused."
 
@@ -203,11 +372,7 @@ class agent:
             return "Message sent to human_user."
         
         if recipient in agents:
-            target_agent = agents[recipient]
-            target_agent.history.append({"role": "user", "name": self.name, "content": message})
-            if target_agent.status == "STOPPED":
-                target_agent.status = "RUNNING"
-            target_agent.save_state()
+            agents[recipient].post({"role": "user", "name": self.name, "content": message})
             print(f"[System] Message routed from {self.name} to {recipient}.", flush=True)
             return f"Message sent to agent '{recipient}'."
             
@@ -228,14 +393,15 @@ class agent:
         try:
             if prompt:
                 # Create a specific LTM file for this agent before instantiation so it gets loaded
-                ltm_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ltm")
-                os.makedirs(ltm_dir, exist_ok=True)
+                os.makedirs(LTM_DIR, exist_ok=True)
                 ltm_filename = f"01_{name.lower().replace(' ', '_')}_rule.md"
-                ltm_filepath = os.path.join(ltm_dir, ltm_filename)
+                ltm_filepath = os.path.join(LTM_DIR, ltm_filename)
                 
                 ltm_content = f"---\nname: {name}_rule\ndescription: Core instructions for {name}\nactive_for: \n- {name}\nvisible_to: \n- {name}\nexcept_for: []\n---\n{prompt}\n"
                 with open(ltm_filepath, "w", encoding="utf-8") as f:
                     f.write(ltm_content)
+                get_catalog(LTM_DIR).invalidate(ltm_filepath)
+                get_ltm_index(LTM_DIR).sync()
                 print(f"[System] Created specific LTM '{ltm_filename}' for '{name}'.", flush=True)
 
             # agent.__init__ automatically registers the new instance in the `agents` dict
@@ -262,28 +428,27 @@ class agent:
         except Exception as e:
             return f"Error updating STM for agent '{self.name}': {e}"
 
-    def get_tools_description(self):
-        """Generates a text description of available tools for the system prompt."""
-        description = "Available Tools:\n"
-        
-        # Internal tools
-        for name, func in self.agent_tools.items():
-            doc = func.__doc__ if func.__doc__ else "No description available."
-            description += f"- {name}: {doc}\n"
-            
-        # External tools
-        for name, func in available_tools.items():
-             # Avoid duplicates if any
-            if name not in self.agent_tools:
-                doc = func.__doc__ if func.__doc__ else "No description available."
-                description += f"- {name}: {doc}\n"
-                
-        return description
+    def get_tool_schemas(self):
+        """Native function-calling schemas for every tool this agent can use. Built once per tool set."""
+        key = (tuple(self.agent_tools), tuple(available_tools))
+        if self._tool_schemas is None or self._tool_schemas[0] != key:
+            tools = dict(self.agent_tools)
+            for name, func in available_tools.items():
+                # Agent-internal tools take precedence over external ones with the same name
+                tools.setdefault(name, func)
+            schemas = tool_registry.schemas(tools)
+            # The JSON form is kept for token accounting of the tools block
+            self._tool_schemas = (key, schemas, json.dumps(schemas, ensure_ascii=False))
+        return self._tool_schemas[1]
 
     def load_my_ltm(self, verbose=True):
+        catalog = get_catalog(LTM_DIR)
+        all_ltms = catalog.all()
+        if not verbose and catalog.version == self._ltm_version:
+            # No LTM file changed since the last render, keep ltm_content byte-identical
+            return
+        self._ltm_version = catalog.version
         self.ltm_content = "" # Reset context to load cleanly
-        ltm_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ltm")
-        all_ltms = load_ltm_files(ltm_path)
         try:
             self.active_ltms = []
             self.visible_ltms = []
@@ -325,26 +490,100 @@ class agent:
         
 
         if self.visible_ltms:
-            self.ltm_content += "\n\nOther Available Memories (loadable via tools or LTM-Manager):\n"
-            for m in self.visible_ltms:
-                self.ltm_content += f"- {m.name}: {m.description}\n"
+            # Listing them all would grow the prompt with the library; relevant ones are retrieved per step
+            self.ltm_content += (f"\n\nOther Available Memories: {len(self.visible_ltms)} more are visible to you. "
+                                 "The ones relevant to the conversation are shown after it; "
+                                 "find others with read_ltm(search=...) or via the LTM-Manager.\n")
+
+    def _ltm_query(self):
+        """Retrieval query: the text of the last LTM_QUERY_MESSAGES messages, or the agent's description."""
+        parts = []
+        for message in self.history[-LTM_QUERY_MESSAGES:]:
+            content = message.get("content")
+            if isinstance(content, str):
+                # Long tool output would drown the conversation in its words
+                parts.append(content[-2000:])
+        return "\n".join(parts) or self.description
+
+    def relevant_ltm(self):
+        """
+        The visible (not active) memories most relevant to the recent conversation:
+        up to LTM_TOP_K, in full while they fit LTM_TOKEN_BUDGET, the rest as name and description.
+        """
+        if not self.visible_ltms:
+            return ""
+        query = self._ltm_query()
+        key = (self._ltm_version, query)
+        if self._relevant_ltm is not None and self._relevant_ltm[0] == key:
+            return self._relevant_ltm[1]
+
+        visible = {m.path for m in self.visible_ltms}
+        results = get_ltm_index(LTM_DIR).search(query, k=LTM_TOP_K, allowed=lambda m: m.path in visible)
+        text = ""
+        if results:
+            text = "\n\nRelevant Long-Term Memories (Retrieved):\n"
+            budget = LTM_TOKEN_BUDGET
+            for _, m in results:
+                body = f"--- Memory: {m.name} ---\n{m.content}\n"
+                cost = self._tokens.count(body)
+                if cost <= budget:
+                    text += body
+                    budget -= cost
+                else:
+                    text += f"- {m.name}: {m.description} (load with read_ltm)\n"
+        self._relevant_ltm = (key, text)
+        return text
 
-    def get_messages(self):
+    def _context_blocks(self):
+        """The system prompt blocks get_messages() assembles, in prompt order."""
         self.load_my_ltm(verbose=False)
-        # Add Active LTM to context
-        system_msg_content = self.ltm_content + self.get_tools_description()
-        
-        # System Data
-        system_data = self.get_data()
-
+        self.get_tool_schemas()
+        return {
+            "ltm": self.ltm_content,
+            "tools": self._tool_schemas[2],
+            "summary": self.summaries.render(),
+            "relevant_ltm": self.relevant_ltm(),
+            "stm": self.stm_content,
+            "system_data": self.get_data(),
+        }
 
-        # Ensure system prompt is the first message
-        messages = [{"role": "system", "content": system_msg_content},
-                    {"role": "system", "content": self.stm_content},
-                    {"role": "system", "content": system_data}
-                    ] + self.history
+    def get_messages(self):
+        blocks = self._context_blocks()
+
+        # Static LTM first (tool schemas travel in `tools=`) so the provider can cache the prompt prefix
+        # across steps; retrieved LTMs, STM and system data (time, roster, token counts) change often and go
+        # after the history. The conversation summary precedes the history it continues; it only changes
+        # when the history is cut, which changes the prefix anyway
+        summary = [{"role": "system", "content": blocks["summary"]}] if blocks["summary"] else []
+        retrieved = [{"role": "system", "content": blocks["relevant_ltm"]}] if blocks["relevant_ltm"] else []
+        messages = ([{"role": "system", "content": blocks["ltm"]}]
+                    + summary
+                    + self.history
+                    + retrieved
+                    + [{"role": "system", "content": blocks["stm"]},
+                       {"role": "system", "content": blocks["system_data"]}])
         return messages
 
+    def context_usage(self):
+        """Token count of every block of the prompt, plus the total."""
+        usage = {name: self._tokens.count(text) for name, text in self._context_blocks().items()}
+        usage["history"] = self._tokens.count_messages(self.history)
+        usage["total"] = sum(usage.values())
+        return usage
+
+    def _enforce_context_budget(self):
+        """
+        Starts a background summary once the history passes HISTORY_TOKEN_BUDGET.
+        Returns the summary job the step has to wait for when the prompt would exceed CONTEXT_TOKEN_BUDGET, else None.
+        """
+        usage = self.context_usage()
+        if usage["total"] > CONTEXT_TOKEN_BUDGET:
+            print(f"[System] Context for {self.name} is {usage['total']} tokens (budget {CONTEXT_TOKEN_BUDGET}); summarizing.", flush=True)
+            return self.summarize_in_background()
+        if usage["history"] > HISTORY_TOKEN_BUDGET:
+            self.summarize_in_background()
+        return None
+
     def get_data(self):
         agents_info = ""
         for a in agents.values():
@@ -358,61 +597,145 @@ class agent:
         operate system:linux
         working_directory: {os.getcwd()}
         time: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-        History Count: {len(self.history)}, auto clean at {config.SUMMARIZE_THRESHOLD}
+        History Tokens: {self._tokens.count_messages(self.history)}, auto clean at {HISTORY_TOKEN_BUDGET}
         other agents: {agents_info}
         
         """
         return data
 
-    def download_messages(self):
+    def download_messages(self, messages=None):
         try:
             timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
             filename = f"{self.name}_{timestamp}.json"
             os.makedirs(MESSAGE_LOG_PATH, exist_ok=True)
             with open(os.path.join(MESSAGE_LOG_PATH, filename), "w", encoding="utf-8") as f:
-                json.dump(self.get_messages(), f, ensure_ascii=False, indent=4)
+                json.dump(messages if messages is not None else self.get_messages(), f, ensure_ascii=False, indent=4)
             print(f"  [System] Messages downloaded to {filename}")
         except Exception as e:
             print(f"  [Error] Failed to download messages: {e}")
 
     def force_summarize(self):
+        """Summarizes now: waits for the running background summary (or starts one) and swaps it in."""
+        job = self.summarize_in_background()
+        if job is None:
+            return
+        with contextlib.suppress(Exception):
+            job.result()
+        self._apply_summary(force=True)
+
+    def summarize_in_background(self):
+        """
+        Starts summarizing a frozen snapshot of the history on the summarizer pool; the agent keeps stepping.
+        Returns the job's future (the running one if a summary is already in flight), or None if the
+        history is too short to summarize.
+        """
+        with self._inbox_lock:
+            if self._summary_job is not None:
+                return self._summary_job[0]
+            snapshot = list(self.history)
+            watermark = min(self.summarized_messages, len(snapshot))
+        if watermark == len(snapshot) or len(_history_tail(snapshot, SUMMARY_KEEP_MESSAGES)) == len(snapshot):
+            return None
+        # The full prompt is archived before the history shrinks
+        archive = self.get_messages()
+        with self._inbox_lock:
+            if self._summary_job is not None:
+                return self._summary_job[0]
+            nodes = self.summaries.nodes
+            job = summarizer.submit(self._summarize_snapshot, snapshot[watermark:], nodes, archive)
+            self._summary_job = (job, snapshot, nodes)
+        print(f"[System] Summarizing {len(snapshot) - watermark} new messages of {self.name} in the background.", flush=True)
+        job.add_done_callback(lambda _: self._apply_summary())
+        return job
+
+    def _summarize_snapshot(self, delta, nodes, archive):
+        """
+        Summary job, on a summarizer thread: only reads its arguments, never the live agent state.
+        Summarizes the messages not summarized before (`delta`) and returns (summary, new tree frontier).
+        """
+        started = time.perf_counter()
         try:
-            self.download_messages()
+            self.download_messages(archive)
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             summary_prompt = [
                 {"role": "system", "content": memory_cleaner_prompt},
                 {"role": "user", "content": f"Current Time: {timestamp}"},
-                {"role": "user", "content": json.dumps(self.history, ensure_ascii=False)}
             ]
-            summary = ai_request(summary_prompt)
-
-            self.stm_content +=f"{summary}\n"
-            
-            if len(self.stm_content) > MAX_STM_LENGTH:
-                self.compress_stm()
-
-            # Sliding Window: Keep the last 4 messages to preserve immediate context continuity
-            self.history = self.history[-8:]
-            print(f"  [Summary] {summary}")
-        except Exception as e:
-            print(f"  [Error] Failed to summarize history: {e}")
+            if nodes:
+                # Continuity with what came before, without re-sending the messages it covers
+                summary_prompt.append({"role": "user", "content": f"Summary of the conversation before these messages (do not repeat it):\n{nodes[-1].text}"})
+            summary_prompt.append({"role": "user", "content": json.dumps(delta, ensure_ascii=False)})
+            summary = ai_request(summary_prompt, kind="summary")
+            if not summary or summary == "error":
+                raise RuntimeError("LLM request failed.")
+            return summary, self.summaries.extend(nodes, summary, len(delta), self._roll_up)
+        finally:
+            self.summary_latency.record(time.perf_counter() - started)
+
+    def _roll_up(self, texts):
+        """Merges consecutive summaries into one (a summary tree level-up)."""
+        prompt = [
+            {"role": "system", "content": summary_rollup_prompt},
+            {"role": "user", "content": "\n\n".join(f"Summary {i}:\n{text}" for i, text in enumerate(texts, 1))},
+        ]
+        summary = ai_request(prompt, kind="summary")
+        if not summary or summary == "error":
+            raise RuntimeError("LLM request failed.")
+        return summary
+
+    def _apply_summary(self, force=False):
+        """
+        Swaps a finished summary in: the summarized snapshot is replaced by its last SUMMARY_KEEP_MESSAGES
+        messages, everything appended after the snapshot was taken stays, and the summary tree takes the
+        job's frontier. The kept messages are covered by the summary, so they become the new watermark.
+        Mid-step the swap waits for _end_step() unless `force` is set (the step has not recorded anything yet).
+        """
+        with self._inbox_lock:
+            if self._summary_job is None or not self._summary_job[0].done() or (self._stepping and not force):
+                return False
+            (job, snapshot, nodes), self._summary_job = self._summary_job, None
+            try:
+                summary, frontier = job.result()
+            except Exception as e:
+                print(f"  [Error] Failed to summarize history: {e}")
+                return False
+            cut = len(snapshot)
+            if (len(self.history) < cut or any(a is not b for a, b in zip(self.history, snapshot))
+                    or self.summaries.nodes is not nodes):
+                print(f"[System] History of {self.name} was replaced while it was summarized; summary dropped.", flush=True)
+                return False
+            # Sliding Window: keep the last messages of the snapshot to preserve immediate context continuity
+            kept = _history_tail(snapshot, SUMMARY_KEEP_MESSAGES)
+            self.history = kept + self.history[cut:]
+            self.summarized_messages = len(kept)
+            self.summaries.replace(frontier)
+
+        print(f"  [Summary] {summary}")
+        self.save_state()
+        return True
 
     def compress_stm(self):
         """
         Compresses and filters the agent's short-term memory to keep it concise.
         Automatically removes information already present in Long-Term Memory.
+        Only memories added or changed since the last compression are rewritten.
         Can be called manually by the agent.
         """
         try:
-            print(f"[System] Compressing STM for {self.name}...", flush=True)
+            changed = self.stm.changed()
+            if not changed:
+                return "STM is already compressed; nothing changed since the last compression."
+            print(f"[System] Compressing {len(changed)} of {len(self.stm)} STM entries for {self.name}...", flush=True)
+            entries = "\n".join(f"- {e.text}" for e in changed)
             prompt = [
-                {"role": "system", "content": "You are a memory manager. Summarize the following short-term memory block into a highly concise format. **CRITICAL: If any information in the short-term memory is already present in the provided long-term memory or is clearly redundant, discard it completely from the summary.** Your goal is to keep only fresh, immediate context."},
-                {"role": "user", "content": f"Current Active/Visible Long-Term Memories:\n{self.ltm_content}"},
-                {"role": "user", "content": f"Short-Term Memory Block to Compress:\n{self.stm_content}"}
+                {"role": "system", "content": "You are a memory manager. Summarize the following short-term memory entries into a highly concise format, one fact per line. **CRITICAL: If any information in the short-term memory is already present in the provided long-term memory or is clearly redundant, discard it completely from the summary.** Your goal is to keep only fresh, immediate context."},
+                {"role": "user", "content": f"Current Active Long-Term Memories:\n{self.ltm_content}"},
+                {"role": "user", "content": f"Short-Term Memory Entries to Compress:\n{entries}"}
             ]
-            compressed_content = ai_request(prompt)
+            compressed_content = ai_request(prompt, kind="compress")
             if compressed_content and compressed_content != "error":
-                 self.stm_content = f"\n\nShort-Term Memories (Compressed):\n{compressed_content}\n"
+                 lines = [line.strip().lstrip("-*• ").strip() for line in compressed_content.splitlines()]
+                 self.stm.replace(changed, [line for line in lines if line])
                  return "STM successfully compressed and deduplicated."
             return "Error: Failed to generate compressed STM."
         except Exception as e:
@@ -425,74 +748,207 @@ class agent:
 
 
 
+    def post(self, message):
+        """
+        Delivers a message to this agent from any thread or task and wakes it if stopped.
+        Messages arriving mid-step are held back and appended after the step's own records.
+        """
+        with self._inbox_lock:
+            stepping = self._stepping
+            _append_merged(self._inbox if stepping else self.history, message)
+        if not stepping:
+            self.save_state()
+        self.wake()
+
+    def wake(self):
+        """Marks a stopped agent as RUNNING and notifies the scheduler."""
+        if self.status == "STOPPED":
+            self.status = "RUNNING"
+        for hook in list(wakeup_hooks):
+            hook()
+
+    def _begin_step(self):
+        self._step_started = time.perf_counter()
+        with self._inbox_lock:
+            self._stepping = True
+
+    def _end_step(self, result):
+        """Flushes messages that arrived during the step (they keep the agent running) and swaps in a finished summary."""
+        with self._inbox_lock:
+            self._stepping = False
+            pending, self._inbox = self._inbox, []
+            for message in pending:
+                _append_merged(self.history, message)
+        if pending:
+            self.save_state()
+        self._apply_summary()
+        self.step_latency.record(time.perf_counter() - self._step_started)
+        if result == "STOPPED" and (pending or self.status == "RUNNING"):
+            self.status = "RUNNING"
+            result = "RUNNING"
+        return result
+
     def step(self):
-        
+        self._begin_step()
         try:
-            step: AgentStep = client.beta.chat.completions.parse(
-                model="o4-mini",
-                messages=self.get_messages(),
-                response_format=AgentStep,
-            ).choices[0].message.parsed
-            
-            # Print Reasoning
-            if config.SHOW_THOUGHTS:
-                print(f"  [Reasoning] {step.reasoning}", flush=True)
-            
-            # Check for Tool execution
-            if step.tool_name:
-                if config.SHOW_TOOL_CALLS:
-                    print(f"  [Tool Call] {step.tool_name} args={step.tool_args}", flush=True)
-                
-                # Check internal tools first
-                tool_func = self.agent_tools.get(step.tool_name)
-                # Then external tools
-                if not tool_func:
-                    tool_func = available_tools.get(step.tool_name)
-
-                if tool_func:
-                    try:
-                        
-                        # Handle None args if necessary
-                        args = {}
-                        if step.tool_args:
-                            args = step.tool_args
-
-                        self.history.append({"role": "assistant", "content": step.model_dump_json()})
-                        # Execute Tool
-                        result = tool_func(**args)
-                        
-                        tool_feedback = f"Tool '{step.tool_name}' Output:\n{result}"
-                        
-                        
-                        # Stop if status is STOPPED (set by wait tool)
-                        if self.status == "STOPPED":
-                            self.save_state()
-                            return "STOPPED"
-
-                        self.history.append({"role": "user", "content": tool_feedback})
-                            
-                    except Exception as e:
-                        error_msg = f"Error executing tool {step.tool_name}: {e}"
-                        print(f"  [Error] {error_msg}")
-                        self.history.append({"role": "assistant", "content": step.model_dump_json()})
-                        self.history.append({"role": "user", "content": error_msg})
-                else:
-                    error_msg = f"Error: Tool '{step.tool_name}' not found."
-                    print(f"  [Error] {error_msg}")
-                    self.history.append({"role": "assistant", "content": step.model_dump_json()})
-                    self.history.append({"role": "user", "content": error_msg})
-            else:
-                # No tool called, but maybe just reasoning?
-                # Usually we force a tool call or stop.
-                # print("  [Warning] No tool name provided.")
-                self.history.append({"role": "assistant", "content": step.model_dump_json()})
-        
+            job = self._enforce_context_budget()
+            if job is not None:
+                with contextlib.suppress(Exception):
+                    job.result()
+                self._apply_summary(force=True)
+            messages = self.get_messages()
+            self.prompt_stats.record_prefix(messages[0]["content"])
+            response = ai_tool_request(messages, self.get_tool_schemas())
+            result = self._handle_response(response)
         except Exception as e:
-            print(f"Error during agent step: {e}")
-            self.download_messages()
-            self.save_state()
-            return "ERROR"
-            
+            result = self._step_failed(e)
+        return self._end_step(result)
+
+    async def astep(self, limiter=None):
+        """
+        Async variant of step() used by the scheduler.
+        The LLM call and the tool calls are awaited, so other agents run meanwhile;
+        `limiter` (an asyncio.Semaphore) caps in-flight requests across agents.
+        """
+        self._begin_step()
+        try:
+            job = self._enforce_context_budget()
+            if job is not None:
+                # Over the hard budget the step needs the summary, but other agents keep running
+                with contextlib.suppress(Exception):
+                    await asyncio.wrap_future(job)
+                self._apply_summary(force=True)
+            messages = self.get_messages()
+            self.prompt_stats.record_prefix(messages[0]["content"])
+            async with limiter or contextlib.nullcontext():
+                response = await async_ai_tool_request(messages, self.get_tool_schemas())
+            result = await self._ahandle_response(response)
+        except Exception as e:
+            result = self._step_failed(e)
+        return self._end_step(result)
+
+    def _step_failed(self, e):
+        print(f"Error during agent step: {e}")
+        self.download_messages()
+        self.save_state()
+        return "ERROR"
+
+    def _parse_response(self, response) -> AgentStep:
+        if response == "error":
+            raise RuntimeError("LLM request failed.")
+        self.prompt_stats.record_usage(response.usage)
+        message = response.choices[0].message
+        return AgentStep(
+            reasoning=message.content or "",
+            tool_calls=[
+                ToolCall(id=c.id, name=c.function.name, arguments=c.function.arguments or "{}")
+                for c in (message.tool_calls or [])
+            ],
+        )
+
+    def _handle_response(self, response):
+        return self._apply_step(self._parse_response(response))
+
+    async def _ahandle_response(self, response):
+        return await self._aapply_step(self._parse_response(response))
+
+    def _apply_step(self, step: AgentStep):
+        """Executes the tool calls of a parsed AgentStep and records them in history."""
+        self._record_assistant(step)
+        # Tools see which agent called them (e.g. for per-agent output cursors); worker threads inherit it
+        token = current_agent_name.set(self.name)
+        try:
+            results = tool_executor.run_batch(step.tool_calls, self._run_tool_call, self._is_barrier_call)
+        finally:
+            current_agent_name.reset(token)
+        return self._record_results(step, results)
+
+    async def _aapply_step(self, step: AgentStep):
+        """Awaitable _apply_step(): tool calls never block the event loop."""
+        self._record_assistant(step)
+        token = current_agent_name.set(self.name)
+        try:
+            results = await tool_executor.arun_batch(step.tool_calls, self._arun_tool_call, self._is_barrier_call)
+        finally:
+            current_agent_name.reset(token)
+        return self._record_results(step, results)
+
+    def _record_assistant(self, step: AgentStep):
+        # Print Reasoning
+        if config.SHOW_THOUGHTS and step.reasoning:
+            print(f"  [Reasoning] {step.reasoning}", flush=True)
+
+        assistant_msg = {"role": "assistant", "content": step.reasoning or None}
+        if step.tool_calls:
+            assistant_msg["tool_calls"] = [
+                {"id": c.id, "type": "function", "function": {"name": c.name, "arguments": c.arguments}}
+                for c in step.tool_calls
+            ]
+        elif not step.reasoning:
+            assistant_msg["content"] = ""
+        self.history.append(assistant_msg)
+
+    def _record_results(self, step: AgentStep, results):
+        # Every tool call must be answered by a tool message, even after wait()
+        for call, result in zip(step.tool_calls, results):
+            self.history.append({"role": "tool", "tool_call_id": call.id, "content": result})
+
         self.save_state()
-        return "RUNNING"
+        # Stop if status is STOPPED (set by wait tool)
+        return "STOPPED" if self.status == "STOPPED" else "RUNNING"
+
+    def _is_barrier_call(self, call: ToolCall):
+        """Agent tools (wait, send_message, remember, ...) and file writers keep their place in the step's order."""
+        return call.name in self.agent_tools or call.name in sequential_tools
+
+    def _resolve_tool_call(self, call: ToolCall):
+        """Finds and validates a call's tool. Returns (tool_func, args), or (None, error text)."""
+        # Check internal tools first, then external tools
+        tool_func = self.agent_tools.get(call.name) or available_tools.get(call.name)
+        if not tool_func:
+            error_msg = f"Error: Tool '{call.name}' not found."
+            print(f"  [Error] {error_msg}")
+            return None, error_msg
 
+        try:
+            args = tool_registry.spec(call.name, tool_func).validate(json.loads(call.arguments or "{}"))
+        except ValueError as e:
+            # Malformed JSON or arguments that don't match the schema
+            error_msg = f"Error: Invalid arguments for tool '{call.name}': {e}"
+            print(f"  [Error] {error_msg}")
+            return None, error_msg
+
+        if config.SHOW_TOOL_CALLS:
+            print(f"  [Tool Call] {call.name} args={args}", flush=True)
+        return tool_func, args
+
+    def _run_tool_call(self, call: ToolCall):
+        """Validates and executes one tool call. Returns the text for the tool message."""
+        tool_func, args = self._resolve_tool_call(call)
+        if tool_func is None:
+            return args
+        try:
+            return str(tool_func(**args))
+        except Exception as e:
+            error_msg = f"Error executing tool {call.name}: {e}"
+            print(f"  [Error] {error_msg}")
+            return error_msg
+
+    async def _arun_tool_call(self, call: ToolCall):
+        """
+        Awaitable _run_tool_call(). Tools with an awaitable variant run on the event loop,
+        everything else on the tool worker pool.
+        """
+        async_func = async_tools.get(call.name) if call.name not in self.agent_tools else None
+        if async_func is None:
+            return await tool_executor.run_in_pool(self._run_tool_call, call)
+
+        tool_func, args = self._resolve_tool_call(call)
+        if tool_func is None:
+            return args
+        try:
+            return str(await async_func(**args))
+        except Exception as e:
+            error_msg = f"Error executing tool {call.name}: {e}"
+            print(f"  [Error] {error_msg}")
+            return error_msg
@@ -1,13 +1,16 @@
 from magi import agent, agents
+from scheduler import AgentScheduler
+import asyncio
 import threading
 import queue
+import signal
 import sys
-import time
 from config import USER_NAME
 
-def input_listener(q):
+def input_listener(q, notify):
     """
     Listens for user input from stdin in a separate thread.
+    Every line is queued and the scheduler is woken immediately.
     """
     while True:
         try:
@@ -16,6 +19,7 @@ def input_listener(q):
             if not line: # EOF returns empty string
                 break
             q.put(line.strip())
+            notify()
         except EOFError:
             break
         except Exception as e:
@@ -38,42 +42,34 @@ def main():
     
     # Input Queue
     input_queue = queue.Queue()
-    
+    scheduler = AgentScheduler()
+
     # Start Input Thread
-    input_thread = threading.Thread(target=input_listener, args=(input_queue,), daemon=True)
+    input_thread = threading.Thread(target=input_listener, args=(input_queue, scheduler.notify), daemon=True)
     input_thread.start()
 
+    # Exit through SystemExit on SIGTERM so atexit flushes pending agent state
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     print("Agent Loop Started. Type anywhere to interact with the agent.")
 
-    while True:
-        # 1. Process all pending user inputs
-        while not input_queue.empty():
-            user_text = input_queue.get()
-            if user_text:
-                print(f"\nUser: {user_text}")
-                # Default to routing user input to the primary agent
-                my_agent.history.append({"role": "user", "name": USER_NAME, "content": user_text})
-                
-                # Wake up agent if stopped
-                if my_agent.status == "STOPPED":
-                    my_agent.status = "RUNNING"
-                my_agent.save_state()
-        
-        # 2. Run Agent Step if RUNNING for all agents
-        any_running = False
-        for a in list(agents.values()):
-            if a.status == "RUNNING":
-                any_running = True
-                status = a.step()
-                if status == "STOPPED":
-                    print(f"[System] Agent {a.name} has stopped. Waiting for new input...")
-                elif status == "ERROR":
-                    print(f"[System] Agent {a.name} encountered an error. Stopping.")
-                    a.status = "STOPPED"
-        
-        if not any_running:
-            # Sleep briefly to avoid CPU spinning when idle
-            time.sleep(0.5)
+    try:
+        asyncio.run(scheduler.run(on_wakeup=lambda: route_user_input(my_agent, input_queue)))
+    except KeyboardInterrupt:
+        pass
+
+def route_user_input(my_agent, input_queue):
+    """Moves all queued user lines into the primary agent as a single message."""
+    lines = []
+    while not input_queue.empty():
+        user_text = input_queue.get()
+        if user_text:
+            print(f"\nUser: {user_text}")
+            lines.append(user_text)
+
+    if lines:
+        # Default to routing user input to the primary agent; post() wakes it if stopped
+        my_agent.post({"role": "user", "name": USER_NAME, "content": "\n".join(lines)})
 
 if __name__ == "__main__":
     main()
@@ -2,10 +2,14 @@ from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 from typing_extensions import Literal
 
+class ToolCall(BaseModel):
+    id: str  # tool_call_id the tool result must answer
+    name: str
+    arguments: str = "{}"  # raw JSON arguments as returned by the model
+
 class AgentStep(BaseModel):
-    reasoning: str  # 強制模型寫下思考過程 (Chain of Thought)
-    tool_name: Optional[str] = None  # 決定要用的工具名稱
-    tool_args: Optional[Dict[str, str]] = None  # tool arguments (all values as strings)
+    reasoning: str = ""  # 模型的思考過程 (assistant message content)
+    tool_calls: List[ToolCall] = []  # native function calls requested in this step
 
 class tool(BaseModel):
     name: str
@@ -21,3 +25,21 @@ class ltm(BaseModel):
     active_for: List[str]
     visible_to: List[str]
     except_for: List[str] = []
+
+
+class STMEntry(BaseModel):
+    text: str
+    source: str = "remember"  # remember, summary, compressed, edit
+    created: float  # epoch seconds
+    updated: float  # last insert or merge; expiry counts from here
+    hash: str  # of the normalized text, for exact-duplicate lookups
+    priority: int = 0  # higher lives longer and is evicted last
+    hits: int = 1  # inserts merged into this entry
+    compressed: bool = False  # unchanged since the last compress_stm()
+
+
+class SummaryNode(BaseModel):
+    text: str
+    level: int = 0  # 0 summarizes messages; level n + 1 rolls up `fanout` level-n summaries
+    messages: int  # history messages covered
+    created: float  # epoch seconds
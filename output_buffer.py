@@ -0,0 +1,132 @@
+import os
+import tempfile
+from line_index import LineIndex
+from config import COMMAND_OUTPUT_MEMORY_BYTES, COMMAND_OUTPUT_SPILL_BYTES
+
+
+class OutputBuffer:
+    """
+    Bounded store for the output of one command.
+
+    Every byte has an absolute offset in the output stream. The newest
+    `memory_limit` bytes stay in memory. Older bytes are spilled to an
+    anonymous temp file holding at most `spill_limit` bytes; when that file is
+    full it is discarded and a fresh one started, so the oldest output is
+    dropped. `first_offset` is the earliest byte still available, and `total`
+    is the number of bytes ever written.
+
+    A sparse `LineIndex` over the stream makes "last N lines" and line-range
+    reads independent of how much output came before. The buffer is not
+    thread-safe; `CommandSession` serializes access.
+    """
+
+    def __init__(self, memory_limit: int = COMMAND_OUTPUT_MEMORY_BYTES,
+                 spill_limit: int = COMMAND_OUTPUT_SPILL_BYTES):
+        self.memory_limit = memory_limit
+        self.spill_limit = spill_limit
+        self.index = LineIndex()
+        self._memory = bytearray()
+        self._memory_start = 0
+        self._spill = None
+        self._spill_start = 0
+        self._spill_size = 0
+
+    @property
+    def total(self) -> int:
+        return self.index.size
+
+    @property
+    def first_offset(self) -> int:
+        return self._spill_start if self._spill_size else self._memory_start
+
+    @property
+    def line_count(self) -> int:
+        return self.index.line_count
+
+    def append(self, data: bytes):
+        if not data:
+            return
+        self.index.feed(data)
+        self._memory += data
+        if len(self._memory) > self.memory_limit:
+            # Move the older half out at once so the memmove is amortized over many appends
+            cut = len(self._memory) - self.memory_limit // 2
+            self._evict(bytes(self._memory[:cut]))
+            del self._memory[:cut]
+            self._memory_start += cut
+            self.index.drop_before(self.first_offset)
+
+    def _evict(self, data):
+        if len(data) > self.spill_limit:
+            # Too big for the spill file, keep only its newest part there
+            self._drop_spill(self._memory_start + len(data) - self.spill_limit)
+            data = data[len(data) - self.spill_limit:]
+        elif self._spill_size + len(data) > self.spill_limit:
+            self._drop_spill(self._memory_start)
+        if not data:
+            return
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix="magi_output_")
+        os.pwrite(self._spill.fileno(), data, self._spill_size)
+        self._spill_size += len(data)
+
+    def _drop_spill(self, new_start):
+        """Discards everything spilled so far; the next spilled byte has offset `new_start`."""
+        if self._spill is not None:
+            self._spill.truncate(0)
+        self._spill_size = 0
+        self._spill_start = new_start
+
+    def read(self, start: int, end: int = None) -> bytes:
+        """Bytes in [start, end) of the stream, clamped to what is still available."""
+        end = self.total if end is None else min(end, self.total)
+        start = max(start, self.first_offset)
+        if start >= end:
+            return b""
+        parts = []
+        if start < self._memory_start:
+            spill_end = min(end, self._memory_start)
+            parts.append(os.pread(self._spill.fileno(), spill_end - start, start - self._spill_start))
+            start = spill_end
+        if start < end:
+            parts.append(bytes(self._memory[start - self._memory_start:end - self._memory_start]))
+        return b"".join(parts)
+
+    def line_offset(self, line: int) -> int:
+        """Start offset of `line`, or of the first complete line still available if it was dropped."""
+        located = self.index.locate(line)
+        if located is None:
+            # Older lines are gone; start after the first newline that is still available
+            offset = self.first_offset
+            if offset > 0:
+                head = self.read(offset, offset + self.memory_limit)
+                newline = head.find(b"\n")
+                offset = offset + newline + 1 if newline >= 0 else offset
+            return offset
+        offset, skip = located
+        while skip > 0:
+            chunk = self.read(offset, offset + 65536)
+            if not chunk:
+                break
+            pos = 0
+            while skip > 0:
+                newline = chunk.find(b"\n", pos)
+                if newline < 0:
+                    break
+                pos = newline + 1
+                skip -= 1
+            offset += pos if skip == 0 else len(chunk)
+        return offset
+
+    def tail_offset(self, n: int) -> int:
+        """Start offset of the last `n` lines."""
+        return self.line_offset(max(0, self.line_count - n))
+
+    def close(self):
+        """Releases the spill file and the in-memory bytes."""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        self._spill_size = 0
+        self._spill_start = self._memory_start = self.total
+        self._memory = bytearray()
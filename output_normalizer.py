@@ -0,0 +1,94 @@
+import codecs
+import re
+
+# CSI (colors, cursor movement, erase), OSC (window titles, hyperlinks) and two-byte escapes
+_ANSI = re.compile(r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[@-_]")
+# Remaining control characters, except tab and carriage return
+_CONTROL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_NUMBERS = re.compile(r"\d+")
+
+
+class OutputNormalizer:
+    """
+    Turns raw terminal output into what a person would read on the screen.
+
+    Output is fed in chunks as it is read; `feed()` returns the lines completed
+    so far and `finish()` the rest, after which the normalizer can be reused.
+
+    - ANSI escape sequences and other control characters are removed.
+    - A carriage return overwrites the line from its start, so a progress bar
+      redrawn a thousand times leaves only its final state.
+    - Blank lines are dropped.
+    - A run of identical lines becomes one line with an "(x N)" marker. A run
+      of at least `min_similar` lines that differ only in their numbers
+      ("Downloading 3/120 ...") keeps its first and last line around an
+      "(x N similar lines)" marker.
+    """
+
+    def __init__(self, min_similar: int = 4):
+        self.min_similar = min_similar
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._partial = ""
+        self._run = []
+        self._run_key = None
+        self._run_count = 0
+        self._run_identical = True
+
+    def feed(self, data: bytes) -> list:
+        lines = (self._partial + self._decoder.decode(data)).split("\n")
+        self._partial = lines.pop()
+        out = []
+        for line in lines:
+            self._add(self.clean_line(line), out)
+        return out
+
+    def finish(self) -> list:
+        out = []
+        rest = self._partial + self._decoder.decode(b"", final=True)
+        self._decoder.reset()
+        self._partial = ""
+        self._add(self.clean_line(rest), out)
+        self._flush_run(out)
+        return out
+
+    @staticmethod
+    def clean_line(line: str) -> str:
+        """Strips escapes and applies carriage-return overwrites to one line."""
+        line = _CONTROL.sub("", _ANSI.sub("", line))
+        if "\r" in line:
+            screen = ""
+            for segment in line.split("\r"):
+                screen = segment + screen[len(segment):]
+            line = screen
+        return line.rstrip()
+
+    def _add(self, line, out):
+        if not line:
+            return
+        # Only lines with words fold as similar; a column of bare numbers (`seq`, ids) is data
+        key = _NUMBERS.sub("#", line) if any(c.isalpha() for c in line) else line
+        if self._run_count and key != self._run_key:
+            self._flush_run(out)
+        if self._run_count == 0:
+            self._run_key = key
+            self._run_identical = True
+        elif line != self._run[-1]:
+            self._run_identical = False
+        if len(self._run) < self.min_similar:
+            self._run.append(line)
+        else:
+            self._run[-1] = line
+        self._run_count += 1
+
+    def _flush_run(self, out):
+        count = self._run_count
+        if count == 0:
+            return
+        if self._run_identical:
+            out.append(self._run[0] if count == 1 else f"{self._run[0]} (x {count})")
+        elif count < self.min_similar:
+            out.extend(self._run)
+        else:
+            out.extend([self._run[0], f"... (x {count - 2} similar lines)", self._run[-1]])
+        self._run = []
+        self._run_count = 0
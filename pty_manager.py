@@ -1,102 +1,490 @@
 import os
 import pty
-import select
+import asyncio
+import contextlib
+import concurrent.futures
 import signal
+import selectors
 import time
 import threading
+from output_buffer import OutputBuffer
+from output_normalizer import OutputNormalizer
+from shell_pool import ShellPool
+from context_budget import count_tokens
+from config import COMMAND_OUTPUT_HEAD_LINES, COMPLETION_TAIL_LINES, SHELL_POOL_ENABLED
 
 
 class CommandSession:
-    """Represents a single PTY command session."""
+    """
+    Represents a single PTY command session.
+
+    Output and exit status are filled in by the `PtyReactor` thread as they
+    happen; readers only look at the collected state, under `_cond`.
+    """
 
     def __init__(self, command_id, pid, fd):
         self.command_id = command_id
         self.pid = pid
         self.fd = fd
-        self.output_lines = []
+        self.output = OutputBuffer()
+        # Byte offset up to which each reader has seen the output
+        self._cursors = {}
+        self.command = None
+        self.owner = None
+        self.started_at = time.monotonic()
+        # Set once run() returned while the command was still running; the owner is then told when it ends
+        self.notify_on_exit = False
+        self._done_seen_by = set()
+        self._reporting = {}
+        # The owner was being reported to when the command finished; decided when that report ends
+        self._notify_deferred = False
+        # Called on the reactor thread once the command is done
+        self.on_done = None
+        # Signal the whole process group (pooled shells) instead of just `pid`
+        self.kill_group = False
+        self.input_written = False
+        self.terminating = False
+        # What output normalization kept out of the results so far
+        self.bytes_saved = 0
+        self.tokens_saved = 0
+        self._watchers = []
         self.status = "running"
         self.exit_code = None
-        self._lock = threading.Lock()
+        self._exited = False
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def bytes_received(self):
+        return self.output.total
+
+    def _append_output(self, data):
+        """Called by the reactor with raw bytes read from the PTY."""
+        with self._cond:
+            self.output.append(data)
+            self._changed()
+
+    def _on_exit(self, wait_status):
+        """Called by the reactor once the process has been reaped (`wait_status` None if it couldn't be)."""
+        if wait_status is None:
+            exit_code = -1
+        elif os.WIFEXITED(wait_status):
+            exit_code = os.WEXITSTATUS(wait_status)
+        elif os.WIFSIGNALED(wait_status):
+            exit_code = -os.WTERMSIG(wait_status)
+        else:
+            exit_code = -1
+        self._on_exit_code(exit_code)
+
+    def _on_exit_code(self, exit_code):
+        with self._cond:
+            self._exited = True
+            self.exit_code = exit_code
+            self._update_status()
+
+    def _on_closed(self):
+        """Called by the reactor after the fd was drained and closed."""
+        with self._cond:
+            self._closed = True
+            self._update_status()
+
+    def _finished(self):
+        """Called once, after the session became done for good."""
+        if self.on_done is not None:
+            try:
+                self.on_done(self)
+            except Exception as e:
+                print(f"[Error] Command completion handler failed: {e}")
 
-    def _collect_output(self, timeout=0.1):
-        """Read any available output from the PTY fd."""
+    def _update_status(self):
+        # Done once the process is reaped and its output fully collected, whichever comes last
+        if self._exited and self._closed:
+            self.status = "done"
+        self._changed()
+
+    def _changed(self):
+        """Wakes blocked readers and resolves futures whose condition now holds. Caller holds `_cond`."""
+        self._cond.notify_all()
+        if self._watchers:
+            pending = []
+            for predicate, future in self._watchers:
+                if future.done():
+                    # Cancelled by a waiter that timed out
+                    continue
+                if predicate():
+                    future.set_result(True)
+                else:
+                    pending.append((predicate, future))
+            self._watchers = pending
+
+    def watch(self, predicate):
+        """Returns a concurrent.futures.Future resolved once `predicate()` holds; checked on every change."""
+        future = concurrent.futures.Future()
+        with self._cond:
+            if predicate():
+                future.set_result(True)
+            else:
+                self._watchers.append((predicate, future))
+        return future
+
+    async def _await(self, predicate, timeout):
+        """Waits for `predicate()` without blocking the event loop. Returns whether it holds."""
         try:
-            while True:
-                ready, _, _ = select.select([self.fd], [], [], timeout)
-                if not ready:
-                    break
-                data = os.read(self.fd, 4096)
-                if not data:
-                    break
-                text = data.decode("utf-8", errors="replace")
-                with self._lock:
-                    # Split by newline, merge with last partial line
-                    parts = text.split("\n")
-                    if self.output_lines and not self.output_lines[-1].endswith("\n"):
-                        self.output_lines[-1] += parts[0]
-                        parts = parts[1:]
-                    for part in parts:
-                        if part:
-                            self.output_lines.append(part)
-        except OSError:
-            # fd closed or process exited
+            await asyncio.wait_for(asyncio.wrap_future(self.watch(predicate)), timeout)
+        except TimeoutError:
             pass
-
-    def _check_exit(self):
-        """Check if the process has exited."""
-        if self.status != "running":
-            return
+        with self._cond:
+            return predicate()
+
+    def watch_exit(self):
+        """Requests a completion notification. Returns False if the command is already done."""
+        with self._cond:
+            if self.status == "done":
+                return False
+            self.notify_on_exit = True
+            return True
+
+    @contextlib.contextmanager
+    def reporting_to(self, reader):
+        """
+        Marks `reader` as about to receive a status result. If the command finishes
+        meanwhile, the completion event waits until the report ends; it is sent then
+        unless the result returned to the reader already said "done" (see `report()`).
+        """
+        with self._cond:
+            self._reporting[reader] = self._reporting.get(reader, 0) + 1
         try:
-            pid, wait_status = os.waitpid(self.pid, os.WNOHANG)
-            if pid != 0:
-                self.status = "done"
-                if os.WIFEXITED(wait_status):
-                    self.exit_code = os.WEXITSTATUS(wait_status)
-                elif os.WIFSIGNALED(wait_status):
-                    self.exit_code = -os.WTERMSIG(wait_status)
-                else:
-                    self.exit_code = -1
-        except ChildProcessError:
-            self.status = "done"
-            self.exit_code = -1
+            yield
+        finally:
+            with self._cond:
+                self._reporting[reader] -= 1
+                if not self._reporting[reader]:
+                    del self._reporting[reader]
+                deferred = self._notify_deferred and self.owner not in self._reporting
+                if deferred:
+                    self._notify_deferred = False
+            if deferred:
+                self._finished()
+
+    def report(self, reader):
+        """
+        Status and exit code for a result returned to `reader`. A "done" result counts as
+        `reader` having seen the completion, so it gets no event for it. Caller holds `_cond`.
+        """
+        if self.status == "done" and reader is not None:
+            self._done_seen_by.add(reader)
+        return self.status, self.exit_code
+
+    def _should_notify(self):
+        """Decides (once) whether the owner must be told that the command finished."""
+        with self._cond:
+            owner = self.owner
+            if not self.notify_on_exit or owner is None or owner in self._done_seen_by:
+                return False
+            if owner in self._reporting:
+                # Sent when the report ends, if the result didn't say "done"
+                self._notify_deferred = True
+                return False
+            self._done_seen_by.add(owner)
+            return True
+
+    def wait_done(self, timeout):
+        """Blocks until the command is done or `timeout` seconds pass. Returns True if done."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.status == "done", timeout)
+
+    def wait_output(self, seen_bytes, timeout, quiet=0.1):
+        """
+        Blocks until output beyond `seen_bytes` arrives and then pauses for `quiet` seconds,
+        the command finishes, or `timeout` seconds pass.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.bytes_received > seen_bytes or self.status == "done", timeout):
+                return
+            while self.status != "done":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                seen = self.bytes_received
+                if not self._cond.wait_for(lambda: self.bytes_received > seen or self.status == "done",
+                                           min(quiet, remaining)):
+                    return
+
+    async def wait_done_async(self, timeout):
+        """Awaitable wait_done(): yields the event loop until the command is done or `timeout` passes."""
+        return await self._await(lambda: self.status == "done", timeout)
+
+    async def wait_output_async(self, seen_bytes, timeout, quiet=0.1):
+        """Awaitable wait_output()."""
+        deadline = time.monotonic() + timeout
+        if not await self._await(lambda: self.bytes_received > seen_bytes or self.status == "done", timeout):
+            return
+        while self.status != "done":
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            seen = self.bytes_received
+            if not await self._await(lambda: self.bytes_received > seen or self.status == "done",
+                                     min(quiet, remaining)):
+                return
 
     def get_output(self, max_lines=50):
         """Get recent output lines."""
-        self._collect_output(timeout=0.05)
-        self._check_exit()
-        with self._lock:
-            if max_lines and len(self.output_lines) > max_lines:
-                return self.output_lines[-max_lines:]
-            return list(self.output_lines)
+        with self._cond:
+            start = self.output.tail_offset(max_lines) if max_lines else self.output.first_offset
+            data = self.output.read(start)
+        # A character cut in half where old output was dropped decodes as U+FFFD
+        return [line for line in data.decode("utf-8", errors="replace").split("\n") if line]
+
+    def read_new(self, reader, since=None, max_lines=50):
+        """
+        Reads output incrementally.
+
+        Returns the output from byte offset `since` or, by default, from where
+        `reader` stopped last time, and moves that reader's cursor to the end.
+
+        Args:
+            reader (str): Who is reading (an agent name); each reader has its own cursor.
+            since (int): Explicit byte offset to read from. (optional)
+            max_lines (int): Show at most this many lines, the first few and the newest
+                ones around an elision marker; 0 for no limit.
+
+        Returns:
+            (text, next_offset, skipped_bytes): `text` is normalized by `OutputNormalizer`.
+            `skipped_bytes` counts output after the start offset that is not shown,
+            because it was dropped from the buffer or elided by `max_lines`.
+        """
+        with self._cond:
+            end = self.output.total
+            start = self._cursors.get(reader, 0) if since is None else min(max(int(since), 0), end)
+            shown = max(start, self.output.first_offset)
+            head_end = tail_start = shown
+            if max_lines:
+                head_lines = min(COMMAND_OUTPUT_HEAD_LINES, max_lines // 2)
+                head_end = self._skip_lines(shown, end, head_lines)
+                tail_start = max(self.output.tail_offset(max_lines - head_lines), head_end)
+            head = self.output.read(shown, head_end)
+            tail = self.output.read(tail_start, end)
+            self._cursors[reader] = end
+
+        elided = tail_start - head_end
+        normalizer = OutputNormalizer()
+        lines = normalizer.feed(head)
+        if elided:
+            lines += normalizer.finish()
+            lines.append(f"... ({elided} bytes omitted) ...")
+        lines += normalizer.feed(tail)
+        lines += normalizer.finish()
+        text = "\n".join(lines)
+        self._count_savings(head + tail, text)
+        return text, end, shown - start + elided
+
+    def _skip_lines(self, offset, end, lines):
+        """Offset just past the first `lines` lines from `offset`, looking at most 64 KiB ahead."""
+        chunk = self.output.read(offset, min(end, offset + 65536))
+        pos = 0
+        for _ in range(lines):
+            newline = chunk.find(b"\n", pos)
+            if newline < 0:
+                break
+            pos = newline + 1
+        return offset + pos
+
+    def _count_savings(self, raw, text):
+        if not raw:
+            return
+        saved_bytes = len(raw) - len(text.encode("utf-8"))
+        if saved_bytes <= 0:
+            return
+        saved_tokens = max(0, count_tokens(raw.decode("utf-8", errors="replace")) - count_tokens(text))
+        with self._cond:
+            self.bytes_saved += saved_bytes
+            self.tokens_saved += saved_tokens
+
+    def close(self):
+        """Releases the output buffer. Only valid once the session is done."""
+        with self._cond:
+            self.output.close()
 
     def write(self, text):
         """Write text to the PTY stdin."""
-        try:
-            os.write(self.fd, text.encode("utf-8"))
-        except OSError as e:
-            return f"Error writing to process: {e}"
+        with self._cond:
+            # The fd number may already belong to another file once the reactor closed it
+            if self._closed:
+                return "Error writing to process: it has already exited."
+            try:
+                os.write(self.fd, text.encode("utf-8"))
+                self.input_written = True
+            except OSError as e:
+                return f"Error writing to process: {e}"
         return None
 
+    TERMINATE_STEPS = ((signal.SIGTERM, 0.2), (signal.SIGKILL, 1.0))
+
+    def _signal(self, sig):
+        try:
+            if self.kill_group:
+                os.killpg(self.pid, sig)
+            else:
+                os.kill(self.pid, sig)
+        except ProcessLookupError:
+            pass
+
     def terminate(self):
-        """Kill the process and clean up."""
+        """Kill the process and wait for the reactor to collect it."""
+        self.terminating = True
+        for sig, grace in self.TERMINATE_STEPS:
+            self._signal(sig)
+            if self.wait_done(grace):
+                return
+        self._force_done()
+
+    async def terminate_async(self):
+        """Awaitable terminate()."""
+        self.terminating = True
+        for sig, grace in self.TERMINATE_STEPS:
+            self._signal(sig)
+            if await self.wait_done_async(grace):
+                return
+        self._force_done()
+
+    def _force_done(self):
+        with self._cond:
+            if self.status != "done":
+                self.status = "done"
+                self.exit_code = -1
+                self._changed()
+
+
+class PtyReactor:
+    """
+    One background thread that serves every command session.
+
+    It drains each session's PTY as soon as output is available, so chatty
+    commands never stall on a full kernel buffer, and it reaps children the
+    moment they exit by watching a pidfd per process (Linux). Where pidfds are
+    unavailable, exits are detected by a 0.1 s `waitpid(WNOHANG)` sweep that only
+    runs while some process is still alive.
+
+    Sessions are handed over with `register()`; the selector itself is only
+    touched by the reactor thread.
+    """
+
+    READ_CHUNK = 65536
+    POLL_INTERVAL = 0.1
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._incoming = []
+        self._selector = None
+        self._wake_r = self._wake_w = None
+        # Sessions without a pidfd whose exit must be polled
+        self._polled = set()
+
+    def register(self, session):
+        with self._lock:
+            if self._thread is None:
+                self._selector = selectors.DefaultSelector()
+                self._wake_r, self._wake_w = os.pipe()
+                os.set_blocking(self._wake_r, False)
+                self._selector.register(self._wake_r, selectors.EVENT_READ, ("wake", None))
+                self._thread = threading.Thread(target=self._run, name="pty-reactor", daemon=True)
+                self._thread.start()
+            self._incoming.append(session)
+        os.write(self._wake_w, b"\0")
+
+    def _run(self):
+        while True:
+            timeout = self.POLL_INTERVAL if self._polled else None
+            for key, _ in self._selector.select(timeout):
+                kind, session = key.data
+                if kind == "wake":
+                    self._accept()
+                elif kind == "output":
+                    self._read(session)
+                elif kind == "exit":
+                    self._reap(session, key.fd)
+            for session in list(self._polled):
+                self._poll_exit(session)
+
+    def _accept(self):
         try:
-            os.kill(self.pid, signal.SIGTERM)
-            time.sleep(0.2)
-            try:
-                os.kill(self.pid, signal.SIGKILL)
-            except ProcessLookupError:
+            while os.read(self._wake_r, 4096):
                 pass
-        except ProcessLookupError:
+        except BlockingIOError:
             pass
-        self._collect_output(timeout=0.1)
-        self._check_exit()
-        if self.status != "done":
-            self.status = "done"
-            self.exit_code = -1
+        with self._lock:
+            incoming, self._incoming = self._incoming, []
+        for session in incoming:
+            os.set_blocking(session.fd, False)
+            self._selector.register(session.fd, selectors.EVENT_READ, ("output", session))
+            try:
+                pidfd = os.pidfd_open(session.pid)
+            except (AttributeError, OSError):
+                self._polled.add(session)
+            else:
+                self._selector.register(pidfd, selectors.EVENT_READ, ("exit", session))
+
+    def _read(self, session, drain=False):
+        """Reads available output; closes the fd on EOF. With `drain`, reads until the PTY is empty."""
+        while True:
+            try:
+                data = os.read(session.fd, self.READ_CHUNK)
+            except BlockingIOError:
+                return
+            except OSError:
+                # EIO: every slave end is closed
+                data = b""
+            if not data:
+                self._close(session)
+                return
+            session._append_output(data)
+            if not drain:
+                return
+
+    def _close(self, session):
+        if session._closed:
+            return
         try:
-            os.close(self.fd)
-        except OSError:
+            self._selector.unregister(session.fd)
+        except (KeyError, ValueError):
             pass
+        # Under the session lock, so write() never sees a closed (and possibly reused) fd number
+        with session._cond:
+            try:
+                os.close(session.fd)
+            except OSError:
+                pass
+            session._on_closed()
+
+    def _reap(self, session, pidfd):
+        self._selector.unregister(pidfd)
+        os.close(pidfd)
+        try:
+            _, wait_status = os.waitpid(session.pid, 0)
+        except ChildProcessError:
+            wait_status = None
+        self._finish(session, wait_status)
+
+    def _poll_exit(self, session):
+        try:
+            pid, wait_status = os.waitpid(session.pid, os.WNOHANG)
+        except ChildProcessError:
+            pid, wait_status = session.pid, None
+        if pid != 0:
+            self._polled.discard(session)
+            self._finish(session, wait_status)
+
+    def _finish(self, session, wait_status):
+        session._on_exit(wait_status)
+        # Output written before the exit is still queued in the PTY; collect it, then release the fd
+        # even if a background grandchild keeps the slave end open
+        if not session._closed:
+            self._read(session, drain=True)
+            self._close(session)
+        session._finished()
 
 
 class CommandManager:
@@ -104,41 +492,52 @@ class CommandManager:
 
     MAX_DONE_SESSIONS = 5
 
-    def __init__(self):
+    def __init__(self, use_shell_pool=SHELL_POOL_ENABLED):
         self._sessions = {}
         self._counter = 0
+        # Tool calls of different agents (and of one parallel step) reach the manager concurrently
+        self._lock = threading.Lock()
+        self._reactor = PtyReactor()
+        self.shell_pool = ShellPool(self._reactor) if use_shell_pool else None
+        # Callables (agent_name, text) that deliver completion events of backgrounded commands
+        self.completion_listeners = []
 
     def _next_id(self):
         self._counter += 1
         return f"cmd_{self._counter}"
 
+    def _get(self, command_id):
+        with self._lock:
+            return self._sessions.get(command_id)
+
     def _cleanup(self):
         """Remove old completed sessions, keeping at most MAX_DONE_SESSIONS."""
-        done = [cid for cid, s in self._sessions.items() if s.status == "done"]
-        if len(done) > self.MAX_DONE_SESSIONS:
-            # Remove oldest done sessions (lower cmd_ numbers first)
-            to_remove = sorted(done)[: len(done) - self.MAX_DONE_SESSIONS]
-            for cid in to_remove:
-                del self._sessions[cid]
-
-    def run(self, command, cwd=None, timeout=1):
-        """
-        Spawn a command in a new PTY.
-        Wait up to `timeout` seconds for it to finish.
-        Returns a dict with status, output, and command_id.
-        """
-        timeout = min(max(float(timeout), 0), 10)
+        with self._lock:
+            done = [cid for cid, s in self._sessions.items() if s.status == "done"]
+            if len(done) > self.MAX_DONE_SESSIONS:
+                # Remove oldest done sessions (lower cmd_ numbers first)
+                to_remove = sorted(done, key=lambda cid: int(cid.split("_")[1]))[: len(done) - self.MAX_DONE_SESSIONS]
+                for cid in to_remove:
+                    self._sessions.pop(cid).close()
+
+    def _spawn(self, command, cwd, reader):
+        """Starts `command` in a new PTY, or on a pooled shell if the pool is enabled."""
         self._cleanup()
 
-        env = os.environ.copy()
-        env["TERM"] = "dumb"
-        env["PAGER"] = "cat"
-
         if cwd:
             cwd = os.path.expanduser(cwd)
             if not os.path.isabs(cwd):
                 cwd = os.path.join(os.getcwd(), cwd)
 
+        if self.shell_pool is not None:
+            session = self._new_session(command, reader, pid=None, fd=None)
+            self.shell_pool.start(session, command, cwd or os.getcwd())
+            return session
+
+        env = os.environ.copy()
+        env["TERM"] = "dumb"
+        env["PAGER"] = "cat"
+
         pid, fd = pty.openpty()
         child_pid = os.fork()
 
@@ -160,108 +559,183 @@ class CommandManager:
         else:
             # Parent process
             os.close(fd)
+            session = self._new_session(command, reader, pid=child_pid, fd=pid)
+            self._reactor.register(session)
+            return session
+
+    def _new_session(self, command, reader, pid, fd):
+        with self._lock:
             command_id = self._next_id()
-            session = CommandSession(command_id, child_pid, pid)
+            session = CommandSession(command_id, pid, fd)
+            session.command = command
+            session.owner = reader
+            session.on_done = self._on_session_done
             self._sessions[command_id] = session
+        return session
 
-            # Wait for completion or timeout
-            deadline = time.monotonic() + timeout
-            while time.monotonic() < deadline:
-                session._collect_output(timeout=0.1)
-                session._check_exit()
-                if session.status == "done":
-                    break
+    def run(self, command, cwd=None, timeout=1, reader=None):
+        """
+        Spawn a command in a new PTY.
+        Wait up to `timeout` seconds for it to finish.
+        Returns a dict with status, output, and command_id. The output returned here
+        counts as read by `reader`.
+        """
+        timeout = min(max(float(timeout), 0), 10)
+        session = self._spawn(command, cwd, reader)
+        # Wait for completion or timeout; the reactor wakes us on exit
+        done = session.wait_done(timeout)
+        return self._run_result(session, done, reader)
 
-            # Final collect
-            session._collect_output(timeout=0.05)
-            session._check_exit()
+    async def arun(self, command, cwd=None, timeout=1, reader=None):
+        """Awaitable run(): other tasks keep running while the command has not finished."""
+        timeout = min(max(float(timeout), 0), 10)
+        session = self._spawn(command, cwd, reader)
+        done = await session.wait_done_async(timeout)
+        return self._run_result(session, done, reader)
+
+    def _run_result(self, session, done, reader):
+        done = done or not session.watch_exit()
+        output, _, skipped = session.read_new(reader, max_lines=100)
+        result = {
+            "status": "done" if done else "running",
+            "command_id": session.command_id,
+            "output": output,
+        }
+        if skipped:
+            result["skipped_bytes"] = skipped
+        if done:
+            result["exit_code"] = session.exit_code
+        return result
 
-            output = "\n".join(session.get_output(max_lines=100))
-            result = {
-                "status": session.status,
-                "command_id": command_id,
-                "output": output,
-            }
-            if session.status == "done":
-                result["exit_code"] = session.exit_code
-                # Clean up finished sessions
-                try:
-                    os.close(pid)
-                except OSError:
-                    pass
-
-            return result
-
-    def status(self, command_id, wait=0, output_lines=50):
-        """Check status and get output of a command."""
-        session = self._sessions.get(command_id)
+    def status(self, command_id, wait=0, output_lines=50, since=None, reader=None):
+        """
+        Check status and get the output `reader` hasn't seen yet (or everything from byte offset `since`).
+        """
+        session = self._get(command_id)
         if not session:
             return {"error": f"Command '{command_id}' not found."}
 
         wait = min(max(float(wait), 0), 10)
-        output_lines = int(output_lines)
+        with session.reporting_to(reader):
+            if wait > 0:
+                session.wait_done(wait)
+            return self._status_result(session, output_lines, since, reader)
+
+    async def astatus(self, command_id, wait=0, output_lines=50, since=None, reader=None):
+        """Awaitable status()."""
+        session = self._get(command_id)
+        if not session:
+            return {"error": f"Command '{command_id}' not found."}
 
-        if wait > 0 and session.status == "running":
-            deadline = time.monotonic() + wait
-            while time.monotonic() < deadline:
-                session._collect_output(timeout=0.1)
-                session._check_exit()
-                if session.status == "done":
-                    break
+        wait = min(max(float(wait), 0), 10)
+        with session.reporting_to(reader):
+            if wait > 0:
+                await session.wait_done_async(wait)
+            return self._status_result(session, output_lines, since, reader)
+
+    def _status_result(self, session, output_lines, since, reader):
+        # Output and status from one moment: a "done" result has all the output
+        with session._cond:
+            output, next_offset, skipped = session.read_new(reader, since=since, max_lines=int(output_lines))
+            return self._result(session, output, skipped, reader, next_offset=next_offset)
+
+    def send_input(self, command_id, text=None, terminate=False, wait=1, reader=None):
+        """Send input to a command or terminate it. Returns the output produced since `reader`'s last read."""
+        session = self._get(command_id)
+        if not session:
+            return {"error": f"Command '{command_id}' not found."}
 
-        lines = session.get_output(max_lines=output_lines)
-        output = "\n".join(lines)
+        wait = min(max(float(wait), 0), 10)
 
-        result = {"status": session.status, "output": output}
-        if session.status == "done":
-            result["exit_code"] = session.exit_code
-        return result
+        if terminate:
+            with session.reporting_to(reader):
+                session.terminate()
+                return self._input_result(session, reader)
+
+        if text is not None:
+            with session.reporting_to(reader):
+                seen = session.bytes_received
+                err = session.write(text)
+                if err:
+                    return {"error": err}
+
+                # Wait for the response to arrive and settle, not for a fixed time
+                session.wait_output(seen, wait)
+
+                return self._input_result(session, reader)
+
+        return {"error": "Either 'text' or 'terminate' must be provided."}
 
-    def send_input(self, command_id, text=None, terminate=False, wait=1):
-        """Send input to a command or terminate it."""
-        session = self._sessions.get(command_id)
+    async def asend_input(self, command_id, text=None, terminate=False, wait=1, reader=None):
+        """Awaitable send_input()."""
+        session = self._get(command_id)
         if not session:
             return {"error": f"Command '{command_id}' not found."}
 
         wait = min(max(float(wait), 0), 10)
 
         if terminate:
-            session.terminate()
-            lines = session.get_output(max_lines=50)
-            return {
-                "status": session.status,
-                "exit_code": session.exit_code,
-                "output": "\n".join(lines),
-            }
+            with session.reporting_to(reader):
+                await session.terminate_async()
+                return self._input_result(session, reader)
 
         if text is not None:
-            err = session.write(text)
-            if err:
-                return {"error": err}
+            with session.reporting_to(reader):
+                seen = session.bytes_received
+                err = session.write(text)
+                if err:
+                    return {"error": err}
 
-            # Wait for output
-            time.sleep(min(wait, 0.5))
-            session._collect_output(timeout=wait)
-            session._check_exit()
+                await session.wait_output_async(seen, wait)
 
-            lines = session.get_output(max_lines=50)
-            result = {"status": session.status, "output": "\n".join(lines)}
-            if session.status == "done":
-                result["exit_code"] = session.exit_code
-            return result
+                return self._input_result(session, reader)
 
         return {"error": "Either 'text' or 'terminate' must be provided."}
 
+    def _on_session_done(self, session):
+        """Tells the owner that a backgrounded command finished, with its exit code and unread output tail."""
+        if not session._should_notify():
+            return
+        tail, _, skipped = session.read_new(session.owner, max_lines=COMPLETION_TAIL_LINES)
+        elapsed = time.monotonic() - session.started_at
+        text = (f"[Command finished] {session.command_id} `{session.command}` exited with code "
+                f"{session.exit_code} after {elapsed:.1f}s.")
+        if tail:
+            skipped_note = f" ({skipped} bytes not shown)" if skipped else ""
+            text += f"\nOutput you haven't seen{skipped_note}:\n{tail}"
+        for listener in list(self.completion_listeners):
+            listener(session.owner, text)
+
+    def _input_result(self, session, reader):
+        with session._cond:
+            output, _, skipped = session.read_new(reader)
+            return self._result(session, output, skipped, reader)
+
+    @staticmethod
+    def _result(session, output, skipped, reader, next_offset=None):
+        """Builds a status result for `reader`. Caller holds `session._cond`."""
+        status, exit_code = session.report(reader)
+        result = {"status": status, "output": output}
+        if skipped:
+            result["skipped_bytes"] = skipped
+        if next_offset is not None:
+            result["next_offset"] = next_offset
+        if status == "done":
+            result["exit_code"] = exit_code
+        return result
+
     def list_commands(self):
         """Return status summary of all tracked commands."""
+        with self._lock:
+            sessions = list(self._sessions.items())
         results = []
-        for cmd_id, session in self._sessions.items():
-            session._collect_output(timeout=0.02)
-            session._check_exit()
+        for cmd_id, session in sessions:
             entry = {
                 "command_id": cmd_id,
                 "status": session.status,
-                "output_lines": len(session.output_lines),
+                "output_lines": session.output.line_count,
+                "bytes_saved": session.bytes_saved,
+                "tokens_saved": session.tokens_saved,
             }
             if session.status == "done":
                 entry["exit_code"] = session.exit_code
@@ -0,0 +1,77 @@
+import asyncio
+from magi import agents, wakeup_hooks
+from config import MAX_CONCURRENT_LLM_REQUESTS
+
+
+class AgentScheduler:
+    """
+    Runs every RUNNING agent in its own asyncio task.
+
+    Steps of a single agent stay strictly sequential, while LLM calls of
+    different agents overlap. A shared semaphore caps how many requests are
+    in flight at once.
+
+    The scheduler sleeps on an event instead of polling: user input,
+    `send_message` and any other `agent.wake()` call `notify()`, which is safe
+    to call from any thread.
+    """
+
+    def __init__(self, max_concurrent_requests=MAX_CONCURRENT_LLM_REQUESTS):
+        self.limiter = asyncio.Semaphore(max_concurrent_requests)
+        self._tasks = {}
+        self._wakeup = asyncio.Event()
+        self._loop = None
+
+    def notify(self):
+        """Wakes the scheduler loop. Thread-safe; a no-op before run() starts."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # Loop shut down between the check and the call
+            pass
+
+    async def _drive(self, a):
+        """Steps one agent until it stops."""
+        while a.status == "RUNNING":
+            status = await a.astep(self.limiter)
+            if status == "STOPPED":
+                print(f"[System] Agent {a.name} has stopped. Waiting for new input...")
+            elif status == "ERROR":
+                print(f"[System] Agent {a.name} encountered an error. Stopping.")
+                a.status = "STOPPED"
+
+    def schedule(self):
+        """Starts a task for every RUNNING agent that doesn't have one yet. Returns True if any agent is active."""
+        for a in list(agents.values()):
+            task = self._tasks.get(a.name)
+            if a.status == "RUNNING" and (task is None or task.done()):
+                self._tasks[a.name] = asyncio.create_task(self._drive(a), name=f"agent:{a.name}")
+        return any(not t.done() for t in self._tasks.values())
+
+    async def run(self, on_wakeup=None):
+        """
+        Event loop of the runtime: waits for a wakeup, calls `on_wakeup` (e.g. to route
+        queued user input) and schedules agents. Runs until cancelled.
+        """
+        self._loop = asyncio.get_running_loop()
+        wakeup_hooks.append(self.notify)
+        try:
+            while True:
+                # Clear before handling so a notify() that races with us is never lost
+                self._wakeup.clear()
+                if on_wakeup:
+                    on_wakeup()
+                self.schedule()
+                await self._wakeup.wait()
+        finally:
+            wakeup_hooks.remove(self.notify)
+            await self.shutdown()
+
+    async def shutdown(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
@@ -0,0 +1,299 @@
+import os
+import pty
+import re
+import secrets
+import signal
+import threading
+from config import SHELL_POOL_SIZE, SHELL_POOL_MAX_USES
+
+# Runs in each pooled bash. Commands arrive NUL-terminated on fd 3, so they never pass through
+# the terminal (no echo, no line-length limit). Each one runs in a subshell, so `cd`, `export`
+# or `exit` can't leak into the next command; the sentinel carries its exit code.
+# `trap : INT` keeps Ctrl+C from killing the driver while the command itself still gets it.
+_DRIVER = r"""
+trap : INT
+while IFS= read -r -d '' -u 3 __magi_cmd; do
+    ( exec 3<&-; eval "$__magi_cmd" )
+    printf '\n__MAGI_%s_%d__\n' "$__magi_token" "$?"
+done
+"""
+
+
+class PooledShell:
+    """
+    A long-lived bash that runs one command at a time for the `ShellPool`.
+
+    While a command runs, the shell is leased to that command's `CommandSession`:
+    PTY output is forwarded to the session until the sentinel line carrying the
+    exit code shows up, which completes the session without closing anything.
+
+    To the `PtyReactor` a shell looks like a session (`fd`, `pid`,
+    `_append_output`, `_on_exit`, `_on_closed`, `_finished`); the reactor only
+    sees the shell die when it is recycled or crashes.
+    """
+
+    def __init__(self, pool, pid, fd, command_fd, token, cwd):
+        self.pool = pool
+        self.pid = pid
+        self.fd = fd
+        self.command_fd = command_fd
+        self.cwd = cwd
+        self.uses = 0
+        self.session = None
+        self.dead = False
+        self._closed = False
+        self._lock = threading.Condition()
+        self._pending = b""
+        self._marker = b"\r\n__MAGI_" + token.encode() + b"_"
+        self._sentinel = re.compile(re.escape(self._marker) + rb"(\d+)__\r\n")
+
+    @property
+    def _cond(self):
+        # The reactor closes the fd under this lock; while leased that must block the session's write()
+        session = self.session
+        return session._cond if session is not None else self._lock
+
+    def start(self, session, command):
+        """Leases the shell to `session` and sends it `command`. Returns False if the shell is unusable."""
+        with self._lock:
+            if self.dead:
+                return False
+            self.session = session
+            self._pending = b""
+        try:
+            os.write(self.command_fd, command.encode("utf-8") + b"\0")
+        except OSError:
+            with self._lock:
+                self.session = None
+            self.kill()
+            return False
+        return True
+
+    def _append_output(self, data):
+        """Reactor callback: forwards command output and detects the end-of-command sentinel."""
+        session = self.session
+        if session is None:
+            # Output while idle comes from a background job the last command left behind
+            self.kill()
+            return
+        self._pending += data
+        match = self._sentinel.search(self._pending)
+        if match is None:
+            # Hold back a tail that may be the start of a sentinel split across reads
+            keep = self._partial_sentinel_start(self._pending)
+            if keep > 0:
+                session._append_output(self._pending[:keep])
+                self._pending = self._pending[keep:]
+            return
+
+        output, stray = self._pending[:match.start()], self._pending[match.end():]
+        self._pending = b""
+        if output:
+            session._append_output(output)
+        with self._lock:
+            self.session = None
+            self.uses += 1
+        with session._cond:
+            session._on_exit_code(int(match.group(1)))
+            session._on_closed()
+        session._finished()
+        if stray or session.input_written or session.terminating:
+            # Leftover output or unread terminal input would leak into the next command, and a
+            # terminated command's signal may still be killing the shell after it printed the sentinel
+            self.kill()
+        else:
+            self.pool._release(self)
+
+    def _partial_sentinel_start(self, data):
+        """Index where a possibly incomplete sentinel begins, or len(data) if none does."""
+        start = max(0, len(data) - len(self._marker) - 8)
+        while True:
+            start = data.find(b"\r", start)
+            if start < 0:
+                return len(data)
+            tail = data[start:]
+            if len(tail) <= len(self._marker):
+                if self._marker.startswith(tail):
+                    return start
+            elif tail.startswith(self._marker) and re.fullmatch(rb"\d*(_(_(\r)?)?)?", tail[len(self._marker):]):
+                return start
+            start += 1
+
+    def _on_exit(self, wait_status):
+        """Reactor callback: the shell process itself ended."""
+        self.dead = True
+        session = self.session
+        if session is not None:
+            if self._pending:
+                session._append_output(self._pending)
+                self._pending = b""
+            session._on_exit(wait_status)
+
+    def _on_closed(self):
+        self.dead = True
+        self._closed = True
+        try:
+            os.close(self.command_fd)
+        except OSError:
+            pass
+        session = self.session
+        if session is not None:
+            session._on_closed()
+
+    def _finished(self):
+        with self._lock:
+            session, self.session = self.session, None
+        self.pool._discard(self)
+        if session is not None:
+            session._finished()
+
+    def kill(self):
+        """Recycles the shell: kills it with everything it started; the reactor collects it."""
+        with self._lock:
+            self.dead = True
+        self.pool._discard(self)
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class ShellPool:
+    """
+    Pre-spawned bash sessions, kept warm per working directory.
+
+    `run_command` normally pays for `openpty()`, a fork of the whole Python
+    process and a bash startup per command. With the pool, a command is written
+    to an idle shell that already runs in the right directory. Shells return to
+    the pool when their command ends; when the last idle one is taken, another
+    is spawned in the background so the next command finds one warm as well.
+
+    A shell is recycled (killed and replaced) after `max_uses` commands, when it
+    was terminated, when input was sent to its command (unread input would reach
+    the next one) or when it produces output while idle.
+    """
+
+    def __init__(self, reactor, size: int = SHELL_POOL_SIZE, max_uses: int = SHELL_POOL_MAX_USES):
+        self.reactor = reactor
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = {}
+        self._warming = {}
+        self._lock = threading.Lock()
+        self.spawned = 0
+        self.hits = 0
+
+    def start(self, session, command, cwd):
+        """Runs `command` for `session` on a pooled shell in `cwd`. Returns the shell."""
+        while True:
+            shell = self._acquire(cwd)
+            # The session is signalled through the shell: killing its process group recycles the shell
+            session.pid = shell.pid
+            session.fd = shell.fd
+            session.kill_group = True
+            if shell.start(session, command):
+                break
+        self._replenish_async(cwd)
+        return shell
+
+    def prewarm(self, cwd, count=None):
+        """Spawns idle shells for `cwd` until `count` (default: the pool size) are ready."""
+        count = self.size if count is None else count
+        while True:
+            with self._lock:
+                if len(self._idle.get(cwd, [])) >= count:
+                    return
+            self._release(self._spawn(cwd))
+
+    def _acquire(self, cwd):
+        with self._lock:
+            idle = self._idle.get(cwd)
+            while idle:
+                shell = idle.pop()
+                if not shell.dead:
+                    self.hits += 1
+                    return shell
+        return self._spawn(cwd)
+
+    def _release(self, shell):
+        if shell.dead:
+            return
+        if shell.uses >= self.max_uses:
+            shell.kill()
+            return
+        with self._lock:
+            idle = self._idle.setdefault(shell.cwd, [])
+            if len(idle) < self.size:
+                idle.append(shell)
+                return
+        shell.kill()
+
+    def _discard(self, shell):
+        with self._lock:
+            idle = self._idle.get(shell.cwd)
+            if idle and shell in idle:
+                idle.remove(shell)
+
+    def _replenish_async(self, cwd):
+        """Keeps one shell warm for the next command once the idle ones ran out."""
+        with self._lock:
+            if self._idle.get(cwd) or self._warming.get(cwd):
+                return
+            self._warming[cwd] = self._warming.get(cwd, 0) + 1
+        threading.Thread(target=self._warm_one, args=(cwd,), name="shell-pool-warmup", daemon=True).start()
+
+    def _warm_one(self, cwd):
+        try:
+            self._release(self._spawn(cwd))
+        finally:
+            with self._lock:
+                self._warming[cwd] -= 1
+
+    def _spawn(self, cwd):
+        token = secrets.token_hex(8)
+        env = os.environ.copy()
+        env["TERM"] = "dumb"
+        env["PAGER"] = "cat"
+        env["__magi_token"] = token
+
+        command_r, command_w = os.pipe()
+        master, slave = pty.openpty()
+        child_pid = os.fork()
+
+        if child_pid == 0:
+            # Child process
+            os.close(master)
+            os.close(command_w)
+            os.setsid()
+            import fcntl
+            import termios
+            fcntl.ioctl(slave, termios.TIOCSCTTY, 0)
+            os.dup2(slave, 0)
+            os.dup2(slave, 1)
+            os.dup2(slave, 2)
+            os.dup2(command_r, 3)
+            # dup2 onto itself keeps the close-on-exec flag
+            os.set_inheritable(3, True)
+            if slave > 3:
+                os.close(slave)
+            if command_r > 3:
+                os.close(command_r)
+            os.chdir(cwd)
+            os.execvpe("/bin/bash", ["/bin/bash", "--noprofile", "--norc", "-c", _DRIVER], env)
+
+        # Parent process
+        os.close(slave)
+        os.close(command_r)
+        shell = PooledShell(self, child_pid, master, command_w, token, cwd)
+        with self._lock:
+            self.spawned += 1
+        self.reactor.register(shell)
+        return shell
+
+    def shutdown(self):
+        """Kills every idle shell."""
+        with self._lock:
+            shells = [shell for idle in self._idle.values() for shell in idle]
+            self._idle.clear()
+        for shell in shells:
+            shell.kill()
@@ -0,0 +1,232 @@
+import os
+import json
+import copy
+import atexit
+import threading
+from typing import Optional
+from config import STATE_COMPACT_EVERY, STATE_FLUSH_INTERVAL, STATE_MAX_PENDING_SAVES
+
+
+class StateJournal:
+    """
+    Append-only persistence for one agent's state.
+
+    The state lives in two files next to each other:
+    - `<name>_state.json`: a snapshot, in the same format as the legacy state file plus a `seq` number.
+    - `<name>_state.journal`: one JSON line per save holding only what changed since the previous save
+      (new history messages and changed fields).
+
+    A save therefore costs O(new messages) instead of O(history). Every
+    `compact_every` saves, or whenever the history was replaced wholesale (e.g. by
+    summarization), the state is written to a fresh snapshot atomically and the
+    journal is truncated.
+    """
+
+    def __init__(self, snapshot_path: str, compact_every: int = STATE_COMPACT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = os.path.splitext(snapshot_path)[0] + ".journal"
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._saves_since_snapshot = 0
+        # What the files currently hold, used to compute the next delta
+        self._history_ref = None
+        self._history_len = 0
+        self._history_tail = None
+        self._fields = {}
+
+    def load(self) -> Optional[dict]:
+        """
+        Rebuilds the state from the snapshot plus the journal.
+        A torn last journal line (crash mid-write) is dropped. Returns None if nothing was saved yet.
+        """
+        with self._lock:
+            state = None
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            seq = state.get("seq", 0) if state else 0
+
+            if os.path.exists(self.journal_path):
+                state = state if state is not None else {"history": []}
+                good_bytes = 0
+                with open(self.journal_path, "rb") as f:
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            break
+                        good_bytes += len(line)
+                        if record["seq"] <= seq:
+                            # Already folded into the snapshot before a crash could truncate the journal
+                            continue
+                        seq = record["seq"]
+                        for op in record["ops"]:
+                            self._apply(state, op)
+                if good_bytes < os.path.getsize(self.journal_path):
+                    print(f"[System] Dropping torn tail of {self.journal_path}")
+                    with open(self.journal_path, "r+b") as f:
+                        f.truncate(good_bytes)
+
+            self._seq = seq
+            self._saves_since_snapshot = 0
+            if state is not None:
+                state.setdefault("history", [])
+                self._mark_persisted(state)
+            return state
+
+    @staticmethod
+    def _apply(state, op):
+        if op["op"] == "append":
+            state.setdefault("history", []).extend(op["messages"])
+        elif op["op"] == "set":
+            state.update(op["fields"])
+
+    def _mark_persisted(self, state, history_len=None):
+        history = state["history"]
+        n = len(history) if history_len is None else history_len
+        self._history_ref = history
+        self._history_len = n
+        self._history_tail = history[n - 1] if n else None
+        self._fields = {k: copy.deepcopy(v) for k, v in state.items() if k not in ("history", "seq")}
+
+    def save(self, state: dict):
+        """Persists `state`. `state["history"]` should be the agent's live list so appends can be detected."""
+        with self._lock:
+            history = state["history"]
+            n = len(history)
+            ops = []
+
+            # Appending to the same list keeps the persisted prefix; anything else replaced the history
+            unchanged_prefix = (
+                history is self._history_ref
+                and n >= self._history_len
+                and (self._history_len == 0 or history[self._history_len - 1] is self._history_tail)
+            )
+            if unchanged_prefix and n > self._history_len:
+                ops.append({"op": "append", "messages": history[self._history_len:n]})
+
+            missing = object()
+            changed = {
+                k: v for k, v in state.items()
+                if k != "history" and self._fields.get(k, missing) != v
+            }
+            if changed:
+                ops.append({"op": "set", "fields": changed})
+
+            if unchanged_prefix and not ops:
+                return
+
+            self._seq += 1
+            if not unchanged_prefix or self._saves_since_snapshot >= self.compact_every:
+                # Rewriting the history costs O(history) anyway, so fold everything into a snapshot
+                self._write_snapshot(state, n)
+            else:
+                line = json.dumps({"seq": self._seq, "ops": ops}, ensure_ascii=False)
+                with open(self.journal_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                self._saves_since_snapshot += 1
+            self._mark_persisted(state, n)
+
+    def compact(self, state: dict):
+        """Writes a snapshot of `state` now and truncates the journal."""
+        with self._lock:
+            self._seq += 1
+            n = len(state["history"])
+            self._write_snapshot(state, n)
+            self._mark_persisted(state, n)
+
+    def _write_snapshot(self, state, history_len):
+        snapshot = {k: v for k, v in state.items() if k != "history"}
+        snapshot["history"] = state["history"][:history_len]
+        snapshot["seq"] = self._seq
+
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # Ops already folded into the snapshot carry seq <= snapshot seq, so a crash here is harmless
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
+        self._saves_since_snapshot = 0
+
+
+class StatePersister:
+    """
+    Write-behind persistence for agent state.
+
+    `mark_dirty(owner)` only records that an owner (anything with a `write_state()`
+    method) needs saving. A background thread flushes all dirty owners every
+    `interval` seconds, so repeated saves of the same agent between flushes turn
+    into a single write of its latest state. Once `max_pending` saves are
+    outstanding the thread is woken to flush early, which bounds how much state
+    can be lost. `flush()` writes everything synchronously, and runs at exit.
+    """
+
+    def __init__(self, interval: float = STATE_FLUSH_INTERVAL, max_pending: int = STATE_MAX_PENDING_SAVES):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._dirty = {}
+        self._pending = 0
+        self._thread = None
+        self._closed = False
+        self.saves_requested = 0
+        self.writes = 0
+
+    def mark_dirty(self, owner):
+        with self._cond:
+            self._dirty[id(owner)] = owner
+            self._pending += 1
+            self.saves_requested += 1
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="state-persister", daemon=True)
+                self._thread.start()
+            if self._pending >= self.max_pending:
+                self._cond.notify()
+
+    def pending(self) -> int:
+        """Number of save requests not yet written."""
+        with self._cond:
+            return self._pending
+
+    def flush(self):
+        """Writes every dirty owner now. Returns once they are all on disk."""
+        # Held across take-and-write so a concurrent flush() waits for an in-progress one
+        with self._flush_lock:
+            with self._cond:
+                batch = list(self._dirty.values())
+                self._dirty.clear()
+                self._pending = 0
+            for owner in batch:
+                try:
+                    owner.write_state()
+                    self.writes += 1
+                except Exception as e:
+                    print(f"[Error] Failed to persist state: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._pending >= self.max_pending, timeout=self.interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self):
+        """Flushes outstanding state and stops the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.flush()
+
+
+# Module-level singleton shared by all agents
+state_persister = StatePersister()
+atexit.register(state_persister.close)
@@ -0,0 +1,205 @@
+import hashlib
+import math
+import re
+import threading
+import time
+from typing import Callable, List, Optional
+from models import STMEntry
+from config import STM_MAX_ENTRIES, STM_ENTRY_TTL, STM_DEDUP_SIMILARITY
+
+STM_HEADER = "\n\nShort-Term Memories:\n"
+
+_WORD = re.compile(r"\w+")
+# Prompt label per entry source; everything else renders as a plain memory
+_LABELS = {"summary": "[Summary]"}
+_LABEL_SOURCES = {"[Memory]": "remember", "[Summary]": "summary"}
+
+
+def normalize(text: str) -> str:
+    """Lowercased words of `text` joined by single spaces; punctuation and spacing don't tell entries apart."""
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def _hash(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class STMStore:
+    """
+    An agent's short-term memory as a list of `STMEntry`s.
+
+    - An insert whose normalized text equals an entry's, or whose word set
+      overlaps one by at least `similarity` (Jaccard), is merged into that
+      entry: the newer wording wins and the entry's lifetime restarts.
+    - An entry expires `ttl * (priority + 1)` seconds after its last update;
+      beyond `max_entries`, the lowest-priority, least recently updated
+      entries are evicted.
+    - `render()` is cached until the entries change.
+    - Entries inserted or reworded since they were last compressed are
+      reported by `changed()`, so compression only has to look at those.
+    """
+
+    def __init__(self, max_entries: int = STM_MAX_ENTRIES, ttl: float = STM_ENTRY_TTL,
+                 similarity: float = STM_DEDUP_SIMILARITY, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.clock = clock
+        self.entries: List[STMEntry] = []
+        self._lock = threading.RLock()
+        # hash -> entry, and id(entry) -> word set, for duplicate lookups
+        self._by_hash = {}
+        self._words = {}
+        self._next_expiry = math.inf
+        self._rendered = None
+        self.version = 0
+        self.merged = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, text: str, source: str = "remember", priority: int = 0) -> Optional[STMEntry]:
+        """Inserts `text`, merging it into an exact or near-duplicate entry. Returns the entry, None for blank text."""
+        text = text.strip()
+        if not text:
+            return None
+        key = normalize(text)
+        digest = _hash(key)
+        words = set(key.split())
+        now = self.clock()
+        with self._lock:
+            entry = self._by_hash.get(digest) or self._near_duplicate(words)
+            if entry is None:
+                entry = STMEntry(text=text, source=source, created=now, updated=now, hash=digest, priority=priority)
+                self.entries.append(entry)
+                self._index(entry, words)
+            else:
+                self.merged += 1
+                if entry.text != text:
+                    del self._by_hash[entry.hash]
+                    entry.text = text
+                    entry.hash = digest
+                    entry.compressed = False
+                    self._index(entry, words)
+                entry.updated = now
+                entry.hits += 1
+                entry.priority = max(entry.priority, priority)
+            while len(self.entries) > self.max_entries:
+                self._remove(min(self.entries, key=lambda e: (e.priority, e.updated)))
+            self._changed()
+            return entry
+
+    def _near_duplicate(self, words):
+        if not words:
+            return None
+        best, best_score = None, self.similarity
+        for entry in self.entries:
+            other = self._words[id(entry)]
+            if not other:
+                continue
+            score = len(words & other) / len(words | other)
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def _index(self, entry, words):
+        self._by_hash[entry.hash] = entry
+        self._words[id(entry)] = words
+
+    def _remove(self, entry):
+        # By identity: pydantic models compare by value
+        self.entries = [e for e in self.entries if e is not entry]
+        self._by_hash.pop(entry.hash, None)
+        self._words.pop(id(entry), None)
+
+    def _changed(self):
+        self.version += 1
+        self._rendered = None
+        self._next_expiry = min((self._expires_at(e) for e in self.entries), default=math.inf)
+
+    def _expires_at(self, entry):
+        return entry.updated + self.ttl * (entry.priority + 1)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drops the entries whose lifetime has passed. Returns how many were dropped."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            if now < self._next_expiry:
+                return 0
+            expired = [e for e in self.entries if self._expires_at(e) <= now]
+            for entry in expired:
+                self._remove(entry)
+            self._changed()
+            return len(expired)
+
+    def evict_one(self) -> Optional[STMEntry]:
+        """Removes the lowest-priority, least recently updated entry."""
+        with self._lock:
+            if not self.entries:
+                return None
+            entry = min(self.entries, key=lambda e: (e.priority, e.updated))
+            self._remove(entry)
+            self._changed()
+            return entry
+
+    def changed(self) -> List[STMEntry]:
+        """Entries inserted or reworded since they were last compressed."""
+        with self._lock:
+            return [e for e in self.entries if not e.compressed]
+
+    def replace(self, old: List[STMEntry], texts: List[str], source: str = "compressed"):
+        """Swaps `old` entries for `texts` (e.g. their compressed form) and marks the results compressed."""
+        with self._lock:
+            priority = max((e.priority for e in old), default=0)
+            for entry in old:
+                self._remove(entry)
+            for text in texts:
+                entry = self.add(text, source=source, priority=priority)
+                if entry is not None:
+                    entry.compressed = True
+            self._changed()
+
+    def clear(self):
+        with self._lock:
+            self.entries = []
+            self._by_hash.clear()
+            self._words.clear()
+            self._changed()
+
+    def load_text(self, text: str, source: str = "edit"):
+        """Replaces every entry with the lines of `text`, as rendered by `render()` or written by hand."""
+        with self._lock:
+            self.clear()
+            for line in text.splitlines():
+                line = line.strip()
+                if not line or line.startswith("Short-Term Memories"):
+                    continue
+                label, _, rest = line.partition(" ")
+                if label in _LABEL_SOURCES:
+                    self.add(rest, source=_LABEL_SOURCES[label])
+                else:
+                    self.add(line, source=source)
+
+    def render(self) -> str:
+        """The STM block of the prompt. Re-rendered only after the entries changed."""
+        with self._lock:
+            self.expire()
+            if self._rendered is None:
+                lines = [f"{_LABELS.get(e.source, '[Memory]')} {e.text}" for e in self.entries]
+                self._rendered = STM_HEADER + "\n".join(lines)
+            return self._rendered
+
+    def to_list(self) -> List[dict]:
+        with self._lock:
+            return [e.model_dump() for e in self.entries]
+
+    def load(self, entries: List[dict]):
+        """Restores entries saved by `to_list()`."""
+        with self._lock:
+            self.clear()
+            for data in entries:
+                entry = STMEntry(**data)
+                key = normalize(entry.text)
+                self.entries.append(entry)
+                self._index(entry, set(key.split()))
+            self._changed()
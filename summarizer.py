@@ -0,0 +1,68 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+from config import SUMMARY_WORKER_THREADS
+
+
+class LatencyStats:
+    """Count, total, last and max duration (seconds) of one kind of operation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.last = None
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.last = seconds
+            self.max = max(self.max, seconds)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "total": self.total,
+                "mean": self.total / self.count if self.count else None,
+                "last": self.last,
+                "max": self.max,
+            }
+
+
+class Summarizer:
+    """
+    Worker pool for history summaries and STM compression, kept apart from
+    the tool pool so a slow summary never takes a slot from a tool call.
+
+    Agents hand it a job over a frozen snapshot of their history and keep
+    stepping; the agent swaps the result in once the job is done (see
+    `agent.summarize_in_background()`).
+    """
+
+    def __init__(self, max_workers: int = SUMMARY_WORKER_THREADS):
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="summarizer")
+        return self._pool
+
+    def submit(self, func: Callable, *args) -> Future:
+        return self._get_pool().submit(func, *args)
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+# Module-level singleton shared by all agents
+summarizer = Summarizer()
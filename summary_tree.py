@@ -0,0 +1,74 @@
+import time
+from typing import Callable, List, Optional
+from models import SummaryNode
+from config import SUMMARY_FANOUT
+
+SUMMARY_HEADER = "\n\nConversation Summary (oldest first):\n"
+
+
+class SummaryTree:
+    """
+    Hierarchical summary of everything summarized out of an agent's history.
+
+    `nodes` is the frontier of the tree, oldest first. Each summarization adds
+    one level-0 summary of the new messages only. Once a level holds more than
+    `fanout` summaries, its oldest `fanout` are rolled up into one summary a
+    level higher, so levels never increase from old to new and the frontier
+    stays at most `fanout` nodes per level: the work per summarization and the
+    size of the block stay bounded however long the session runs.
+
+    `extend()` computes a new frontier without touching the tree, so it can
+    run on a background thread; `replace()` swaps it in.
+    """
+
+    def __init__(self, fanout: int = SUMMARY_FANOUT):
+        self.fanout = fanout
+        self.nodes: List[SummaryNode] = []
+        self._rendered = None
+
+    def latest(self) -> Optional[SummaryNode]:
+        return self.nodes[-1] if self.nodes else None
+
+    def extend(self, nodes: List[SummaryNode], text: str, messages: int,
+               summarize: Callable[[List[str]], str]) -> List[SummaryNode]:
+        """
+        The frontier `nodes` plus a level-0 summary `text` covering `messages` messages, with full
+        levels rolled up. `summarize(texts)` merges consecutive summaries, oldest first, into one.
+        """
+        now = time.time()
+        nodes = list(nodes) + [SummaryNode(text=text, level=0, messages=messages, created=now)]
+        level = 0
+        while True:
+            run = [i for i, node in enumerate(nodes) if node.level == level]
+            if len(run) <= self.fanout:
+                return nodes
+            # Same-level nodes are contiguous, oldest first
+            first, last = run[0], run[self.fanout - 1]
+            group = nodes[first:last + 1]
+            try:
+                text = summarize([node.text for node in group])
+            except Exception as e:
+                # The level stays over-full and is rolled up on the next summarization
+                print(f"[System] Summary roll-up failed: {e}", flush=True)
+                return nodes
+            merged = SummaryNode(text=text, level=level + 1, messages=sum(node.messages for node in group),
+                                 created=now)
+            nodes = nodes[:first] + [merged] + nodes[last + 1:]
+            level += 1
+
+    def replace(self, nodes: List[SummaryNode]):
+        self.nodes = nodes
+        self._rendered = None
+
+    def render(self) -> str:
+        """The summary block of the prompt; empty while nothing was summarized."""
+        if self._rendered is None:
+            lines = [f"[Summary of {node.messages} messages] {node.text}" for node in self.nodes]
+            self._rendered = SUMMARY_HEADER + "\n".join(lines) if lines else ""
+        return self._rendered
+
+    def to_list(self) -> List[dict]:
+        return [node.model_dump() for node in self.nodes]
+
+    def load(self, nodes: List[dict]):
+        self.replace([SummaryNode(**data) for data in nodes])
@@ -0,0 +1,11 @@
+import pytest
+
+from magi import agent
+
+
+@pytest.fixture(autouse=True)
+def isolated_states(monkeypatch, tmp_path_factory):
+    """Agents built by a test persist to a fresh temp directory instead of the repo's agent_states/."""
+    state_dir = tmp_path_factory.mktemp("agent_states")
+    monkeypatch.setattr(agent, "get_state_file_path", lambda self: str(state_dir / f"{self.name}_state.json"))
+    return state_dir
@@ -0,0 +1,128 @@
+import difflib
+
+import pytest
+
+from tools import apply_patch
+from unified_diff import PatchError, apply_hunks, parse_patch
+
+SOURCE = "".join(f"line {i}\n" for i in range(1, 41))
+
+
+def _diff(old, new, name="f.txt"):
+    return "".join(difflib.unified_diff(old.splitlines(True), new.splitlines(True), f"a/{name}", f"b/{name}"))
+
+
+def _apply(text, patch):
+    [file_patch] = parse_patch(patch)
+    new_lines, reports = apply_hunks(text.splitlines(keepends=True), file_patch.hunks)
+    return (None if new_lines is None else "".join(new_lines)), reports
+
+
+def test_applies_a_git_style_diff(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "f.txt").write_text(SOURCE)
+    new = SOURCE.replace("line 10\n", "line ten\n").replace("line 30\n", "line 30\nextra\n")
+
+    result = apply_patch(_diff(SOURCE, new))
+    assert result.startswith(f"Patched {tmp_path / 'f.txt'}: 2 hunks applied")
+    assert "hunk 1: applied at line 7\n" in result
+    assert (tmp_path / "f.txt").read_text() == new
+
+
+def test_offset_and_missing_line_numbers():
+    shifted = "header\n" * 5 + SOURCE
+    patch = _diff(SOURCE, SOURCE.replace("line 20\n", "line twenty\n"))
+    new, reports = _apply(shifted, patch)
+    assert new == shifted.replace("line 20\n", "line twenty\n")
+    assert reports[0]["offset"] == 5
+
+    loose = "@@ ... @@\n line 19\n-line 20\n+line twenty\n line 21\n"
+    new, _ = _apply(SOURCE, loose)
+    assert new == SOURCE.replace("line 20\n", "line twenty\n")
+
+
+def test_whitespace_and_fuzz():
+    indented = SOURCE.replace("line 5\n", "    line 5\n")
+    patch = "@@ -4,3 +4,3 @@\n line 4\n-line 5\n+line five\n line 6\n"
+    new, reports = _apply(indented, patch)
+    assert "line five\n" in new
+    assert reports[0]["whitespace"] is True
+
+    drifted = SOURCE.replace("line 8\n", "line eight\n")
+    patch = "@@ -7,5 +7,5 @@\n line 7\n line 8\n line 9\n-line 10\n+line ten\n line 11\n"
+    new, reports = _apply(drifted, patch)
+    assert new == drifted.replace("line 10\n", "line ten\n")
+    assert reports[0]["fuzz"] == 2
+
+
+def test_failed_hunk_changes_nothing(tmp_path):
+    target = tmp_path / "f.txt"
+    target.write_text(SOURCE)
+    patch = ("@@ -2,3 +2,3 @@\n line 2\n-line 3\n+line three\n line 4\n"
+             "@@ -20,3 +20,3 @@\n nope a\n-nope b\n+nope c\n nope d\n")
+
+    result = apply_patch(patch, path=str(target))
+    assert result.startswith("Error: No changes made.")
+    assert "1 of 2 hunks failed" in result
+    assert "hunk 1: applied at line 2" in result
+    assert "hunk 2: FAILED, context not found after line 4" in result
+    assert target.read_text() == SOURCE
+
+
+def test_no_newline_at_end_of_file():
+    patch = "@@ -1,2 +1,2 @@\n a\n-b\n\\ No newline at end of file\n+c\n\\ No newline at end of file\n"
+    assert _apply("a\nb", patch)[0] == "a\nc"
+
+    append = "@@ -1,2 +1,3 @@\n a\n b\n\\ No newline at end of file\n+c\n"
+    assert _apply("a\nb", append)[0] == "a\nb\nc\n"
+
+
+def test_create_and_delete_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    create = "--- /dev/null\n+++ b/pkg/new.py\n@@ -0,0 +1,2 @@\n+import os\n+print(os.sep)\n"
+    assert apply_patch(create).startswith(f"Patched {tmp_path / 'pkg/new.py'}")
+    assert (tmp_path / "pkg/new.py").read_text() == "import os\nprint(os.sep)\n"
+    assert "already exists" in apply_patch(create)
+
+    delete = "--- a/pkg/new.py\n+++ /dev/null\n@@ -1,2 +0,0 @@\n-import os\n-print(os.sep)\n"
+    assert apply_patch(delete) == f"Deleted {tmp_path / 'pkg/new.py'}"
+    assert not (tmp_path / "pkg/new.py").exists()
+
+
+def test_multi_file_patch_is_all_or_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.txt").write_text(SOURCE)
+    (tmp_path / "b.txt").write_text(SOURCE)
+    good = _diff(SOURCE, SOURCE.replace("line 1\n", "line one\n"), "a.txt")
+    bad = "--- a/b.txt\n+++ b/b.txt\n@@ -1,1 +1,1 @@\n-missing\n+x\n"
+
+    assert apply_patch(good + bad).startswith("Error: No changes made.")
+    assert (tmp_path / "a.txt").read_text() == SOURCE
+    assert "Error: 'path' can only be used" in apply_patch(good + bad, path="a.txt")
+
+
+def test_rejected_delete_or_repeated_file_changes_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "one.txt").write_text(SOURCE)
+    (tmp_path / "two.txt").write_text("keep\nremove\n")
+    edit = _diff(SOURCE, SOURCE.replace("line 1\n", "line one\n"), "one.txt")
+    partial_delete = "--- a/two.txt\n+++ /dev/null\n@@ -1,2 +0,0 @@\n keep\n-remove\n"
+
+    result = apply_patch(edit + partial_delete)
+    assert result == f"Error: No changes made.\n{tmp_path / 'two.txt'}: not empty after the patch; not deleted."
+    assert (tmp_path / "one.txt").read_text() == SOURCE
+    assert (tmp_path / "two.txt").exists()
+
+    again = _diff(SOURCE, SOURCE.replace("line 30\n", "line thirty\n"), "one.txt")
+    result = apply_patch(edit + again)
+    assert result.startswith("Error: No changes made.")
+    assert "named more than once" in result
+    assert (tmp_path / "one.txt").read_text() == SOURCE
+
+
+def test_parse_errors():
+    with pytest.raises(PatchError, match="No hunks found"):
+        parse_patch("just some text")
+    with pytest.raises(PatchError, match="changes nothing"):
+        parse_patch("@@ -1 +1 @@\n a\n")
+    assert apply_patch("@@ -1 +1 @@\n-a\n+b\n").startswith("Error: The diff has no ---/+++ file headers")
@@ -0,0 +1,174 @@
+import json
+import os
+
+from code_search import CodeSearch, required_literals
+from tools import edit_file, grep, run_command
+
+
+def _write(root, rel, text):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def test_required_literals():
+    assert required_literals("def (grep|ls)\\(") == ["def ", "("]
+    assert required_literals("foo(bar)+x") == ["foo", "bar", "x"]
+    assert required_literals("a|b") == []
+    assert required_literals("(") == []
+    assert required_literals("(?i:abc)def") == ["def"]
+
+
+def test_regex_and_literal_hits_with_context(tmp_path):
+    _write(tmp_path, "src/app.py", "import os\n\ndef main():\n    return os.getcwd()\n")
+    _write(tmp_path, "src/util.py", "def helper(x):\n    return x * 2\n")
+    search = CodeSearch()
+
+    result = search.search(r"def \w+\(", str(tmp_path), context=1)
+    assert [(os.path.basename(m["file"]), m["line"], m["text"]) for m in result["matches"]] == [
+        ("app.py", 3, "def main():"),
+        ("util.py", 1, "def helper(x):"),
+    ]
+    assert result["matches"][0]["before"] == [""]
+    assert result["matches"][0]["after"] == ["    return os.getcwd()"]
+    assert result["truncated"] is False
+
+    literal = search.search("x * 2", str(tmp_path), literal=True)
+    assert [m["line"] for m in literal["matches"]] == [2]
+
+
+def test_ignore_case_and_subdirectory(tmp_path):
+    _write(tmp_path, "a/notes.md", "TODO: fix the Parser\n")
+    _write(tmp_path, "b/notes.md", "todo: parser tests\n")
+    search = CodeSearch()
+
+    assert len(search.search("todo", str(tmp_path), ignore_case=True)["matches"]) == 2
+    assert len(search.search("todo", str(tmp_path))["matches"]) == 1
+    below = search.search("parser", str(tmp_path / "a"), ignore_case=True)["matches"]
+    assert [os.path.basename(os.path.dirname(m["file"])) for m in below] == ["a"]
+
+
+def test_inline_ignore_case_flags_reach_the_index(tmp_path):
+    _write(tmp_path, "bergson.txt", "Élan vital\n")
+    search = CodeSearch()
+
+    assert len(search.search("élan", str(tmp_path), ignore_case=True)["matches"]) == 1
+    assert len(search.search("(?i)élan", str(tmp_path))["matches"]) == 1
+    assert len(search.search("(?i:élan) vital", str(tmp_path))["matches"]) == 1
+    assert search.search("élan", str(tmp_path))["matches"] == []
+
+
+def test_stops_at_the_result_limit(tmp_path):
+    for i in range(5):
+        _write(tmp_path, f"f{i}.txt", "needle\n" * 10)
+
+    result = CodeSearch().search("needle", str(tmp_path), max_results=7)
+    assert len(result["matches"]) == 7
+    assert result["truncated"] is True
+
+
+def test_index_follows_file_changes(tmp_path):
+    search = CodeSearch()
+    path = _write(tmp_path, "mod.py", "alpha = 1\n")
+    assert search.search("alpha", str(tmp_path))["matches"]
+
+    # Written by a file tool: reported, re-checked on the next query
+    path.write_text("beta = 2\n")
+    os.utime(path, ns=(0, 10**9))
+    search.file_changed(str(path))
+    assert not search.search("alpha", str(tmp_path))["matches"]
+    assert search.search("beta", str(tmp_path))["matches"]
+
+    # Changed by a command: the command tools invalidate, so the tree is walked again
+    _write(tmp_path, "new.py", "gamma\n")
+    path.unlink()
+    search.invalidate()
+    assert not search.search("beta", str(tmp_path))["matches"]
+    assert search.search("gamma", str(tmp_path))["matches"]
+
+
+def test_unreported_changes_show_up_after_the_refresh_interval(tmp_path, monkeypatch):
+    search = CodeSearch()
+    _write(tmp_path, "mod.py", "alpha = 1\n")
+    search.search("alpha", str(tmp_path))
+    index = search._index_for(str(tmp_path))
+    walks = []
+    monkeypatch.setattr(index, "_walk", lambda walk=index._walk: walks.append(1) or walk())
+
+    _write(tmp_path, "late.py", "alpha = 2\n")
+    # Repeated queries within the interval don't walk the tree
+    assert len(search.search("alpha", str(tmp_path))["matches"]) == 1
+    assert walks == []
+
+    index._refreshed_at -= 10
+    assert len(search.search("alpha", str(tmp_path))["matches"]) == 2
+    assert walks == [1]
+
+
+def test_indexes_only_read_changed_files(tmp_path):
+    for i in range(20):
+        _write(tmp_path, f"f{i}.py", f"value_{i} = {i}\n")
+    search = CodeSearch()
+    search.search("value_3", str(tmp_path))
+    index = search._index_for(str(tmp_path))
+    ids = dict(index._files)
+
+    _write(tmp_path, "f5.py", "value_5 = 'changed'\n")
+    os.utime(tmp_path / "f5.py", ns=(0, 10**9))
+    search.invalidate()
+    search.search("value_3", str(tmp_path))
+
+    changed = {rel for rel in ids if index._files[rel] != ids[rel]}
+    assert changed == {"f5.py"}
+
+
+def test_binary_and_hidden_files_are_skipped(tmp_path):
+    (tmp_path / "blob.bin").write_bytes(b"\0\1needle")
+    _write(tmp_path, ".git/config", "needle\n")
+    _write(tmp_path, "node_modules/pkg/index.js", "needle\n")
+    _write(tmp_path, "main.c", "needle\n")
+
+    result = CodeSearch().search("needle", str(tmp_path))
+    assert [os.path.basename(m["file"]) for m in result["matches"]] == ["main.c"]
+
+
+def test_skipped_directories_searched_directly_get_their_own_index(tmp_path):
+    _write(tmp_path, "main.c", "int x;\n")
+    _write(tmp_path, ".hid/notes.txt", "needle\n")
+    _write(tmp_path, "node_modules/pkg/index.js", "needle\n")
+    search = CodeSearch()
+
+    assert not search.search("needle", str(tmp_path))["matches"]
+    # The parent index skipped these directories, so it must not answer for them
+    assert len(search.search("needle", str(tmp_path / ".hid"))["matches"]) == 1
+    assert len(search.search("needle", str(tmp_path / "node_modules" / "pkg"))["matches"]) == 1
+    assert search._index_for(str(tmp_path / ".hid")) is not search._index_for(str(tmp_path))
+
+
+def test_oversized_files_are_scanned_without_index(tmp_path):
+    _write(tmp_path, "big.log", "x" * 100 + "\nrare marker\n")
+    search = CodeSearch()
+    search._index_for(str(tmp_path)).max_file_bytes = 10
+
+    assert search.search("rare marker", str(tmp_path))["matches"][0]["line"] == 2
+
+
+def test_grep_tool_handles_quotes_and_bad_patterns(tmp_path):
+    _write(tmp_path, "q.py", "print(\"it's\")\n")
+
+    hits = json.loads(grep("\"it's\"", str(tmp_path), literal=True))
+    assert hits["matches"][0]["text"] == "print(\"it's\")"
+    assert grep("(", str(tmp_path)).startswith("Error: invalid regular expression")
+    assert grep("absent", str(tmp_path)) == "No matches found."
+
+
+def test_grep_sees_changes_made_through_tools_at_once(tmp_path):
+    path = _write(tmp_path, "mod.py", "alpha = 1\n")
+    assert json.loads(grep("alpha", str(tmp_path)))["matches"]
+
+    edit_file(str(path), "alpha = 1", "omega = 1")
+    assert json.loads(grep("omega", str(tmp_path)))["matches"]
+
+    run_command(f"echo 'alpha = 3' > {tmp_path}/cmd.py", timeout=5)
+    assert json.loads(grep("alpha", str(tmp_path)))["matches"][0]["file"].endswith("cmd.py")
@@ -0,0 +1,101 @@
+import pytest
+
+import magi
+from context_budget import PromptCacheStats, TokenCounter, count_tokens
+from magi import agent, agents
+
+
+@pytest.fixture(autouse=True)
+def clear_agents():
+    agents.clear()
+    yield
+    agents.clear()
+
+
+def test_counter_tokenizes_each_text_once():
+    counter = TokenCounter()
+    messages = [{"role": "user", "content": f"message number {i}"} for i in range(5)]
+
+    first = counter.count_messages(messages)
+    assert counter.misses == 5
+    assert counter.count_messages(messages) == first
+    assert counter.misses == 5
+
+    messages.append({"role": "user", "content": "one more"})
+    counter.count_messages(messages)
+    assert counter.misses == 6
+
+
+def test_context_usage_reports_every_block():
+    a = agent(name="BudgetAgent", description="budget test agent.")
+    a.history = [{"role": "user", "content": "hello there"}]
+
+    usage = a.context_usage()
+    assert set(usage) == {"ltm", "tools", "summary", "relevant_ltm", "stm", "system_data", "history", "total"}
+    assert usage["tools"] > 0
+    assert usage["history"] >= count_tokens("hello there")
+    assert usage["total"] == sum(v for k, v in usage.items() if k != "total")
+
+
+def test_wait_summarizes_on_tokens_not_message_count(monkeypatch):
+    a = agent(name="BudgetAgent", description="budget test agent.")
+    calls = []
+    monkeypatch.setattr(a, "summarize_in_background", lambda: calls.append(True))
+
+    # Many tiny messages stay well under the budget
+    a.history = [{"role": "user", "content": "ok"} for _ in range(40)]
+    a.wait()
+    assert calls == []
+
+    # A single huge tool result goes over it
+    a.history = [{"role": "user", "content": "line of output\n" * 20000}]
+    a.wait()
+    assert calls == [True]
+
+
+def test_remember_compresses_on_stm_token_budget(monkeypatch):
+    a = agent(name="BudgetAgent", description="budget test agent.")
+    calls = []
+    monkeypatch.setattr(a, "compress_stm", lambda: calls.append(True))
+
+    a.remember("short fact")
+    assert calls == []
+    a.remember("word " * (magi.STM_TOKEN_BUDGET * 2))
+    assert calls == [True]
+
+
+def test_prompt_prefix_is_stable_across_steps():
+    a = agent(name="BudgetAgent", description="budget test agent.")
+    a.history = [{"role": "user", "content": "first"}]
+
+    first = a.get_messages()
+    a.history.append({"role": "assistant", "content": "reply"})
+    a.remember("a new fact")
+    second = a.get_messages()
+
+    # The static prefix is the same object; volatile blocks follow the history
+    assert second[0]["content"] is first[0]["content"]
+    assert second[1:3] == a.history
+    assert "a new fact" in second[-2]["content"]
+    assert "System Data" in second[-1]["content"]
+
+
+def test_prompt_cache_stats():
+    stats = PromptCacheStats()
+
+    class Details:
+        cached_tokens = 768
+
+    class Usage:
+        prompt_tokens = 1000
+        prompt_tokens_details = Details()
+
+    stats.record_prefix("static")
+    stats.record_prefix("static")
+    stats.record_prefix("changed")
+    stats.record_usage(Usage())
+
+    summary = stats.summary()
+    assert summary["stable_prefixes"] == 1
+    assert summary["prefix_stability"] == 0.5
+    assert summary["cached_ratio"] == 0.768
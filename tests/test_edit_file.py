@@ -0,0 +1,87 @@
+import os
+import stat
+
+from tools import edit_file
+
+SOURCE = "def a():\n    return 1\n\n\ndef b():\n    return 2\n\n\ndef c():\n    return 1\n"
+
+
+def _file(tmp_path, text=SOURCE):
+    path = tmp_path / "mod.py"
+    path.write_text(text)
+    return path
+
+
+def test_single_edit(tmp_path):
+    path = _file(tmp_path)
+
+    assert edit_file(str(path), "return 2", "return 20") == f"Successfully edited {path}"
+    assert "return 20" in path.read_text()
+
+
+def test_batch_is_applied_against_the_original_text(tmp_path):
+    path = _file(tmp_path)
+    edits = [
+        {"target_text": "def c():\n    return 1", "replacement_text": "def c():\n    return 3"},
+        {"target_text": "def a():", "replacement_text": "def a(x):"},
+        {"target_text": "return 2", "replacement_text": "return 2  # def a():"},
+    ]
+
+    assert edit_file(str(path), edits=edits) == f"Successfully applied 3 edits to {path}"
+    assert path.read_text() == (
+        "def a(x):\n    return 1\n\n\n"
+        "def b():\n    return 2  # def a():\n\n\n"
+        "def c():\n    return 3\n"
+    )
+
+
+def test_failed_batch_changes_nothing_and_reports_every_problem(tmp_path):
+    path = _file(tmp_path)
+    edits = [
+        {"target_text": "def b():", "replacement_text": "def b2():"},
+        {"target_text": "return 1", "replacement_text": "return 10"},
+        {"target_text": "def z():", "replacement_text": "def y():"},
+        {"target_text": "", "replacement_text": "x"},
+    ]
+
+    result = edit_file(str(path), edits=edits)
+    assert result.startswith(f"Error: No changes made to {path}; 3 of 4 edits failed:")
+    assert "Edit 2: target_text is ambiguous, it occurs 2 times (first at lines 2 and 10)" in result
+    assert "Edit 3: target_text not found" in result
+    assert "Edit 4: needs a non-empty 'target_text'" in result
+    assert "Edit 1" not in result
+    assert path.read_text() == SOURCE
+
+
+def test_overlapping_edits_are_rejected(tmp_path):
+    path = _file(tmp_path)
+    edits = [
+        {"target_text": "def b():\n    return 2", "replacement_text": "pass"},
+        {"target_text": "return 2\n\n\ndef c", "replacement_text": "pass"},
+    ]
+
+    assert "Edits 1 and 2 overlap (line 6)" in edit_file(str(path), edits=edits)
+    assert path.read_text() == SOURCE
+
+
+def test_argument_combinations(tmp_path):
+    path = _file(tmp_path)
+
+    assert edit_file(str(path)).startswith("Error: Provide")
+    assert edit_file(str(path), "a", "b", edits=[{"target_text": "a", "replacement_text": "b"}]).startswith(
+        "Error: Use either")
+    assert edit_file(str(path), edits=[]) == "Error: 'edits' is empty."
+    assert "does not exist" in edit_file(str(tmp_path / "missing.py"), "a", "b")
+
+
+def test_write_is_atomic_and_keeps_permissions_and_symlinks(tmp_path):
+    path = _file(tmp_path)
+    os.chmod(path, 0o750)
+    link = tmp_path / "link.py"
+    link.symlink_to(path)
+
+    assert edit_file(str(link), "def b():", "def bee():").startswith("Successfully")
+    assert link.is_symlink()
+    assert "def bee():" in path.read_text()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o750
+    assert sorted(os.listdir(tmp_path)) == ["link.py", "mod.py"]
@@ -0,0 +1,172 @@
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from openai.types.chat import ChatCompletion
+
+import magi
+from magi import agent, agents
+from llm_cache import LLMCache, cache_key
+from models import SummaryNode
+
+MESSAGES = [{"role": "system", "content": "Summarize."}, {"role": "user", "content": "hello"}]
+
+
+def test_key_is_canonical_and_covers_the_request():
+    reordered = [{"content": "Summarize.", "role": "system"}, {"content": "hello", "role": "user"}]
+    key = cache_key("o4-mini", MESSAGES)
+
+    assert cache_key("o4-mini", reordered) == key
+    assert cache_key("gpt-4o", MESSAGES) != key
+    assert cache_key("o4-mini", MESSAGES, SummaryNode) != key
+    assert cache_key("o4-mini", MESSAGES, tools=[{"type": "function"}]) != key
+    assert cache_key("o4-mini", MESSAGES[:1]) != key
+
+
+def test_key_ignores_the_clock_lines():
+    def stamped(now):
+        return [{"role": "system", "content": f"System Data:\n        time: {now}\n        other agents: -"},
+                {"role": "user", "content": f"Current Time: {now}"}]
+
+    key = cache_key("o4-mini", stamped("2026-10-18 09:00:00"))
+    assert cache_key("o4-mini", stamped("2026-10-18 09:00:42")) == key
+    assert cache_key("o4-mini", [{"role": "user", "content": "deadline time: 2026-10-18 09:00:00"}]) != \
+        cache_key("o4-mini", [{"role": "user", "content": "deadline time: 2026-10-19 09:00:00"}])
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = LLMCache(max_entries=2, max_bytes=1000, directory=None)
+    cache.put("summary", "a", "first")
+    cache.put("summary", "b", "second")
+    assert cache.get("summary", "a") == "first"  # a is now the most recently used
+    cache.put("summary", "c", "third")
+    assert cache.get("summary", "b") is None
+    assert cache.get("summary", "a") == "first"
+
+    cache.put("summary", "big", "x" * 995)
+    assert len(cache) == 1
+    cache.put("summary", "huge", "x" * 2000)  # larger than the whole cache: not stored
+    assert cache.get("summary", "huge") is None
+    assert cache.get("summary", "big") is not None
+
+
+def test_bypassed_kinds_are_never_cached():
+    cache = LLMCache(directory=None, bypass=["step"])
+    cache.put("step", "k", {"id": "1"})
+    assert cache.get("step", "k") is None
+    assert cache.stats()["kinds"]["step"] == {"hits": 0, "misses": 0, "bypassed": 1, "saved_seconds": 0.0, "hit_ratio": None}
+
+
+def test_stats_count_hits_misses_and_saved_time():
+    cache = LLMCache(directory=None)
+    assert cache.get("compress", "k") is None
+    cache.put("compress", "k", "- fact", seconds=2.5)
+    cache.get("compress", "k")
+    cache.get("compress", "k")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["saved_seconds"]) == (2, 1, 5.0)
+    assert stats["kinds"]["compress"]["hit_ratio"] == pytest.approx(2 / 3)
+    assert stats["entries"] == 1
+
+
+def test_entries_persist_on_disk_and_are_pruned(tmp_path):
+    cache = LLMCache(directory=str(tmp_path), disk_max_bytes=10_000)
+    key = cache_key("o4-mini", MESSAGES)
+    cache.put("summary", key, {"text": "persisted"}, seconds=1.0)
+    assert os.path.exists(tmp_path / key[:2] / f"{key}.json")
+
+    restarted = LLMCache(directory=str(tmp_path), disk_max_bytes=10_000)
+    assert restarted.get("summary", key) == {"text": "persisted"}
+    assert restarted.stats()["saved_seconds"] == 1.0
+
+    for i in range(20):
+        restarted.put("summary", f"{i:064x}", "y" * 1000)
+    files = [f for _, _, fs in os.walk(tmp_path) for f in fs]
+    assert sum(os.path.getsize(os.path.join(root, f)) for root, _, fs in os.walk(tmp_path) for f in fs) <= 10_000
+    assert f"{19:064x}.json" in files
+
+
+class FakeClient:
+    """Stands in for the OpenAI client and counts the requests that reach it."""
+
+    def __init__(self):
+        self.requests = 0
+        self.responses = SimpleNamespace(parse=self._parse)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _parse(self, model, input, text_format=None):
+        self.requests += 1
+        if text_format is not None:
+            return SimpleNamespace(output_parsed=text_format(text="parsed", messages=3, created=0.0))
+        return SimpleNamespace(output_text=f"answer {self.requests}")
+
+    def _create(self, model, messages, tools, tool_choice):
+        self.requests += 1
+        return ChatCompletion.model_validate({
+            "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "Done."}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+        })
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(magi, "client", client)
+    monkeypatch.setattr(magi, "llm_cache", LLMCache(directory=None, bypass=["request"]))
+    return client
+
+
+def test_identical_requests_reach_the_api_once(fake_client):
+    assert magi.ai_request(MESSAGES, kind="summary") == "answer 1"
+    assert magi.ai_request(MESSAGES, kind="summary") == "answer 1"
+    parsed = magi.ai_request(MESSAGES, text_format=SummaryNode, kind="summary")
+    assert magi.ai_request(MESSAGES, text_format=SummaryNode, kind="summary") == parsed
+    assert fake_client.requests == 2
+
+    first = magi.ai_tool_request(MESSAGES, [])
+    cached = magi.ai_tool_request(MESSAGES, [])
+    assert fake_client.requests == 3
+    assert cached.choices[0].message.content == first.choices[0].message.content
+    # A cached answer was not billed, so it reports no usage
+    assert cached.usage is None
+
+
+def test_bypassed_kind_always_calls_the_api(fake_client):
+    magi.ai_request(MESSAGES)
+    magi.ai_request(MESSAGES)
+    assert fake_client.requests == 2
+    assert magi.llm_cache.stats()["kinds"]["request"]["bypassed"] == 2
+
+
+def test_failures_are_not_cached(fake_client, monkeypatch):
+    def broken(**kwargs):
+        raise RuntimeError("rate limited")
+
+    monkeypatch.setattr(fake_client.responses, "parse", broken)
+    assert magi.ai_request(MESSAGES, kind="compress") == "error"
+    monkeypatch.setattr(fake_client.responses, "parse", FakeClient()._parse)
+    assert magi.ai_request(MESSAGES, kind="compress") == "answer 1"
+
+
+def test_repeated_step_is_served_from_the_cache(fake_client, monkeypatch):
+    now = [datetime(2026, 10, 18, 9, 0, 0)]
+    monkeypatch.setattr(magi, "datetime", SimpleNamespace(now=lambda: now[0]))
+    agents.clear()
+    a = agent(name="CacheAgent", description="cache test agent.")
+    history = [{"role": "user", "content": "list the files"}]
+
+    a.history = list(history)
+    assert "time: 2026-10-18 09:00:00" in a.get_data()
+    a.step()
+    # The same step a few seconds later, e.g. after a restart from the same state
+    now[0] = datetime(2026, 10, 18, 9, 0, 7)
+    a.history = list(history)
+    a.step()
+    agents.clear()
+
+    assert fake_client.requests == 1
+    assert magi.llm_cache.stats()["kinds"]["step"]["hits"] == 1
@@ -0,0 +1,57 @@
+import os
+
+from ltm_loader import LTMCatalog, get_catalog, load_ltm_files, update_ltm_metadata
+
+
+def _write_ltm(path, name, body="Body text.", visible_to="all"):
+    path.write_text(f"---\nname: {name}\ndescription: {name} description\nvisible_to:\n- {visible_to}\n---\n{body}\n")
+
+
+def test_files_parsed_once_until_changed(tmp_path):
+    _write_ltm(tmp_path / "a.md", "alpha")
+    _write_ltm(tmp_path / "b.md", "beta")
+    catalog = LTMCatalog(str(tmp_path))
+
+    assert [m.name for m in catalog.all()] == ["alpha", "beta"]
+    assert catalog.misses == 2
+
+    catalog.all()
+    assert catalog.misses == 2
+    assert catalog.hits == 2
+
+    _write_ltm(tmp_path / "a.md", "alpha", body="A much longer body than before.")
+    assert "much longer" in catalog.get("alpha").content
+    assert catalog.misses == 3
+
+    (tmp_path / "b.md").unlink()
+    assert catalog.get("beta") is None
+    assert [m.name for m in catalog.all()] == ["alpha"]
+
+
+def test_lookup_by_name_and_filename(tmp_path):
+    _write_ltm(tmp_path / "01_rules.md", "rule")
+    (tmp_path / "nameless.md").write_text("---\ndescription: no name\n---\nHello\n")
+    catalog = LTMCatalog(str(tmp_path))
+
+    assert catalog.get("rule").path.endswith("01_rules.md")
+    assert catalog.get("01_rules").name == "rule"
+    assert catalog.get("nameless").name == "nameless.md"
+    assert catalog.get("nameless.md").content == "Hello"
+
+
+def test_catalog_is_shared_per_directory(tmp_path):
+    _write_ltm(tmp_path / "a.md", "alpha")
+    assert get_catalog(str(tmp_path)) is get_catalog(str(tmp_path) + os.sep)
+    assert [m.name for m in load_ltm_files(str(tmp_path))] == ["alpha"]
+
+
+def test_update_metadata_is_visible_immediately(tmp_path):
+    _write_ltm(tmp_path / "a.md", "alpha")
+    catalog = get_catalog(str(tmp_path))
+    assert catalog.get("alpha").active_for == []
+
+    result = update_ltm_metadata("alpha", "Magi-01", "active_for", "add", directory=str(tmp_path))
+    assert "Successfully" in result
+    assert catalog.get("alpha").active_for == ["magi-01"]
+
+    assert "not found" in update_ltm_metadata("missing", "Magi-01", "active_for", directory=str(tmp_path))
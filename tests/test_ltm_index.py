@@ -0,0 +1,145 @@
+import pytest
+
+import magi
+from ltm_index import HashingEmbedder, LTMIndex, best_line, tokenize
+from ltm_loader import update_ltm_metadata
+from magi import agent, agents
+
+
+def _write_ltm(path, name, description, body, visible_to="all", active_for=None):
+    active = f"active_for:\n- {active_for}\n" if active_for else ""
+    path.write_text(f"---\nname: {name}\ndescription: {description}\n{active}visible_to:\n- {visible_to}\n---\n{body}\n")
+
+
+@pytest.fixture
+def library(tmp_path):
+    _write_ltm(tmp_path / "docker.md", "docker", "Running containers",
+               "Use docker compose up -d to start the stack.\nLogs: docker compose logs -f.")
+    _write_ltm(tmp_path / "git.md", "git", "Version control habits",
+               "Commit small changes.\nRebase feature branches before merging.")
+    _write_ltm(tmp_path / "python.md", "python", "Python style",
+               "Use type hints and pytest for tests.\nKeep functions short.")
+    return tmp_path
+
+
+def test_bm25_ranks_the_matching_memory_first(library):
+    index = LTMIndex(str(library))
+
+    results = index.search("how do I start the docker containers", k=3)
+    assert results[0][1].name == "docker"
+    assert all(score > 0 for score, _ in results)
+    assert index.search("rebase branch", k=1)[0][1].name == "git"
+    assert index.search("kubernetes helm chart") == []
+
+
+def test_only_changed_files_are_reindexed(library):
+    index = LTMIndex(str(library))
+    index.sync()
+    assert index.indexed == 3
+
+    # Visibility changes keep the indexed text
+    assert update_ltm_metadata("git", "Tester", "visible_to", directory=str(library)) == "Successfully updated git"
+    index.sync()
+    assert index.indexed == 3
+    assert "tester" in index.search("rebase", k=1)[0][1].visible_to
+
+    _write_ltm(library / "python.md", "python", "Python style", "Prefer dataclasses for records.")
+    index.sync()
+    assert index.indexed == 4
+    assert index.search("dataclasses", k=1)[0][1].name == "python"
+    assert index.search("pytest") == []
+
+    (library / "docker.md").unlink()
+    index.sync()
+    assert index.search("docker") == []
+
+
+def test_allowed_filters_results(library):
+    index = LTMIndex(str(library))
+
+    results = index.search("docker git python", k=5, allowed=lambda m: m.name != "docker")
+    assert {m.name for _, m in results} == {"git", "python"}
+
+
+def test_pluggable_embedder_finds_memories_without_shared_words(library):
+    # A toy "semantic" embedder that maps containers and kubernetes onto the same axis
+    def embedder(texts):
+        return [[1.0, 0.0] if any(w in tokenize(t) for w in ("docker", "kubernetes")) else [0.0, 1.0]
+                for t in texts]
+
+    index = LTMIndex(str(library), embedder=embedder)
+    assert index.search("kubernetes")[0][1].name == "docker"
+
+    index.set_embedder(HashingEmbedder())
+    assert index.search("kubernetes") == []
+
+
+def test_hashing_embedder_is_normalized_and_deterministic():
+    embedder = HashingEmbedder(dim=64)
+    first, second = embedder(["docker compose up", "docker compose up"])
+    assert first == second
+    assert len(first) == 64
+    assert sum(x * x for x in first) == pytest.approx(1.0)
+    assert embedder([""])[0] == [0.0] * 64
+
+
+def test_best_line_picks_the_line_with_most_query_words(library):
+    index = LTMIndex(str(library))
+    memory = index.search("compose logs")[0][1]
+    assert best_line(memory, "compose logs") == "Logs: docker compose logs -f."
+
+
+@pytest.fixture
+def agent_library(library, monkeypatch):
+    monkeypatch.setattr(magi, "LTM_DIR", str(library))
+    agents.clear()
+    yield library
+    agents.clear()
+
+
+def test_prompt_only_carries_relevant_visible_memories(agent_library):
+    a = agent(name="RetrievalAgent", description="test agent.")
+    assert "Commit small changes" not in a.ltm_content
+    assert "3 more are visible" in a.ltm_content
+
+    a.history = [{"role": "user", "content": "The docker containers do not start."}]
+    messages = a.get_messages()
+    retrieved = [m["content"] for m in messages if "(Retrieved)" in m["content"]]
+    assert len(retrieved) == 1
+    assert "docker compose up -d" in retrieved[0]
+    assert "Rebase" not in retrieved[0]
+    # The retrieved block follows the history; the cached prefix stays as it was
+    assert messages[0]["content"] == a.ltm_content
+    assert messages.index(a.history[-1]) < [m["content"] for m in messages].index(retrieved[0])
+
+
+def test_retrieval_respects_token_budget(agent_library, monkeypatch):
+    monkeypatch.setattr(magi, "LTM_TOKEN_BUDGET", 5)
+    a = agent(name="RetrievalAgent", description="test agent.")
+    a.history = [{"role": "user", "content": "docker"}]
+
+    block = a.relevant_ltm()
+    assert "- docker: Running containers (load with read_ltm)" in block
+    assert "compose up" not in block
+
+
+def test_active_memories_stay_pinned(agent_library):
+    _write_ltm(agent_library / "rules.md", "rules", "House rules", "Always answer politely.",
+               active_for="all")
+    a = agent(name="RetrievalAgent", description="test agent.")
+
+    assert "Always answer politely." in a.ltm_content
+    a.history = [{"role": "user", "content": "rules politely"}]
+    assert "rules" not in a.relevant_ltm()
+
+
+def test_read_ltm_search_mode(agent_library):
+    _write_ltm(agent_library / "secret.md", "secret", "Docker secrets", "docker secret create", visible_to="Other")
+    a = agent(name="RetrievalAgent", description="test agent.")
+
+    result = a.read_ltm(search="docker logs")
+    assert result.startswith("- docker (score ")
+    assert "Logs: docker compose logs -f." in result
+    assert "secret" not in result
+    assert a.read_ltm(search="kubernetes") == "No memories match 'kubernetes'."
+    assert a.read_ltm().startswith("Error")
@@ -0,0 +1,86 @@
+import json
+import random
+
+from line_index import LineIndex
+from output_buffer import OutputBuffer
+from pty_manager import command_manager
+from tools import run_command
+
+
+def _stream(n_lines):
+    return b"".join(f"line {i} {'x' * (i % 13)}\n".encode() for i in range(n_lines))
+
+
+def _feed_in_chunks(sink, data, seed=0):
+    rng = random.Random(seed)
+    pos = 0
+    while pos < len(data):
+        step = rng.randint(1, 700)
+        sink(data[pos:pos + step])
+        pos += step
+
+
+def test_line_index_locates_every_line():
+    data = _stream(1000)
+    index = LineIndex(stride=16)
+    _feed_in_chunks(index.feed, data)
+    starts = [0] + [i + 1 for i, b in enumerate(data) if b == 0x0A][:-1]
+
+    assert index.line_count == 1000
+    for line in (0, 1, 15, 16, 17, 500, 999):
+        offset, skip = index.locate(line)
+        pos = offset
+        for _ in range(skip):
+            pos = data.index(b"\n", pos) + 1
+        assert pos == starts[line]
+
+
+def test_buffer_memory_is_bounded_and_spills():
+    data = _stream(20000)
+    buf = OutputBuffer(memory_limit=4096, spill_limit=len(data))
+    _feed_in_chunks(buf.append, data)
+
+    assert len(buf._memory) <= 4096
+    assert buf.first_offset == 0
+    assert buf.read(0) == data
+    assert buf.read(100, 5000) == data[100:5000]
+    start = buf.line_offset(12345)
+    assert buf.read(start).startswith(b"line 12345 ")
+
+
+def test_oldest_output_is_dropped_past_the_spill_limit():
+    data = _stream(20000)
+    buf = OutputBuffer(memory_limit=4096, spill_limit=16384)
+    _feed_in_chunks(buf.append, data)
+
+    assert buf.total == len(data)
+    assert 0 < buf.first_offset < len(data) - 4096
+    assert buf.read(0) == data[buf.first_offset:]
+    assert buf.read(buf.tail_offset(3)) == b"".join(data.splitlines(keepends=True)[-3:])
+
+
+def test_tail_without_trailing_newline():
+    buf = OutputBuffer()
+    buf.append(b"one\ntwo\nthr")
+    buf.append(b"ee")
+    assert buf.line_count == 3
+    assert buf.read(buf.tail_offset(2)) == b"two\nthree"
+
+
+def test_close_releases_spill_file():
+    buf = OutputBuffer(memory_limit=1024, spill_limit=1 << 20)
+    buf.append(_stream(1000))
+    spill = buf._spill
+    buf.close()
+    assert spill.closed
+    assert buf.read(0) == b""
+
+
+def test_command_output_memory_is_capped():
+    result = json.loads(run_command("seq 1 200000", timeout="10"))
+    session = command_manager._get(result["command_id"])
+
+    assert result["status"] == "done"
+    assert len(session.output._memory) <= session.output.memory_limit
+    assert session.get_output(max_lines=2) == ["199999\r", "200000\r"]
+    assert session.output.line_count == 200000
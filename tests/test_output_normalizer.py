@@ -0,0 +1,57 @@
+import json
+
+from output_normalizer import OutputNormalizer
+from pty_manager import command_manager
+from tools import run_command
+
+
+def _normalize(data, chunk=None):
+    normalizer = OutputNormalizer()
+    chunk = chunk or len(data)
+    lines = []
+    for i in range(0, len(data), chunk):
+        lines += normalizer.feed(data[i:i + chunk])
+    return lines + normalizer.finish()
+
+
+def test_escapes_are_stripped():
+    data = b"\x1b[1;31merror\x1b[0m: bad\r\n\x1b]0;title\x07done\x1b[K\r\n"
+    assert _normalize(data) == ["error: bad", "done"]
+
+
+def test_carriage_return_overwrites_the_line():
+    data = b"".join(b"\r[%-10s] %3d%%" % (b"#" * (i // 10), i) for i in range(101)) + b"\r\nok\r\n"
+    assert _normalize(data) == ["[##########] 100%", "ok"]
+    assert OutputNormalizer.clean_line("abcdef\rXY") == "XYcdef"
+
+
+def test_runs_are_folded():
+    data = b"retrying\n" * 30 + b"".join(b"Fetching chunk %d of 40\n" % i for i in range(40)) + b"end\n"
+    assert _normalize(data) == [
+        "retrying (x 30)",
+        "Fetching chunk 0 of 40",
+        "... (x 38 similar lines)",
+        "Fetching chunk 39 of 40",
+        "end",
+    ]
+
+
+def test_short_runs_and_bare_numbers_are_kept():
+    data = b"step 1\nstep 2\nstep 3\n" + b"".join(b"%d\n" % i for i in range(10))
+    assert _normalize(data) == ["step 1", "step 2", "step 3"] + [str(i) for i in range(10)]
+
+
+def test_chunk_boundaries_do_not_matter():
+    data = ("\x1b[32m✓\x1b[0m passed\r\n" * 3 + "progress 10%\rprogress 90%\r\nlast").encode()
+    assert _normalize(data, chunk=1) == _normalize(data) == ["✓ passed (x 3)", "progress 90%", "last"]
+
+
+def test_savings_are_counted_per_command():
+    result = json.loads(run_command("for i in $(seq 1 200); do printf '\\rbuilding %d%%' $i; done; echo", timeout="5"))
+    session = command_manager._get(result["command_id"])
+
+    assert result["output"] == "building 200%"
+    assert session.bytes_saved > 2000
+    assert session.tokens_saved > 0
+    entry = next(e for e in command_manager.list_commands() if e["command_id"] == result["command_id"])
+    assert entry["bytes_saved"] == session.bytes_saved
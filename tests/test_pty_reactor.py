@@ -0,0 +1,182 @@
+import asyncio
+import json
+import time
+
+from pty_manager import CommandManager, command_manager
+from tools import run_command, send_command_input
+
+
+def _wait_for(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_chatty_background_command_is_drained_without_reads():
+    """Output beyond the kernel PTY buffer is collected even if nobody polls."""
+    result = json.loads(run_command("head -c 300000 /dev/zero | tr '\\0' x; echo; echo END", timeout="0"))
+    session = command_manager._get(result["command_id"])
+
+    assert session.wait_done(10)
+    assert session.exit_code == 0
+    assert session.bytes_received > 300000
+    assert session.get_output(max_lines=1) == ["END\r"]
+
+
+def test_exit_is_reaped_immediately():
+    start = time.monotonic()
+    result = json.loads(run_command("sleep 0.2; exit 3", timeout="5"))
+
+    assert time.monotonic() - start < 1.0
+    assert result["status"] == "done"
+    assert result["exit_code"] == 3
+
+
+def test_fd_is_released_on_exit():
+    result = json.loads(run_command("echo bye", timeout="5"))
+    session = command_manager._get(result["command_id"])
+
+    assert session._closed
+    assert "Error" in session.write("too late\n")
+
+
+def test_send_input_returns_once_output_settles():
+    cmd_id = json.loads(run_command("cat", timeout="0"))["command_id"]
+
+    start = time.monotonic()
+    result = json.loads(send_command_input(cmd_id, input="ping\n", wait="5"))
+
+    assert time.monotonic() - start < 1.0
+    assert "ping" in result["output"]
+    send_command_input(cmd_id, terminate="true")
+
+
+def test_exit_detection_without_pidfd(monkeypatch):
+    monkeypatch.delattr("os.pidfd_open", raising=False)
+    manager = CommandManager()
+
+    result = manager.run("echo polled; exit 2", timeout=5)
+    assert result["status"] == "done"
+    assert result["exit_code"] == 2
+    assert "polled" in result["output"]
+
+
+def test_backgrounded_command_notifies_its_owner():
+    manager = CommandManager()
+    events = []
+    manager.completion_listeners.append(lambda owner, text: events.append((owner, text)))
+
+    result = manager.run("sleep 0.3; echo built; exit 4", timeout=0, reader="Builder")
+    assert result["status"] == "running"
+    manager._get(result["command_id"]).wait_done(5)
+    # The reactor runs the listeners right after it publishes the done status
+    _wait_for(lambda: events)
+
+    [(owner, text)] = events
+    assert owner == "Builder"
+    assert "exited with code 4" in text
+    assert "built" in text
+
+
+def test_owner_told_running_during_a_report_still_gets_the_event():
+    manager = CommandManager()
+    events = []
+    manager.completion_listeners.append(lambda owner, text: events.append(owner))
+
+    result = manager.run("sleep 0.3; echo built", timeout=0, reader="Builder")
+    session = manager._get(result["command_id"])
+    with session.reporting_to("Builder"):
+        assert manager._status_result(session, 50, None, "Builder")["status"] == "running"
+        # The command finishes before the report ends
+        assert session.wait_done(5)
+        _wait_for(lambda: session._notify_deferred)
+        assert events == []
+
+    assert events == ["Builder"]
+
+
+def test_no_notification_when_the_result_was_already_seen():
+    manager = CommandManager()
+    events = []
+    manager.completion_listeners.append(lambda owner, text: events.append(owner))
+
+    manager.run("echo quick", timeout=5, reader="Builder")
+    polled = manager.run("sleep 0.2", timeout=0, reader="Builder")
+    assert manager.status(polled["command_id"], wait=5, reader="Builder")["status"] == "done"
+    killed = manager.run("sleep 30", timeout=0, reader="Builder")
+    manager.send_input(killed["command_id"], terminate=True, reader="Builder")
+
+    assert events == []
+
+
+def test_completion_event_wakes_the_stopped_agent():
+    from magi import agent, agents
+    from tools import current_agent_name
+
+    a = agent(name="NotifyAgent", description="notification test agent.")
+    a.status = "STOPPED"
+    token = current_agent_name.set("NotifyAgent")
+    try:
+        result = json.loads(run_command("sleep 0.2; echo finished", timeout="0"))
+    finally:
+        current_agent_name.reset(token)
+    command_manager._get(result["command_id"]).wait_done(5)
+    # The event is posted by the reactor right after the command is marked done
+    deadline = time.monotonic() + 2
+    while a.status != "RUNNING" and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert a.status == "RUNNING"
+    assert a.history[-1]["name"] == "System"
+    assert result["command_id"] in a.history[-1]["content"]
+    agents.pop("NotifyAgent", None)
+
+
+async def _ticking(coro):
+    """Runs `coro` while counting how often the event loop gets to run another task."""
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        task.cancel()
+    return result, ticks
+
+
+def test_awaitable_run_yields_the_event_loop():
+    result, ticks = asyncio.run(_ticking(command_manager.arun("sleep 0.5; echo late", timeout=5)))
+
+    assert result["status"] == "done"
+    assert "late" in result["output"]
+    assert ticks >= 25
+
+
+def test_awaitable_status_resumes_on_exit():
+    async def scenario():
+        started = await command_manager.arun("sleep 0.3", timeout=0)
+        t0 = time.monotonic()
+        status = await command_manager.astatus(started["command_id"], wait=5)
+        return status, time.monotonic() - t0
+
+    status, elapsed = asyncio.run(scenario())
+    assert status["status"] == "done"
+    assert elapsed < 1.0
+
+
+def test_awaitable_send_input_and_terminate():
+    async def scenario():
+        cmd_id = (await command_manager.arun("cat", timeout=0))["command_id"]
+        echoed = await command_manager.asend_input(cmd_id, text="pong\n", wait=5)
+        killed = await command_manager.asend_input(cmd_id, terminate=True)
+        return echoed, killed
+
+    echoed, killed = asyncio.run(scenario())
+    assert "pong" in echoed["output"]
+    assert killed["status"] == "done"
@@ -0,0 +1,100 @@
+import os
+import threading
+
+from file_reader import FileReader, file_reader
+from config import READ_FILE_MAX_BYTES
+from tools import read_file
+
+
+def test_line_ranges(tmp_path):
+    path = tmp_path / "log.txt"
+    path.write_text("".join(f"line {i}\n" for i in range(1, 1001)))
+
+    result = read_file(str(path), start_line=500, end_line=502)
+    assert result == f"File: {path} (Lines 500-502 of 1000)\nline 500\nline 501\nline 502\n"
+    assert read_file(str(path), start_line=999).endswith("line 999\nline 1000\n")
+    assert "(Lines 1000-1000 of 1000)" in read_file(str(path), start_line=1000, end_line=5000)
+    assert read_file(str(path), start_line=10, end_line=5).startswith("Error: Start line 10")
+
+
+def test_unterminated_last_line_and_crlf(tmp_path):
+    path = tmp_path / "dos.txt"
+    path.write_bytes(b"one\r\ntwo\r\nthree")
+
+    assert read_file(str(path)) == f"File: {path} (Lines 1-3 of 3)\none\ntwo\nthree"
+    assert read_file(str(path), start_line=3) == f"File: {path} (Lines 3-3 of 3)\nthree"
+
+
+def test_empty_and_missing_files(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_text("")
+
+    assert read_file(str(path)) == f"File: {path} (empty)\n"
+    assert file_reader.read_lines(str(path)) == ("", 1, 0, 0, False, None)
+    assert "does not exist" in read_file(str(tmp_path / "nope.txt"))
+
+
+def test_files_without_a_real_size_are_streamed(tmp_path):
+    # procfs reports a size of 0 for files that have content
+    result = read_file("/proc/self/status", start_line=1, end_line=3)
+    assert result.startswith("File: /proc/self/status (Lines 1-3 of ")
+    assert result.splitlines()[1].startswith("Name:")
+
+    fifo = tmp_path / "pipe"
+    os.mkfifo(fifo)
+    writer = threading.Thread(target=fifo.write_text, args=("first\nsecond\n",))
+    writer.start()
+    assert read_file(str(fifo)) == f"File: {fifo} (Lines 1-2 of 2)\nfirst\nsecond\n"
+    writer.join()
+
+
+def test_index_is_cached_until_the_file_changes(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_text("a\nb\n")
+    reader = FileReader()
+
+    reader.read_lines(str(path), 1, 1)
+    index = reader._indexes[str(path)][1]
+    reader.read_lines(str(path), 2, 2)
+    assert reader._indexes[str(path)][1] is index
+
+    path.write_text("a\nb\nc\n")
+    text, _, _, total, _, _ = reader.read_lines(str(path), 3, 3)
+    assert (text, total) == ("c\n", 3)
+    assert reader._indexes[str(path)][1] is not index
+
+
+def test_cache_keeps_the_most_recent_files(tmp_path):
+    reader = FileReader(max_files=2)
+    for name in ("a", "b", "c"):
+        (tmp_path / name).write_text("x\n")
+        reader.read_lines(str(tmp_path / name))
+
+    assert list(reader._indexes) == [str(tmp_path / "b"), str(tmp_path / "c")]
+
+
+def test_byte_budget_returns_a_continuation_hint(tmp_path):
+    path = tmp_path / "big.txt"
+    path.write_text("".join(f"{i:09d}\n" for i in range(1, 20001)))
+
+    text, start, last, total, truncated, cut = file_reader.read_lines(str(path), 101, None, max_bytes=1000)
+    assert (start, last, total, truncated, cut) == (101, 200, 20000, True, None)
+    assert text.splitlines()[0] == "000000101"
+
+    result = read_file(str(path))
+    assert result.endswith("; continue with start_line=3277.]")
+    assert len(result) < 33 * 1024
+
+
+def test_overlong_first_line_is_cut(tmp_path):
+    path = tmp_path / "minified.js"
+    path.write_text("x" * 100_000 + "\nnext\n")
+
+    text, start, last, _, truncated, cut = file_reader.read_lines(str(path), 1, 1, max_bytes=100)
+    assert (text, start, last, truncated, cut) == ("x" * 100, 1, 1, True, 100_000)
+
+    result = read_file(str(path))
+    assert result.startswith(f"File: {path} (Lines 1-1 of 2)\n" + "x" * READ_FILE_MAX_BYTES + "\n... [")
+    assert result.endswith(f"[Line 1 cut at {READ_FILE_MAX_BYTES} of 100000 bytes; "
+                           "read_file can't show the rest of it. The next line is start_line=2.]")
+    assert read_file(str(path), start_line=2) == f"File: {path} (Lines 2-2 of 2)\nnext\n"
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from magi import agent, agents
+from scheduler import AgentScheduler
+
+
+class FakeAgent:
+    """Stands in for magi.agent: each step is a fixed-latency 'LLM call'."""
+
+    def __init__(self, name, steps, latency=0.2):
+        self.name = name
+        self.status = "RUNNING"
+        self.remaining = steps
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        agents[name] = self
+
+    async def astep(self, limiter=None):
+        async with limiter:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(self.latency)
+            self.in_flight -= 1
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.status = "STOPPED"
+            return "STOPPED"
+        return "RUNNING"
+
+
+@pytest.fixture(autouse=True)
+def clear_agents():
+    agents.clear()
+    yield
+    agents.clear()
+
+
+async def _run_until_idle(scheduler):
+    scheduler.schedule()
+    while any(not t.done() for t in scheduler._tasks.values()):
+        await asyncio.sleep(0.01)
+
+
+def test_agents_step_concurrently():
+    fakes = [FakeAgent(f"agent-{i}", steps=2) for i in range(4)]
+
+    start = time.monotonic()
+    asyncio.run(_run_until_idle(AgentScheduler(max_concurrent_requests=4)))
+    elapsed = time.monotonic() - start
+
+    # Serially this would take 4 agents * 2 steps * 0.2 s = 1.6 s
+    assert elapsed < 1.0
+    assert all(f.status == "STOPPED" for f in fakes)
+    # Each agent's own steps never overlap
+    assert all(f.max_in_flight == 1 for f in fakes)
+
+
+def test_in_flight_cap():
+    fakes = [FakeAgent(f"agent-{i}", steps=1, latency=0.1) for i in range(3)]
+
+    start = time.monotonic()
+    asyncio.run(_run_until_idle(AgentScheduler(max_concurrent_requests=1)))
+
+    assert time.monotonic() - start >= 0.3
+    assert all(f.status == "STOPPED" for f in fakes)
+
+
+def test_notify_wakes_scheduler_without_polling():
+    fake = FakeAgent("sleeper", steps=1, latency=0)
+    fake.status = "STOPPED"
+
+    async def scenario():
+        scheduler = AgentScheduler()
+        runner = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.05)
+
+        def wake_from_thread():
+            fake.status = "RUNNING"
+            scheduler.notify()
+
+        woke_at = time.monotonic()
+        threading.Thread(target=wake_from_thread).start()
+        while fake.status != "STOPPED":
+            await asyncio.sleep(0.001)
+        latency = time.monotonic() - woke_at
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        return latency
+
+    assert asyncio.run(scenario()) < 0.1
+
+
+def test_messages_posted_mid_step_are_merged_after_the_step():
+    a = agent(name="InboxAgent", description="inbox test agent.")
+
+    a._begin_step()
+    a.history.append({"role": "assistant", "content": "calling wait"})
+    a.post({"role": "user", "name": "Kelsier", "content": "first line"})
+    a.post({"role": "user", "name": "Kelsier", "content": "second line"})
+    assert len(a.history) == 1
+
+    # The step ended with wait(), but new input keeps the agent running
+    a.status = "STOPPED"
+    assert a._end_step("STOPPED") == "RUNNING"
+    assert a.status == "RUNNING"
+    assert a.history[-1] == {"role": "user", "name": "Kelsier", "content": "first line\nsecond line"}
+
+
+def test_post_wakes_stopped_agent():
+    a = agent(name="InboxAgent", description="inbox test agent.")
+    a.status = "STOPPED"
+
+    a.post({"role": "user", "name": "Magi-01", "content": "hello"})
+    assert a.status == "RUNNING"
+    assert a.history == [{"role": "user", "name": "Magi-01", "content": "hello"}]
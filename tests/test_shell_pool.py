@@ -0,0 +1,80 @@
+import pytest
+
+from pty_manager import CommandManager
+
+
+@pytest.fixture
+def manager():
+    manager = CommandManager(use_shell_pool=True)
+    yield manager
+    manager.shell_pool.shutdown()
+
+
+def test_output_and_exit_code(manager):
+    result = manager.run("echo hello; exit 3", timeout=5)
+
+    assert result["status"] == "done"
+    assert result["exit_code"] == 3
+    assert result["output"].strip() == "hello"
+    assert "__MAGI_" not in result["output"]
+
+
+def test_commands_do_not_leak_into_the_next_one(manager):
+    manager.run("cd /; export LEAK=1; exit 5", timeout=5)
+    result = manager.run("pwd; echo \"[$LEAK]\"", timeout=5)
+
+    assert result["exit_code"] == 0
+    assert result["output"].split() == [manager.run("pwd", timeout=5)["output"].strip(), "[]"]
+
+
+def test_shells_are_reused(manager):
+    for _ in range(5):
+        manager.run("true", timeout=5)
+
+    assert manager.shell_pool.hits >= 4
+    assert manager.shell_pool.spawned <= 3
+
+
+def test_runs_in_the_requested_cwd(manager, tmp_path):
+    result = manager.run("pwd", cwd=str(tmp_path), timeout=5)
+    assert result["output"].strip() == str(tmp_path)
+
+
+def test_background_command_and_status(manager):
+    started = manager.run("sleep 0.3; echo late", timeout=0)
+    assert started["status"] == "running"
+
+    status = manager.status(started["command_id"], wait=5)
+    assert status["status"] == "done"
+    assert status["exit_code"] == 0
+    assert "late" in status["output"]
+
+
+def test_input_recycles_the_shell(manager):
+    cmd_id = manager.run("head -n 1", timeout=0)["command_id"]
+    result = manager.send_input(cmd_id, text="ping\n", wait=5)
+    assert "ping" in result["output"]
+
+    shell_pid = manager._get(cmd_id).pid
+    manager.status(cmd_id, wait=5)
+    idle = [shell for shells in manager.shell_pool._idle.values() for shell in shells]
+    assert all(shell.pid != shell_pid for shell in idle)
+
+
+def test_terminate_kills_the_shell(manager):
+    cmd_id = manager.run("sleep 30", timeout=0)["command_id"]
+    result = manager.send_input(cmd_id, terminate=True)
+
+    assert result["status"] == "done"
+    assert manager.run("echo alive", timeout=5)["output"].strip() == "alive"
+
+
+def test_sentinel_split_across_reads(manager):
+    result = manager.run("true", timeout=5)
+    shell = next(iter(manager.shell_pool._idle.values()))[0]
+    marker = shell._marker
+
+    assert shell._partial_sentinel_start(b"output" + marker[:5]) == len(b"output")
+    assert shell._partial_sentinel_start(b"output" + marker + b"12_") == len(b"output")
+    assert shell._partial_sentinel_start(b"output\r\nmore") == len(b"output\r\nmore")
+    assert result["exit_code"] == 0
@@ -0,0 +1,156 @@
+import json
+import os
+import time
+
+from magi import agent
+from state_journal import StateJournal, StatePersister, state_persister
+
+
+def _state(history, **fields):
+    state = {"name": "A", "description": "d", "status": "RUNNING", "stm": [], "stm_content": "stm"}
+    state.update(fields)
+    state["history"] = history
+    return state
+
+
+def _msg(i):
+    return {"role": "user", "content": f"message {i}"}
+
+
+def test_appends_go_to_journal_and_replay(tmp_path):
+    path = str(tmp_path / "A_state.json")
+    journal = StateJournal(path)
+    history = [_msg(0)]
+    state = _state(history)
+    journal.save(state)
+    snapshot_size = os.path.getsize(path)
+
+    for i in range(1, 4):
+        history.append(_msg(i))
+        journal.save(state)
+    state["stm_content"] = "changed"
+    journal.save(state)
+
+    # Snapshot untouched, one journal line per save that changed something
+    assert os.path.getsize(path) == snapshot_size
+    with open(journal.journal_path) as f:
+        assert len(f.readlines()) == 4
+
+    loaded = StateJournal(path).load()
+    assert loaded["history"] == history
+    assert loaded["stm_content"] == "changed"
+
+
+def test_replaced_history_and_compaction_write_snapshot(tmp_path):
+    path = str(tmp_path / "A_state.json")
+    journal = StateJournal(path, compact_every=2)
+    state = _state([_msg(i) for i in range(10)])
+    journal.save(state)
+
+    # Summarization replaces the list: folded into a snapshot, journal emptied
+    state["history"] = state["history"][-3:]
+    journal.save(state)
+    assert os.path.getsize(journal.journal_path) == 0
+    assert json.load(open(path))["history"] == state["history"]
+
+    for i in range(2):
+        state["history"].append(_msg(100 + i))
+        journal.save(state)
+    assert len(open(journal.journal_path).readlines()) == 2
+
+    # The third journaled save hits compact_every and is folded into a snapshot
+    state["history"].append(_msg(102))
+    journal.save(state)
+    assert os.path.getsize(journal.journal_path) == 0
+    assert StateJournal(path).load()["history"] == state["history"]
+
+
+def test_torn_journal_tail_is_dropped(tmp_path):
+    path = str(tmp_path / "A_state.json")
+    journal = StateJournal(path)
+    state = _state([_msg(0)])
+    journal.save(state)
+    state["history"].append(_msg(1))
+    journal.save(state)
+
+    with open(journal.journal_path, "a") as f:
+        f.write('{"seq": 99, "ops": [{"op": "app')
+
+    recovered = StateJournal(path)
+    loaded = recovered.load()
+    assert loaded["history"] == [_msg(0), _msg(1)]
+
+    # The journal keeps working after recovery
+    loaded["history"].append(_msg(2))
+    recovered.save(loaded)
+    assert StateJournal(path).load()["history"] == [_msg(0), _msg(1), _msg(2)]
+
+
+def test_entries_already_in_snapshot_are_not_replayed(tmp_path):
+    path = str(tmp_path / "A_state.json")
+    journal = StateJournal(path)
+    state = _state([_msg(0)])
+    journal.save(state)
+    state["history"].append(_msg(1))
+    journal.save(state)
+    stale_journal = open(journal.journal_path).read()
+
+    # Crash after the snapshot was replaced but before the journal was truncated
+    journal.compact(state)
+    with open(journal.journal_path, "w") as f:
+        f.write(stale_journal)
+
+    assert StateJournal(path).load()["history"] == [_msg(0), _msg(1)]
+
+
+def test_legacy_state_file_loads(tmp_path):
+    path = tmp_path / "A_state.json"
+    path.write_text(json.dumps(_state([_msg(0)]), indent=4))
+    assert StateJournal(str(path)).load()["history"] == [_msg(0)]
+
+
+class CountingOwner:
+    def __init__(self):
+        self.writes = 0
+
+    def write_state(self):
+        self.writes += 1
+
+
+def test_persister_coalesces_saves_until_flush():
+    persister = StatePersister(interval=60, max_pending=1000)
+    a, b = CountingOwner(), CountingOwner()
+    for _ in range(10):
+        persister.mark_dirty(a)
+    persister.mark_dirty(b)
+    assert persister.pending() == 11
+    assert a.writes == 0
+
+    persister.flush()
+    assert (a.writes, b.writes) == (1, 1)
+    assert persister.pending() == 0
+    persister.close()
+
+
+def test_persister_flushes_early_when_too_much_is_pending():
+    persister = StatePersister(interval=60, max_pending=5)
+    owner = CountingOwner()
+    for _ in range(5):
+        persister.mark_dirty(owner)
+
+    deadline = time.monotonic() + 2
+    while owner.writes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert owner.writes == 1
+    persister.close()
+
+
+def test_agent_save_state_is_written_behind(tmp_path):
+    a = agent(name="PersistAgent", description="persister test agent.")
+    a.write_state()
+    a.history.append({"role": "user", "content": "remember me"})
+    a.save_state()
+    a.save_state()
+
+    state_persister.flush()
+    assert StateJournal(a.get_state_file_path()).load()["history"] == a.history
@@ -0,0 +1,157 @@
+import pytest
+
+import magi
+from magi import agent, agents
+from state_journal import state_persister
+from stm_store import STM_HEADER, STMStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_exact_duplicates_merge(clock):
+    store = STMStore(clock=clock)
+    first = store.add("The API key lives in .env")
+    clock.now += 10
+    second = store.add("the api key lives in .env!")
+
+    assert second is first
+    assert len(store) == 1
+    assert first.hits == 2
+    assert first.updated == 1010.0
+    assert first.created == 1000.0
+    assert store.merged == 1
+
+
+def test_near_duplicates_take_the_newer_wording(clock):
+    store = STMStore(clock=clock)
+    store.add("The build server runs tests on every push to main")
+    entry = store.add("The build server runs tests on every push to main branch")
+
+    assert len(store) == 1
+    assert entry.text == "The build server runs tests on every push to main branch"
+    # Different facts that share words stay apart
+    store.add("Secret code is 12345")
+    store.add("Secret code is 54321")
+    assert len(store) == 3
+
+
+def test_entries_expire_by_age_and_priority(clock):
+    store = STMStore(ttl=100, clock=clock)
+    store.add("ordinary note")
+    store.add("important note", priority=2)
+
+    clock.now += 150
+    assert "ordinary note" not in store.render()
+    assert "important note" in store.render()
+
+    clock.now += 200
+    assert store.render() == STM_HEADER
+    assert len(store) == 0
+
+
+def test_capacity_evicts_lowest_priority_then_oldest(clock):
+    store = STMStore(max_entries=2, clock=clock)
+    store.add("keep me", priority=1)
+    clock.now += 1
+    store.add("old ordinary")
+    clock.now += 1
+    store.add("new ordinary")
+
+    assert [e.text for e in store.entries] == ["keep me", "new ordinary"]
+    assert store.evict_one().text == "new ordinary"
+
+
+def test_render_is_cached_until_entries_change(clock):
+    store = STMStore(clock=clock)
+    store.add("one")
+    store.add("summary of the session", source="summary")
+
+    text = store.render()
+    assert text == STM_HEADER + "[Memory] one\n[Summary] summary of the session"
+    assert store.render() is text
+    store.add("two")
+    assert store.render() is not text
+
+
+def test_only_changed_entries_need_compression(clock):
+    store = STMStore(clock=clock)
+    a = store.add("alpha fact")
+    b = store.add("beta fact")
+    store.replace([a, b], ["alpha and beta"])
+
+    assert store.changed() == []
+    new = store.add("gamma fact")
+    assert store.changed() == [new]
+    assert [e.text for e in store.entries] == ["alpha and beta", "gamma fact"]
+    assert store.entries[0].source == "compressed"
+
+
+def test_text_round_trip_and_persistence(clock):
+    store = STMStore(clock=clock)
+    store.load_text("\n\nShort-Term Memories:\n[Memory] one\n[Summary] two\nthree")
+    assert [(e.text, e.source) for e in store.entries] == [("one", "remember"), ("two", "summary"), ("three", "edit")]
+
+    restored = STMStore(clock=clock)
+    restored.load(store.to_list())
+    assert restored.render() == store.render()
+    assert restored.add("ONE").hits == 2
+
+
+@pytest.fixture
+def stm_agent():
+    agents.clear()
+    a = agent(name="STMAgent", description="stm test agent.")
+    yield a
+    agents.clear()
+
+
+def test_compress_stm_sends_only_changed_entries(stm_agent, monkeypatch):
+    prompts = []
+
+    def fake_request(messages, text_format=None, kind=None):
+        prompts.append(messages[-1]["content"])
+        return "- compressed facts"
+
+    monkeypatch.setattr(magi, "ai_request", fake_request)
+    stm_agent.remember("first fact")
+    stm_agent.remember("second fact")
+    assert stm_agent.compress_stm() == "STM successfully compressed and deduplicated."
+    assert "first fact" in prompts[0] and "second fact" in prompts[0]
+
+    assert stm_agent.compress_stm().startswith("STM is already compressed")
+    assert len(prompts) == 1
+
+    stm_agent.remember("third fact")
+    stm_agent.compress_stm()
+    assert "third fact" in prompts[1]
+    assert "first fact" not in prompts[1]
+    assert stm_agent.stm_content == STM_HEADER + "[Memory] compressed facts"
+
+
+def test_remember_merges_duplicates_without_llm(stm_agent, monkeypatch):
+    monkeypatch.setattr(magi, "ai_request", lambda *a, **k: pytest.fail("no LLM call expected"))
+    for _ in range(50):
+        stm_agent.remember("The deploy script is scripts/deploy.sh")
+    assert len(stm_agent.stm) == 1
+
+
+def test_stm_state_survives_reload(stm_agent):
+    stm_agent.remember("persisted fact", priority=1)
+    stm_agent.save_state()
+    state_persister.flush()
+    agents.clear()
+
+    reloaded = agent(name="STMAgent", description="stm test agent.")
+    assert reloaded.stm.entries[0].text == "persisted fact"
+    assert reloaded.stm.entries[0].priority == 1
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+
+import pytest
+
+import magi
+from magi import agent, agents
+from summarizer import LatencyStats
+
+
+@pytest.fixture
+def summary_agent(monkeypatch, tmp_path):
+    monkeypatch.setattr(magi, "MESSAGE_LOG_PATH", str(tmp_path))
+    agents.clear()
+    a = agent(name="SummaryAgent", description="summary test agent.")
+    a.history = [{"role": "user", "content": f"old message {i}"} for i in range(20)]
+    yield a
+    agents.clear()
+
+
+@pytest.fixture
+def gated_llm(monkeypatch):
+    """ai_request that blocks until the test opens the gate, and records what it was sent."""
+    gate = threading.Event()
+    sent = []
+
+    def fake_request(messages, text_format=None, kind=None):
+        sent.append(messages)
+        assert gate.wait(5)
+        return "You did twenty things."
+
+    monkeypatch.setattr(magi, "ai_request", fake_request)
+    return gate, sent
+
+
+def test_summary_runs_in_background_and_keeps_new_messages(summary_agent, gated_llm):
+    gate, sent = gated_llm
+    old = list(summary_agent.history)
+
+    assert summary_agent.summarize_history() == "History summarization started in the background."
+    job = summary_agent._summary_job[0]
+    # The agent is not blocked: new messages arrive while the summary is written
+    summary_agent.post({"role": "user", "name": "Kelsier", "content": "a new request"})
+    assert not job.done()
+    assert summary_agent.summarize_in_background() is job
+
+    gate.set()
+    job.result(5)
+    summary_agent._apply_summary()
+
+    assert summary_agent.history == old[-8:] + [{"role": "user", "name": "Kelsier", "content": "a new request"}]
+    assert summary_agent.summaries.render().endswith("[Summary of 20 messages] You did twenty things.")
+    assert "a new request" not in sent[0][-1]["content"]
+    assert summary_agent._summary_job is None
+
+
+def test_swap_waits_for_the_step_to_end(summary_agent, gated_llm):
+    gate, _ = gated_llm
+    gate.set()
+    summary_agent._begin_step()
+    job = summary_agent.summarize_in_background()
+    job.result(5)
+    summary_agent.history.append({"role": "assistant", "content": "mid-step reply"})
+
+    # Mid-step the history is left alone
+    assert not summary_agent._apply_summary()
+    assert len(summary_agent.history) == 21
+
+    summary_agent._end_step("RUNNING")
+    assert len(summary_agent.history) == 9
+    assert summary_agent.history[-1] == {"role": "assistant", "content": "mid-step reply"}
+    assert summary_agent.step_latency.count == 1
+    assert summary_agent.summary_latency.count == 1
+
+
+def test_summary_is_dropped_if_history_was_replaced(summary_agent, gated_llm):
+    gate, _ = gated_llm
+    summary_agent._begin_step()
+    job = summary_agent.summarize_in_background()
+    summary_agent.history = [{"role": "user", "content": "fresh start"}]
+    gate.set()
+    job.result(5)
+    summary_agent._end_step("RUNNING")
+
+    assert summary_agent.history == [{"role": "user", "content": "fresh start"}]
+    assert summary_agent.summaries.nodes == []
+
+
+def test_failed_summary_leaves_history_untouched(summary_agent, monkeypatch):
+    monkeypatch.setattr(magi, "ai_request", lambda *a, **k: "error")
+    before = list(summary_agent.history)
+
+    summary_agent.force_summarize()
+    assert summary_agent.history == before
+    assert summary_agent._summary_job is None
+    assert summary_agent.summary_latency.count == 1
+
+
+def test_short_history_is_not_summarized(summary_agent):
+    summary_agent.history = summary_agent.history[:3]
+    assert summary_agent.summarize_in_background() is None
+    assert summary_agent.summarize_history() == "History is too short to summarize."
+
+
+def test_over_budget_step_awaits_summary_without_blocking_the_loop(summary_agent, gated_llm, monkeypatch):
+    gate, _ = gated_llm
+    monkeypatch.setattr(magi, "CONTEXT_TOKEN_BUDGET", 1)
+
+    async def fake_tool_request(messages, tools_schema):
+        return "error"
+
+    monkeypatch.setattr(magi, "async_ai_tool_request", fake_tool_request)
+
+    async def scenario():
+        step = asyncio.create_task(summary_agent.astep())
+        # The event loop keeps running while the step waits for the summary
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+        assert not step.done()
+        gate.set()
+        return await asyncio.wait_for(step, 5)
+
+    assert asyncio.run(scenario()) == "ERROR"
+    assert len(summary_agent.history) == 8
+    assert "You did twenty things." in summary_agent.summaries.render()
+
+
+def test_latency_stats():
+    stats = LatencyStats()
+    assert stats.summary()["mean"] is None
+    stats.record(1.0)
+    stats.record(3.0)
+    assert stats.summary() == {"count": 2, "total": 4.0, "mean": 2.0, "last": 3.0, "max": 3.0}
@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+import magi
+from magi import agent, agents
+from models import SummaryNode
+from state_journal import state_persister
+from summary_tree import SUMMARY_HEADER, SummaryTree
+
+
+def _merge(texts):
+    return "(" + "+".join(texts) + ")"
+
+
+def test_levels_roll_up_when_full():
+    tree = SummaryTree(fanout=2)
+    nodes = []
+    for i in range(1, 8):
+        nodes = tree.extend(nodes, f"s{i}", 10, _merge)
+    tree.replace(nodes)
+
+    # 7 leaves with fanout 2: like a binary counter, one (s1..s4), one (s5+s6), then s7
+    assert [(n.level, n.text) for n in tree.nodes] == [(2, "((s1+s2)+(s3+s4))"), (1, "(s5+s6)"), (0, "s7")]
+    assert [n.messages for n in tree.nodes] == [40, 20, 10]
+    assert tree.latest().text == "s7"
+
+
+def test_frontier_stays_bounded():
+    tree = SummaryTree(fanout=3)
+    calls = []
+    nodes = []
+    for i in range(200):
+        nodes = tree.extend(nodes, f"s{i}", 1, lambda texts: calls.append(len(texts)) or "merged")
+        levels = [n.level for n in nodes]
+        assert levels == sorted(levels, reverse=True)
+        assert all(levels.count(level) <= 3 for level in set(levels))
+    assert set(calls) == {3}
+    assert sum(n.messages for n in nodes) == 200
+
+
+def test_failed_roll_up_keeps_the_leaf():
+    tree = SummaryTree(fanout=1)
+
+    def fail(texts):
+        raise RuntimeError("LLM request failed.")
+
+    nodes = tree.extend(tree.extend([], "a", 1, fail), "b", 1, fail)
+    assert [n.text for n in nodes] == ["a", "b"]
+
+
+def test_render_and_persistence():
+    tree = SummaryTree()
+    assert tree.render() == ""
+    tree.replace(tree.extend([], "You set up the repo.", 12, _merge))
+    assert tree.render() == SUMMARY_HEADER + "[Summary of 12 messages] You set up the repo."
+
+    restored = SummaryTree()
+    restored.load(tree.to_list())
+    assert restored.nodes == tree.nodes
+    assert isinstance(restored.nodes[0], SummaryNode)
+
+
+@pytest.fixture
+def tree_agent(monkeypatch, tmp_path):
+    monkeypatch.setattr(magi, "MESSAGE_LOG_PATH", str(tmp_path))
+    monkeypatch.setattr(magi, "SUMMARY_KEEP_MESSAGES", 2)
+    agents.clear()
+    a = agent(name="TreeAgent", description="summary tree test agent.")
+    a.summaries.fanout = 2
+    yield a
+    agents.clear()
+
+
+def _talk(a, start, count):
+    a.history.extend({"role": "user", "content": f"message {i}"} for i in range(start, start + count))
+
+
+def test_only_new_messages_are_summarized(tree_agent, monkeypatch):
+    sent = []
+
+    def fake_request(messages, text_format=None, kind=None):
+        sent.append(messages)
+        if "consecutive summaries" in messages[0]["content"]:
+            return "rolled up"
+        return f"summary {len(sent)}"
+
+    monkeypatch.setattr(magi, "ai_request", fake_request)
+
+    _talk(tree_agent, 0, 10)
+    tree_agent.force_summarize()
+    assert [m["content"] for m in json.loads(sent[0][-1]["content"])] == [f"message {i}" for i in range(10)]
+    assert [m["content"] for m in tree_agent.history] == ["message 8", "message 9"]
+    assert tree_agent.summarized_messages == 2
+
+    _talk(tree_agent, 10, 5)
+    tree_agent.force_summarize()
+    delta = json.loads(sent[1][-1]["content"])
+    # The two kept messages were covered by the first summary and are not sent again
+    assert [m["content"] for m in delta] == [f"message {i}" for i in range(10, 15)]
+    assert "summary 1" in sent[1][-2]["content"]
+
+    _talk(tree_agent, 15, 5)
+    tree_agent.force_summarize()
+    # Third leaf over the fanout of 2: the two oldest were rolled up
+    assert [(n.level, n.text) for n in tree_agent.summaries.nodes] == [(1, "rolled up"), (0, "summary 3")]
+    assert sum(n.messages for n in tree_agent.summaries.nodes) == 20
+
+    # Nothing new since the last summary: no request at all
+    requests = len(sent)
+    assert tree_agent.summarize_in_background() is None
+    assert len(sent) == requests
+
+
+def test_summary_block_precedes_history(tree_agent, monkeypatch):
+    monkeypatch.setattr(magi, "ai_request", lambda *a, **k: "You explored the code.")
+    _talk(tree_agent, 0, 6)
+    tree_agent.force_summarize()
+
+    messages = tree_agent.get_messages()
+    assert messages[1]["content"].endswith("[Summary of 6 messages] You explored the code.")
+    assert messages[2:4] == tree_agent.history
+    assert tree_agent.context_usage()["summary"] > 0
+
+
+def test_summaries_and_watermark_survive_reload(tree_agent, monkeypatch):
+    monkeypatch.setattr(magi, "ai_request", lambda *a, **k: "You explored the code.")
+    _talk(tree_agent, 0, 6)
+    tree_agent.force_summarize()
+    tree_agent.save_state()
+    state_persister.flush()
+    agents.clear()
+
+    reloaded = agent(name="TreeAgent", description="summary tree test agent.")
+    assert reloaded.summaries.nodes[0].text == "You explored the code."
+    assert reloaded.summarized_messages == 2
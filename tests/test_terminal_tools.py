@@ -1,7 +1,7 @@
 import json
 import time
 import pytest
-from tools import run_command, command_status, send_command_input
+from tools import run_command, command_status, send_command_input, current_agent_name
 
 
 class TestRunCommand:
@@ -111,3 +111,52 @@ class TestSendCommandInput:
 
         # Clean up
         send_command_input(cmd_id, terminate="true")
+
+
+class TestIncrementalOutput:
+    """command_status only returns output the caller hasn't seen yet."""
+
+    def test_second_read_returns_only_new_output(self):
+        cmd_id = json.loads(run_command("echo first; read x; echo second", timeout="1"))["command_id"]
+        json.loads(command_status(cmd_id))
+
+        send_command_input(cmd_id, input="\n", wait="0")
+        status = json.loads(command_status(cmd_id, wait="5"))
+        assert status["status"] == "done"
+        assert "second" in status["output"]
+        assert "first" not in status["output"]
+
+        assert json.loads(command_status(cmd_id))["output"] == ""
+
+    def test_since_rereads_from_an_offset(self):
+        cmd_id = json.loads(run_command("echo alpha; echo beta", timeout="0"))["command_id"]
+        status = json.loads(command_status(cmd_id, wait="5"))
+
+        again = json.loads(command_status(cmd_id, since="0"))
+        assert "alpha" in again["output"] and "beta" in again["output"]
+        assert again["next_offset"] == status["next_offset"]
+
+    def test_each_agent_has_its_own_cursor(self):
+        token = current_agent_name.set("Reader-A")
+        try:
+            cmd_id = json.loads(run_command("echo shared", timeout="5"))["command_id"]
+            assert json.loads(command_status(cmd_id))["output"] == ""
+        finally:
+            current_agent_name.reset(token)
+
+        token = current_agent_name.set("Reader-B")
+        try:
+            assert "shared" in json.loads(command_status(cmd_id))["output"]
+        finally:
+            current_agent_name.reset(token)
+
+    def test_middle_is_elided_when_lines_are_cut(self):
+        cmd_id = json.loads(run_command("seq 1 100", timeout="0"))["command_id"]
+        status = json.loads(command_status(cmd_id, wait="5", output_lines="10", since="0"))
+
+        lines = status["output"].split("\n")
+        assert lines[:5] == [str(i) for i in range(1, 6)]
+        assert lines[6:] == [str(i) for i in range(96, 101)]
+        elided = len("".join(f"{i}\r\n" for i in range(6, 96)))
+        assert lines[5] == f"... ({elided} bytes omitted) ..."
+        assert status["skipped_bytes"] == elided
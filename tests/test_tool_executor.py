@@ -0,0 +1,195 @@
+import asyncio
+import contextvars
+import json
+import threading
+import time
+
+import pytest
+
+from magi import agent, agents
+from models import AgentStep, ToolCall
+from tool_executor import ToolExecutor
+
+
+@pytest.fixture(autouse=True)
+def clear_agents():
+    agents.clear()
+    yield
+    agents.clear()
+
+
+def _call(name, delay=0.0):
+    return ToolCall(id=f"call_{name}", name=name, arguments=json.dumps({"delay": delay}))
+
+
+def _sleeping_runner(log):
+    def run(call):
+        log.append(("start", call.name))
+        time.sleep(json.loads(call.arguments)["delay"])
+        log.append(("end", call.name))
+        return f"{call.name} done"
+    return run
+
+
+def test_independent_calls_run_concurrently_and_keep_order():
+    executor = ToolExecutor(max_parallel=4, timeout=5)
+    calls = [_call("c", 0.3), _call("b", 0.2), _call("a", 0.1)]
+
+    start = time.monotonic()
+    results = executor.run_batch(calls, _sleeping_runner([]), lambda c: False)
+
+    assert time.monotonic() - start < 0.5
+    assert results == ["c done", "b done", "a done"]
+
+
+def test_parallelism_is_capped_per_step():
+    executor = ToolExecutor(max_parallel=2, timeout=5)
+    lock = threading.Lock()
+    active = peak = 0
+
+    def run(call):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+        return "ok"
+
+    executor.run_batch([_call(str(i)) for i in range(6)], run, lambda c: False)
+    assert peak == 2
+
+
+def test_barriers_run_alone_in_call_order():
+    executor = ToolExecutor(max_parallel=4, timeout=5)
+    log = []
+    calls = [_call("read1", 0.1), _call("read2", 0.05), _call("send"), _call("read3")]
+
+    executor.run_batch(calls, _sleeping_runner(log), lambda c: c.name == "send")
+
+    send_start = log.index(("start", "send"))
+    assert {("end", "read1"), ("end", "read2")} <= set(log[:send_start])
+    assert log[send_start + 1] == ("end", "send")
+    assert log[-1] == ("end", "read3")
+
+
+def test_slow_call_times_out_without_blocking_the_rest():
+    executor = ToolExecutor(max_parallel=4, timeout=0.2)
+
+    start = time.monotonic()
+    results = executor.run_batch([_call("slow", 1.0), _call("fast")], _sleeping_runner([]), lambda c: False)
+
+    assert time.monotonic() - start < 0.5
+    assert "timed out after 0.2 seconds" in results[0]
+    assert results[1] == "fast done"
+
+
+def test_barrier_calls_time_out_too():
+    executor = ToolExecutor(timeout=0.2)
+
+    start = time.monotonic()
+    results = executor.run_batch([_call("send", 1.0), _call("after")], _sleeping_runner([]), lambda c: c.name == "send")
+
+    assert time.monotonic() - start < 0.5
+    assert "timed out after 0.2 seconds" in results[0]
+    assert results[1] == "after done"
+
+
+def test_time_queued_for_a_worker_does_not_count():
+    # One worker: the second call waits 0.2s for the first, then runs 0.2s itself
+    executor = ToolExecutor(max_workers=1, max_parallel=2, timeout=0.3)
+    results = executor.run_batch([_call("a", 0.2), _call("b", 0.2)], _sleeping_runner([]), lambda c: False)
+    assert results == ["a done", "b done"]
+
+    async def arun(call):
+        return await executor.run_in_pool(_sleeping_runner([]), call)
+
+    results = asyncio.run(executor.arun_batch([_call("c", 0.2), _call("d", 0.2)], arun, lambda c: False))
+    assert results == ["c done", "d done"]
+
+    # The queue wait alone is longer than the timeout: the second call still runs, on its own clock
+    calls = [_call("e", 0.4), _call("f", 0.05)]
+    timed_out = "Error: Tool 'e' timed out after 0.3 seconds."
+    assert executor.run_batch(calls, _sleeping_runner([]), lambda c: False) == [timed_out, "f done"]
+    assert asyncio.run(executor.arun_batch(calls, arun, lambda c: False)) == [timed_out, "f done"]
+
+
+def test_command_tools_keep_their_place_in_the_step():
+    a = agent(name="ExecutorAgent", description="executor test agent.")
+    for name in ("run_command", "send_command_input", "edit_file"):
+        assert a._is_barrier_call(ToolCall(id="call", name=name, arguments="{}"))
+    assert not a._is_barrier_call(ToolCall(id="call", name="command_status", arguments="{}"))
+
+
+def test_context_variables_reach_worker_threads():
+    current = contextvars.ContextVar("current")
+    current.set("Magi-01")
+    executor = ToolExecutor(timeout=5)
+
+    results = executor.run_batch([_call("a"), _call("b")], lambda c: current.get(), lambda c: False)
+    assert results == ["Magi-01", "Magi-01"]
+
+
+def test_agent_step_runs_reads_in_parallel_and_wait_last(tmp_path):
+    a = agent(name="ExecutorAgent", description="executor test agent.")
+    for i in range(3):
+        (tmp_path / f"f{i}.txt").write_text(f"file {i}\n")
+
+    step = AgentStep(reasoning="Reading three files at once.", tool_calls=[
+        ToolCall(id=f"call_{i}", name="read_file", arguments=json.dumps({"path": str(tmp_path / f"f{i}.txt")}))
+        for i in range(3)
+    ] + [ToolCall(id="call_wait", name="wait", arguments="{}")])
+    assert a._apply_step(step) == "STOPPED"
+
+    results = a.history[1:]
+    assert [r["tool_call_id"] for r in results] == ["call_0", "call_1", "call_2", "call_wait"]
+    assert all(f"file {i}" in results[i]["content"] for i in range(3))
+    assert results[3]["content"] == "Agent paused."
+
+
+def test_async_batch_keeps_barrier_order_and_times_out():
+    executor = ToolExecutor(max_parallel=4, timeout=0.2)
+    log = []
+
+    async def arun(call):
+        log.append(call.name)
+        await asyncio.sleep(json.loads(call.arguments)["delay"])
+        return f"{call.name} done"
+
+    calls = [_call("slow", 1.0), _call("fast", 0.05), _call("send"), _call("after")]
+    results = asyncio.run(executor.arun_batch(calls, arun, lambda c: c.name == "send"))
+
+    assert "timed out" in results[0]
+    assert results[1:] == ["fast done", "send done", "after done"]
+    assert log.index("send") > log.index("fast")
+
+
+def test_async_step_does_not_block_other_agents():
+    a = agent(name="ExecutorAgent", description="executor test agent.")
+    a.status = "RUNNING"
+    step = AgentStep(reasoning="Building.", tool_calls=[
+        ToolCall(id="call_run", name="run_command", arguments=json.dumps({"command": "sleep 0.5; echo built", "timeout": 5})),
+        ToolCall(id="call_ls", name="ls", arguments=json.dumps({"path": "."})),
+    ])
+
+    async def scenario():
+        ticks = 0
+
+        async def other_agent():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(other_agent())
+        status = await a._aapply_step(step)
+        task.cancel()
+        return status, ticks
+
+    status, ticks = asyncio.run(scenario())
+    assert status == "RUNNING"
+    assert ticks >= 25
+    assert '"exit_code": 0' in a.history[1]["content"]
+    assert "built" in a.history[1]["content"]
+    assert a.history[2]["tool_call_id"] == "call_ls"
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from magi import _history_tail, agent, agents
+from models import AgentStep, ToolCall
+from tool_registry import ToolArgumentError, ToolRegistry, parse_docstring, tool_registry
+from tools import command_status, read_file, run_command
+
+
+@pytest.fixture(autouse=True)
+def clear_agents():
+    agents.clear()
+    yield
+    agents.clear()
+
+
+def test_docstring_parsing():
+    summary, args = parse_docstring(read_file.__doc__)
+    assert summary.startswith("Reads the content of a file")
+    assert args["start_line"][0] == "int"
+    assert "1-indexed" in args["start_line"][1]
+
+
+def test_schema_types_and_required_fields():
+    schema = tool_registry.spec("command_status", command_status).schema["function"]
+    props = schema["parameters"]["properties"]
+    assert schema["parameters"]["required"] == ["command_id"]
+    assert props["wait"]["type"] == "number"
+    assert props["output_lines"]["type"] == "integer"
+    assert props["command_id"]["type"] == "string"
+
+
+def test_validation_coerces_and_rejects():
+    spec = tool_registry.spec("run_command", run_command)
+    assert spec.validate({"command": "ls", "timeout": "2.5"}) == {"command": "ls", "timeout": 2.5}
+
+    with pytest.raises(ToolArgumentError, match="Missing required argument 'command'"):
+        spec.validate({"timeout": 1})
+    with pytest.raises(ToolArgumentError, match="Unknown argument"):
+        spec.validate({"command": "ls", "shell": "zsh"})
+    with pytest.raises(ToolArgumentError, match="must be of type number"):
+        spec.validate({"command": "ls", "timeout": "soon"})
+
+
+def test_specs_are_built_once_per_function():
+    registry = ToolRegistry()
+    a = agent(name="RegistryAgent", description="registry test agent.")
+    b = agent(name="RegistryAgent2", description="registry test agent.")
+    assert registry.spec("remember", a.remember) is registry.spec("remember", b.remember)
+    assert a.get_tool_schemas() is a.get_tool_schemas()
+
+
+def test_apply_step_answers_every_tool_call(tmp_path):
+    a = agent(name="RegistryAgent", description="registry test agent.")
+    target = tmp_path / "notes.txt"
+    target.write_text("one\ntwo\nthree\n")
+
+    step = AgentStep(reasoning="Reading the notes, then pausing.", tool_calls=[
+        ToolCall(id="call_1", name="read_file", arguments=json.dumps({"path": str(target), "start_line": "2"})),
+        ToolCall(id="call_2", name="no_such_tool", arguments="{}"),
+        ToolCall(id="call_3", name="read_file", arguments="{not json"),
+        ToolCall(id="call_4", name="wait", arguments="{}"),
+    ])
+    assert a._apply_step(step) == "STOPPED"
+
+    assistant, *results = a.history
+    assert [c["id"] for c in assistant["tool_calls"]] == ["call_1", "call_2", "call_3", "call_4"]
+    assert [r["tool_call_id"] for r in results] == ["call_1", "call_2", "call_3", "call_4"]
+    assert "two\nthree" in results[0]["content"]
+    assert "not found" in results[1]["content"]
+    assert "Invalid arguments" in results[2]["content"]
+    assert results[3]["content"] == "Agent paused."
+
+
+def test_history_tail_keeps_tool_results_with_their_call():
+    history = [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": None, "tool_calls": [{"id": "a"}, {"id": "b"}]},
+        {"role": "tool", "tool_call_id": "a", "content": "1"},
+        {"role": "tool", "tool_call_id": "b", "content": "2"},
+    ]
+    assert _history_tail(history, 1) == history[1:]
+    assert _history_tail(history, 10) == history
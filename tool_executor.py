@@ -0,0 +1,199 @@
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Sequence
+from config import MAX_PARALLEL_TOOL_CALLS, TOOL_CALL_TIMEOUT, TOOL_WORKER_THREADS
+
+
+class _Clock:
+    """When a tool call actually started. Time spent queued for a pool worker does not count."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.started = threading.Event()
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.started.set()
+
+    def queue(self):
+        """The call is waiting for a pool worker again; the clock stops until one picks it up."""
+        self.started.clear()
+
+    def remaining(self, timeout):
+        return max(0.0, self.started_at + timeout - time.monotonic())
+
+
+# The clock of the call being awaited on this task, moved forward by run_in_pool() once a worker picks it up
+_call_clock = contextvars.ContextVar("tool_call_clock", default=None)
+
+
+class ToolExecutor:
+    """
+    Runs the tool calls of one agent step on a shared worker pool.
+
+    Consecutive independent calls run concurrently, at most `max_parallel` at a
+    time per step. Calls marked as barriers (tools that mutate the agent or the
+    filesystem, e.g. `wait`, `send_message`, `edit_file`, `run_command`) run
+    alone, after every earlier call has finished and before any later one
+    starts, so their ordering relative to the rest of the step is preserved.
+    Results are always returned in call order.
+
+    A call that runs longer than `timeout` seconds, counted from when a worker
+    picks it up, is reported as an error. Python threads cannot be killed, so
+    the tool keeps running in the background and its late result is discarded.
+
+    `arun_batch()` is the same for an agent stepping on the scheduler's event
+    loop: coroutine tools are awaited on the loop and blocking ones go to the
+    pool through `run_in_pool()`, so a slow tool never holds up other agents.
+    """
+
+    def __init__(self, max_workers: int = TOOL_WORKER_THREADS, max_parallel: int = MAX_PARALLEL_TOOL_CALLS,
+                 timeout: float = TOOL_CALL_TIMEOUT):
+        self.max_workers = max_workers
+        self.max_parallel = max_parallel
+        self.timeout = timeout
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+        return self._pool
+
+    def run_batch(self, calls: Sequence, run: Callable, is_barrier: Callable) -> List[str]:
+        """
+        Executes `run(call)` for every call and returns the results in order.
+
+        Args:
+            calls (list): The tool calls of one step.
+            run (callable): Executes one call and returns its result text. Must not raise.
+            is_barrier (callable): Returns True for calls that must run in isolation.
+        """
+        results = [None] * len(calls)
+        group = []
+        for index, call in enumerate(calls):
+            if is_barrier(call):
+                self._run_group(group, calls, run, results)
+                group = []
+                self._run_group([index], calls, run, results)
+            else:
+                group.append(index)
+        self._run_group(group, calls, run, results)
+        return results
+
+    def _run_group(self, indices, calls, run, results):
+        # Sliding window: at most `max_parallel` calls of this step run at once
+        running = deque()
+        for index in indices:
+            if len(running) >= self.max_parallel:
+                self._collect(running.popleft(), calls, results)
+            clock = _Clock()
+
+            def timed(call, clock=clock):
+                clock.start()
+                return run(call)
+
+            # Each call sees the caller's context variables (e.g. which agent is calling)
+            ctx = contextvars.copy_context()
+            future = self._get_pool().submit(ctx.run, timed, calls[index])
+            # A call cancelled before it started must not leave _collect() waiting
+            future.add_done_callback(lambda _, clock=clock: clock.started.set())
+            running.append((index, future, clock))
+        while running:
+            self._collect(running.popleft(), calls, results)
+
+    def _collect(self, entry, calls, results):
+        index, future, clock = entry
+        remaining = None
+        if self.timeout is not None:
+            # The pool is shared by all agents; a call queued behind other steps' calls hasn't started yet
+            clock.started.wait()
+            remaining = clock.remaining(self.timeout)
+        try:
+            results[index] = future.result(timeout=remaining)
+        except TimeoutError:
+            name = getattr(calls[index], "name", "tool")
+            results[index] = f"Error: Tool '{name}' timed out after {self.timeout:g} seconds."
+            print(f"  [Error] {results[index]}")
+
+    async def arun_batch(self, calls: Sequence, arun: Callable, is_barrier: Callable) -> List[str]:
+        """
+        Awaitable run_batch() for agents stepping on an event loop.
+
+        Args:
+            calls (list): The tool calls of one step.
+            arun (callable): Coroutine function executing one call and returning its result text. Must not raise.
+            is_barrier (callable): Returns True for calls that must run in isolation.
+        """
+        results = [None] * len(calls)
+        group = []
+        for index, call in enumerate(calls):
+            if is_barrier(call):
+                await self._arun_group(group, calls, arun, results)
+                group = []
+                await self._arun_group([index], calls, arun, results)
+            else:
+                group.append(index)
+        await self._arun_group(group, calls, arun, results)
+        return results
+
+    async def _arun_group(self, indices, calls, arun, results):
+        slots = asyncio.Semaphore(self.max_parallel)
+
+        async def run_one(index):
+            async with slots:
+                # A coroutine tool starts right away; run_in_pool() holds the clock while it is queued
+                clock = _Clock()
+                clock.start()
+                _call_clock.set(clock)
+                # The task copies this context, so run_in_pool() finds the clock
+                task = asyncio.ensure_future(arun(calls[index]))
+                while self.timeout is not None:
+                    # Not started yet: a whole timeout from now still ends before started_at + timeout
+                    started = clock.started.is_set()
+                    wait = clock.remaining(self.timeout) if started else self.timeout
+                    done, _ = await asyncio.wait({task}, timeout=wait)
+                    if done:
+                        break
+                    if clock.started.is_set() and clock.remaining(self.timeout) <= 0:
+                        task.cancel()
+                        name = getattr(calls[index], "name", "tool")
+                        results[index] = f"Error: Tool '{name}' timed out after {self.timeout:g} seconds."
+                        print(f"  [Error] {results[index]}")
+                        return
+                results[index] = await task
+
+        await asyncio.gather(*(run_one(index) for index in indices))
+
+    async def run_in_pool(self, func: Callable, *args):
+        """
+        Runs a blocking function on the worker pool without blocking the event loop.
+        Inside arun_batch() the call's timeout starts once a worker picks the function up.
+        """
+        clock = _call_clock.get()
+        if clock is not None:
+            clock.queue()
+
+        def timed(*args):
+            if clock is not None:
+                clock.start()
+            return func(*args)
+
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._get_pool(), ctx.run, timed, *args)
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+# Module-level singleton shared by all agents
+tool_executor = ToolExecutor()
@@ -0,0 +1,193 @@
+import re
+import json
+import inspect
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+# Docstring / annotation type names -> JSON schema types
+_JSON_TYPES = {
+    "str": "string",
+    "int": "integer",
+    "float": "number",
+    "bool": "boolean",
+    "list": "array",
+    "dict": "object",
+}
+_ANNOTATION_TYPES = {str: "str", int: "int", float: "float", bool: "bool", list: "list", dict: "dict"}
+
+# "name (type): description" inside an Args: section
+_ARG_LINE = re.compile(r"^(\w+)\s*\(([^)]*)\)\s*:\s*(.*)$")
+_MARKERS = re.compile(r"\s*\((?:required|optional)\)")
+
+
+class ToolArgumentError(ValueError):
+    """Raised when a tool call's arguments don't match the tool's schema."""
+
+
+def parse_docstring(doc: str) -> Tuple[str, Dict[str, Tuple[str, str]]]:
+    """
+    Splits a Google-style docstring into its summary and its Args entries.
+
+    Returns (summary, {arg_name: (type_name, description)}).
+    """
+    summary_lines, args = [], {}
+    current = None
+    in_args = False
+    for raw in inspect.cleandoc(doc or "").splitlines():
+        line = raw.strip()
+        if line == "Args:":
+            in_args = True
+            continue
+        if not in_args:
+            summary_lines.append(line)
+            continue
+        match = _ARG_LINE.match(line)
+        if match:
+            current = match.group(1)
+            args[current] = (match.group(2).strip(), match.group(3).strip())
+        elif current and line:
+            # Continuation of the previous argument's description
+            type_name, desc = args[current]
+            args[current] = (type_name, f"{desc} {line}")
+    # Required/optional is carried by the schema itself, the markers would only cost tokens
+    args = {k: (t, _MARKERS.sub("", d).strip()) for k, (t, d) in args.items()}
+    return " ".join(l for l in summary_lines if l), args
+
+
+def _json_type(type_name: str) -> Tuple[str, str]:
+    """Maps 'int', 'str, optional' or 'list[dict]' to (json type, json item type or None)."""
+    base = type_name.split(",")[0].strip().lower()
+    item = None
+    if "[" in base:
+        base, item = base.rstrip("]").split("[", 1)
+        item = _JSON_TYPES.get(item.strip(), "string")
+    return _JSON_TYPES.get(base.strip(), "string"), item
+
+
+class ToolSpec:
+    """The JSON schema of one tool plus a validator built from the same signature."""
+
+    def __init__(self, name: str, func: Callable):
+        self.name = name
+        summary, doc_args = parse_docstring(func.__doc__)
+
+        properties, required, params = {}, [], []
+        for param in inspect.signature(func).parameters.values():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            doc_type, desc = doc_args.get(param.name, ("", ""))
+            annotated = _ANNOTATION_TYPES.get(param.annotation)
+            json_type, item_type = _json_type(annotated or doc_type or "str")
+
+            prop = {"type": json_type}
+            if json_type == "array":
+                prop["items"] = {"type": item_type or "string"}
+            if desc:
+                prop["description"] = desc
+            properties[param.name] = prop
+
+            is_required = param.default is inspect.Parameter.empty
+            if is_required:
+                required.append(param.name)
+            params.append((param.name, json_type, is_required))
+
+        self._params = params
+        self._known = {p[0] for p in params}
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": summary,
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            },
+        }
+
+    def validate(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Checks and coerces call arguments. Raises ToolArgumentError with a precise message."""
+        if args is None:
+            args = {}
+        if not isinstance(args, dict):
+            raise ToolArgumentError(f"Arguments for tool '{self.name}' must be a JSON object.")
+        unknown = set(args) - self._known
+        if unknown:
+            raise ToolArgumentError(f"Unknown argument(s) for tool '{self.name}': {', '.join(sorted(unknown))}")
+
+        clean = {}
+        for name, json_type, is_required in self._params:
+            value = args.get(name)
+            if value is None:
+                if is_required:
+                    raise ToolArgumentError(f"Missing required argument '{name}' for tool '{self.name}'.")
+                continue
+            try:
+                clean[name] = _coerce(value, json_type)
+            except (TypeError, ValueError):
+                raise ToolArgumentError(
+                    f"Argument '{name}' of tool '{self.name}' must be of type {json_type}, got {value!r}."
+                ) from None
+        return clean
+
+
+def _coerce(value, json_type):
+    if json_type == "string":
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        return str(value)
+    if json_type == "integer":
+        if isinstance(value, bool):
+            raise TypeError
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError
+        return int(value)
+    if json_type == "number":
+        if isinstance(value, bool):
+            raise TypeError
+        return float(value)
+    if json_type == "boolean":
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in ("true", "1", "yes"):
+            return True
+        if text in ("false", "0", "no"):
+            return False
+        raise ValueError
+    if json_type in ("array", "object"):
+        if isinstance(value, str):
+            value = json.loads(value)
+        expected = list if json_type == "array" else dict
+        if not isinstance(value, expected):
+            raise TypeError
+        return value
+    return value
+
+
+class ToolRegistry:
+    """
+    Builds each tool's schema and validator once and reuses them.
+
+    Specs are keyed by the underlying function, so the bound methods of every
+    agent instance share a single spec.
+    """
+
+    def __init__(self):
+        self._specs: Dict[tuple, ToolSpec] = {}
+        self._lock = threading.Lock()
+
+    def spec(self, name: str, func: Callable) -> ToolSpec:
+        key = (name, getattr(func, "__func__", func))
+        spec = self._specs.get(key)
+        if spec is None:
+            with self._lock:
+                spec = self._specs.get(key)
+                if spec is None:
+                    spec = self._specs[key] = ToolSpec(name, func)
+        return spec
+
+    def schemas(self, tools: Dict[str, Callable]) -> List[dict]:
+        """The `tools=` payload for a name -> function mapping."""
+        return [self.spec(name, func).schema for name, func in tools.items()]
+
+
+# Module-level singleton
+tool_registry = ToolRegistry()
@@ -1,6 +1,18 @@
 import os
+import re
 import json
+import stat
+import tempfile
+import contextlib
+import contextvars
 from pty_manager import command_manager
+from code_search import code_search
+from file_reader import file_reader
+from unified_diff import PatchError, apply_hunks, parse_patch
+from config import CODE_SEARCH_MAX_RESULTS, READ_FILE_MAX_BYTES
+
+# Name of the agent whose tool call is running; set by the agent for the duration of a step
+current_agent_name = contextvars.ContextVar("current_agent_name", default=None)
 
 
 def _resolve_path(path):
@@ -10,7 +22,7 @@ def _resolve_path(path):
     return path
 
 
-def run_command(command, cwd=None, timeout="1"):
+def run_command(command, cwd=None, timeout=1):
     """
     Execute a shell command. Waits up to `timeout` seconds for completion.
     If the command finishes in time, returns the full output.
@@ -19,28 +31,31 @@ def run_command(command, cwd=None, timeout="1"):
     Args:
         command (str): The shell command to execute. (required)
         cwd (str): Working directory for the command. (optional)
-        timeout (str): Seconds to wait before sending to background. Default '1', max 10. (optional)
+        timeout (float): Seconds to wait before sending to background. Default 1, max 10. (optional)
     """
-    result = command_manager.run(command, cwd=cwd, timeout=float(timeout))
+    # A command may change any file; searches walk the tree again
+    code_search.invalidate()
+    result = command_manager.run(command, cwd=cwd, timeout=timeout, reader=current_agent_name.get())
     return json.dumps(result, ensure_ascii=False)
 
 
-def command_status(command_id, wait="0", output_lines="50"):
+def command_status(command_id, wait=0, output_lines=50, since=None):
     """
-    Check the status and read output of a background command.
+    Check the status of a background command and read the output you haven't seen yet.
+    Output already returned to you by run_command, command_status or send_command_input is not repeated.
 
     Args:
         command_id (str): The command ID returned by run_command. (required)
-        wait (str): Seconds to wait for completion before returning. Default '0' (immediate). (optional)
-        output_lines (str): Max number of output lines to return. Default '50'. (optional)
+        wait (float): Seconds to wait for completion before returning. Default 0 (immediate). (optional)
+        output_lines (int): Max number of output lines to return. Default 50. (optional)
+        since (int): Byte offset to read from instead, e.g. an earlier `next_offset`; 0 re-reads from the start. (optional)
     """
-    result = command_manager.status(
-        command_id, wait=float(wait), output_lines=int(output_lines)
-    )
+    result = command_manager.status(command_id, wait=wait, output_lines=output_lines, since=since,
+                                    reader=current_agent_name.get())
     return json.dumps(result, ensure_ascii=False)
 
 
-def send_command_input(command_id, input=None, terminate=None, wait="1"):
+def send_command_input(command_id, input=None, terminate=None, wait=1):
     """
     Send stdin input to a running command, or terminate it.
     Exactly one of `input` or `terminate` must be provided.
@@ -48,18 +63,51 @@ def send_command_input(command_id, input=None, terminate=None, wait="1"):
     Args:
         command_id (str): The command ID. (required)
         input (str): Text to send to stdin. Use '\\n' for Enter, '\\x03' for Ctrl+C. (optional)
-        terminate (str): Set to 'true' to kill the process. (optional)
-        wait (str): Seconds to wait for output after sending. Default '1'. (optional)
+        terminate (bool): Set to true to kill the process. (optional)
+        wait (float): Seconds to wait for output after sending. Default 1. (optional)
     """
+    error = _check_input_args(input, terminate)
+    if error:
+        return error
+
+    terminate_bool = str(terminate).lower() in ("true", "1", "yes") if terminate else False
+    code_search.invalidate()
+    result = command_manager.send_input(command_id, text=input, terminate=terminate_bool, wait=wait,
+                                        reader=current_agent_name.get())
+    return json.dumps(result, ensure_ascii=False)
+
+
+def _check_input_args(input, terminate):
     if input and terminate:
         return json.dumps({"error": "Provide either 'input' or 'terminate', not both."})
     if not input and not terminate:
         return json.dumps({"error": "Must provide either 'input' or 'terminate'."})
+    return None
+
+
+# Awaitable variants of the command tools. An agent stepping on the scheduler's event loop
+# uses these, so a command it waits on doesn't hold up the other agents.
+async def run_command_async(command, cwd=None, timeout=1):
+    code_search.invalidate()
+    result = await command_manager.arun(command, cwd=cwd, timeout=timeout, reader=current_agent_name.get())
+    return json.dumps(result, ensure_ascii=False)
+
+
+async def command_status_async(command_id, wait=0, output_lines=50, since=None):
+    result = await command_manager.astatus(command_id, wait=wait, output_lines=output_lines, since=since,
+                                           reader=current_agent_name.get())
+    return json.dumps(result, ensure_ascii=False)
+
+
+async def send_command_input_async(command_id, input=None, terminate=None, wait=1):
+    error = _check_input_args(input, terminate)
+    if error:
+        return error
 
     terminate_bool = str(terminate).lower() in ("true", "1", "yes") if terminate else False
-    result = command_manager.send_input(
-        command_id, text=input, terminate=terminate_bool, wait=float(wait)
-    )
+    code_search.invalidate()
+    result = await command_manager.asend_input(command_id, text=input, terminate=terminate_bool, wait=wait,
+                                               reader=current_agent_name.get())
     return json.dumps(result, ensure_ascii=False)
 
 # remove
@@ -74,6 +122,8 @@ def send_command_input(command_id, input=None, terminate=None, wait="1"):
 def read_file(path, start_line=None, end_line=None):
     """
     Reads the content of a file, optionally within a specific line range.
+    At most READ_FILE_MAX_BYTES are returned per call; a longer range ends with a hint to continue from the next line,
+    and a single line longer than that is cut with a note saying so.
 
     Args:
         path (str): Path to the file (relative to working directory or absolute). (required)
@@ -85,26 +135,27 @@ def read_file(path, start_line=None, end_line=None):
         if not os.path.exists(path):
             return f"Error: File {path} does not exist."
 
-        with open(path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        total_lines = len(lines)
-
-        if start_line is None:
-            start_line = 1
-        if end_line is None:
-            end_line = total_lines
-
-        # Validate ranges
-        if start_line < 1: start_line = 1
-        if end_line > total_lines: end_line = total_lines
-        if start_line > end_line:
-            return f"Error: Start line {start_line} is greater than end line {end_line}."
-
-        # Adjust for 0-based indexing
-        content = "".join(lines[start_line-1:end_line])
-
-        return f"File: {path} (Lines {start_line}-{end_line} of {total_lines})\n{content}"
+        try:
+            content, start_line, last_line, total_lines, truncated, cut_line_bytes = file_reader.read_lines(
+                path, start_line or 1, end_line)
+        except ValueError as e:
+            return f"Error: {e}"
+        if total_lines == 0:
+            return f"File: {path} (empty)\n"
+
+        result = f"File: {path} (Lines {start_line}-{last_line} of {total_lines})\n{content}"
+        if cut_line_bytes is not None:
+            result += (f"\n... [Line {last_line} cut at {READ_FILE_MAX_BYTES} of {cut_line_bytes} bytes; "
+                       f"read_file can't show the rest of it")
+            if last_line < total_lines:
+                result += f". The next line is start_line={last_line + 1}"
+            result += ".]"
+        elif truncated:
+            result += f"\n... [Output limit of {READ_FILE_MAX_BYTES} bytes reached"
+            if last_line < total_lines:
+                result += f"; continue with start_line={last_line + 1}"
+            result += ".]"
+        return result
     except Exception as e:
         return f"Error reading file: {e}"
 
@@ -120,40 +171,217 @@ def write_to_file(path, content):
         path = _resolve_path(path)
         with open(path, "w", encoding="utf-8") as f:
             f.write(content)
+        code_search.file_changed(path)
         return f"Successfully wrote to {path}"
     except Exception as e:
         return f"Error writing to file: {e}"
 
-def edit_file(path, target_text, replacement_text):
+def edit_file(path, target_text=None, replacement_text=None, edits=None):
     """
-    Replaces the first occurrence of `target_text` with `replacement_text` in the file.
+    Replaces text in a file. Pass one `target_text`/`replacement_text` pair, or several edits at once in `edits`.
+    Every target must occur exactly once in the file; targets are matched against the file as it was before
+    this call and must not overlap. If any edit fails, nothing is written. The file is replaced atomically.
 
     Args:
         path (str): Path to the file (relative to working directory or absolute). (required)
-        target_text (str): The exact text block to replace. (required)
-        replacement_text (str): The new text to insert in place of target_text. (required)
+        target_text (str): The exact text block to replace.
+        replacement_text (str): The new text to insert in place of target_text.
+        edits (list[dict]): Several edits, each {"target_text": ..., "replacement_text": ...}, applied together.
     """
     try:
         path = _resolve_path(path)
         if not os.path.exists(path):
             return f"Error: File {path} does not exist."
 
+        if edits is None:
+            if target_text is None or replacement_text is None:
+                return "Error: Provide 'target_text' and 'replacement_text', or 'edits'."
+            edits = [{"target_text": target_text, "replacement_text": replacement_text}]
+        elif target_text is not None or replacement_text is not None:
+            return "Error: Use either 'target_text'/'replacement_text' or 'edits', not both."
+        if not edits:
+            return "Error: 'edits' is empty."
+
         with open(path, "r", encoding="utf-8") as f:
             content = f.read()
 
-        if target_text not in content:
-            return f"Error: Target text not found in {path}. Please ensure exact match including whitespace."
-
-        # Replace only the first occurrence to avoid accidents
-        new_content = content.replace(target_text, replacement_text, 1)
+        new_content, errors = _apply_edits(content, edits)
+        if errors:
+            return (f"Error: No changes made to {path}; {len(errors)} of {len(edits)} edits failed:\n"
+                    + "\n".join(errors))
 
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(new_content)
-
-        return f"Successfully edited {path}"
+        _atomic_write(path, new_content)
+        code_search.file_changed(path)
+        if len(edits) == 1:
+            return f"Successfully edited {path}"
+        return f"Successfully applied {len(edits)} edits to {path}"
     except Exception as e:
         return f"Error editing file: {e}"
 
+
+def _apply_edits(content, edits):
+    """
+    Applies all `edits` to `content` in one pass.
+    Returns (new_content, errors); `errors` lists every edit that can't be applied.
+    """
+    errors = []
+    spans = []
+    for n, edit in enumerate(edits, 1):
+        target = edit.get("target_text") if isinstance(edit, dict) else None
+        replacement = edit.get("replacement_text") if isinstance(edit, dict) else None
+        if not isinstance(target, str) or not target or not isinstance(replacement, str):
+            errors.append(f"- Edit {n}: needs a non-empty 'target_text' and a 'replacement_text' string.")
+            continue
+        pos = content.find(target)
+        if pos < 0:
+            errors.append(f"- Edit {n}: target_text not found. Please ensure exact match including whitespace.")
+            continue
+        again = content.find(target, pos + 1)
+        if again >= 0:
+            lines = [_line_of(content, pos), _line_of(content, again)]
+            occurrences = content.count(target)
+            errors.append(f"- Edit {n}: target_text is ambiguous, it occurs {occurrences} times "
+                          f"(first at lines {lines[0]} and {lines[1]}). Include more surrounding text.")
+            continue
+        spans.append((pos, pos + len(target), replacement, n))
+
+    spans.sort()
+    for (start, end, _, a), (next_start, _, _, b) in zip(spans, spans[1:]):
+        if next_start < end:
+            errors.append(f"- Edits {a} and {b} overlap (line {_line_of(content, next_start)}); "
+                          f"merge them into one edit.")
+    if errors:
+        return None, errors
+
+    parts = []
+    pos = 0
+    for start, end, replacement, _ in spans:
+        parts.append(content[pos:start])
+        parts.append(replacement)
+        pos = end
+    parts.append(content[pos:])
+    return "".join(parts), []
+
+
+def _line_of(content, pos):
+    return content.count("\n", 0, pos) + 1
+
+
+def _atomic_write(path, content):
+    """Writes `content` to a temp file next to `path` and renames it over `path`, keeping its permissions."""
+    # Replace the file a symlink points to, not the link
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+def apply_patch(patch, path=None):
+    """
+    Applies a unified diff (`diff -u` / `git diff` format) to one or more files. Prefer this over rewriting large files.
+    Hunks are located near the line numbers in their `@@` headers but may be offset, and are matched ignoring
+    whitespace or with up to PATCH_MAX_FUZZ context lines missing if the exact text is not found.
+    A `---`/`+++` header with /dev/null creates or deletes a file. Each file may appear once. If any hunk fails, no file is changed.
+
+    Args:
+        patch (str): The unified diff, including `@@ -start,count +start,count @@` hunk headers. (required)
+        path (str): File to patch; needed when the diff has no ---/+++ headers, overrides them for a single-file diff.
+    """
+    try:
+        file_patches = parse_patch(patch)
+    except PatchError as e:
+        return f"Error: {e}"
+    if path and len(file_patches) > 1:
+        return "Error: 'path' can only be used with a diff for a single file."
+
+    planned = []
+    failures = []
+    seen = set()
+    for file_patch in file_patches:
+        target = path or _patch_target(file_patch)
+        if not target:
+            return "Error: The diff has no ---/+++ file headers; pass the file to patch as 'path'."
+        target = _resolve_path(target)
+        if target in seen:
+            failures.append(f"{target}: named more than once in the diff; put all its hunks under one header.")
+            continue
+        seen.add(target)
+        creating = file_patch.old_path is None and not path
+        if creating and os.path.exists(target):
+            failures.append(f"{target}: cannot create, the file already exists.")
+            continue
+        if not creating and not os.path.exists(target):
+            failures.append(f"{target}: file does not exist.")
+            continue
+        lines = []
+        if not creating:
+            with open(target, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines(keepends=True)
+        new_lines, reports = apply_hunks(lines, file_patch.hunks)
+        summary = [f"  hunk {r['hunk']}: {_describe_hunk(r)}" for r in reports]
+        if new_lines is None:
+            failed = sum(1 for r in reports if not r["applied"])
+            failures.append(f"{target}: {failed} of {len(reports)} hunks failed\n" + "\n".join(summary))
+            continue
+        deleting = file_patch.new_path is None and not path
+        if deleting and new_lines:
+            failures.append(f"{target}: not empty after the patch; not deleted.")
+            continue
+        planned.append((target, "".join(new_lines), creating, deleting, summary))
+
+    if failures:
+        return "Error: No changes made.\n" + "\n".join(failures)
+
+    results = []
+    for target, content, creating, deleting, summary in planned:
+        if deleting:
+            os.remove(target)
+            code_search.file_changed(target)
+            results.append(f"Deleted {target}")
+            continue
+        if creating:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "x", encoding="utf-8") as f:
+                f.write(content)
+        else:
+            _atomic_write(target, content)
+        code_search.file_changed(target)
+        results.append(f"Patched {target}: {len(summary)} hunks applied\n" + "\n".join(summary))
+    return "\n".join(results)
+
+
+def _patch_target(file_patch):
+    """Path a diff header names, without git's a/ b/ prefixes."""
+    old, new = file_patch.old_path, file_patch.new_path
+    if file_patch.path is None:
+        return None
+    if (old is None or old.startswith("a/")) and (new is None or new.startswith("b/")):
+        return file_patch.path[2:]
+    return file_patch.path
+
+
+def _describe_hunk(report):
+    if not report["applied"]:
+        return f"FAILED, {report['error']}"
+    notes = []
+    if report["offset"]:
+        notes.append(f"offset {report['offset']:+d} lines")
+    if report["whitespace"]:
+        notes.append("whitespace ignored")
+    if report["fuzz"]:
+        notes.append(f"fuzz {report['fuzz']}")
+    return f"applied at line {report['line']}" + (f" ({', '.join(notes)})" if notes else "")
+
+
 def ls(path="."):
     """
     Lists files in a directory.
@@ -169,43 +397,32 @@ def ls(path="."):
     except Exception as e:
         return f"Error listing directory: {e}"
 
-def grep(pattern, path="."):
+def grep(pattern, path=".", literal=False, ignore_case=False, context=0, max_results=CODE_SEARCH_MAX_RESULTS):
     """
-    SEARCH for pattern in files/directories using system grep/ripgrep.
+    SEARCH file contents for a regular expression (or plain text) under a directory or in a file.
+    Uses an in-process index, so repeated searches are fast. Hidden directories, node_modules and binary files are skipped.
 
     Args:
-        pattern (str): The text pattern to search for. (required)
-        path (str): File or directory path (relative to working directory or absolute).
+        pattern (str): Regular expression (Python syntax) to search for; plain text if `literal` is true. (required)
+        path (str): File or directory path (relative to working directory or absolute). Default is '.'.
+        literal (bool): Treat `pattern` as plain text instead of a regex.
+        ignore_case (bool): Case-insensitive search.
+        context (int): Lines of context to include before and after each match.
+        max_results (int): Maximum number of matching lines to return.
     """
-    import subprocess
     try:
-        path = _resolve_path(path)
-        # Check if it's a file or directory
-        is_dir = os.path.isdir(path)
-
-        # Construct command
-        # -r: recursive (if dir)
-        # -n: line numbers
-        # -I: ignore binary files
-        cmd = ["grep", "-n", "-I", f'"{pattern}"', path]
-        if is_dir:
-            cmd.insert(1, "-r")
-
-        command_str = " ".join(cmd)
-        result = subprocess.run(command_str, shell=True, capture_output=True, text=True, timeout=10)
-
-        if result.returncode == 0:
-            # Limit output length to avoid context overflow
-            output = result.stdout
-            if len(output) > 2000:
-                return output[:2000] + "\n... (truncated)"
-            return output
-        elif result.returncode == 1:
-            return "No matches found."
-        else:
-            return f"Error (code {result.returncode}): {result.stderr}"
+        path = _resolve_path(path or ".")
+        if not os.path.exists(path):
+            return f"Error: Path {path} does not exist."
+        result = code_search.search(pattern, path, literal=literal, ignore_case=ignore_case,
+                                    context=max(0, int(context)), max_results=max(1, int(max_results)))
+    except re.error as e:
+        return f"Error: invalid regular expression: {e}"
     except Exception as e:
         return f"Error during grep: {e}"
+    if not result["matches"]:
+        return "No matches found."
+    return json.dumps(result, ensure_ascii=False)
 
 
 
@@ -228,6 +445,18 @@ available_tools = {
     "read_file": read_file,
     "write_to_file": write_to_file,
     "edit_file": edit_file,
+    "apply_patch": apply_patch,
     "ls": ls,
     "grep": grep
 }
+
+# Schemas always come from the synchronous tool; these share its signature
+async_tools = {
+    "run_command": run_command_async,
+    "command_status": command_status_async,
+    "send_command_input": send_command_input_async,
+}
+
+# Tools with side effects (file writes, commands and their input) run in isolation and in call order,
+# never alongside other calls of the same step
+sequential_tools = {"write_to_file", "edit_file", "apply_patch", "run_command", "send_command_input"}
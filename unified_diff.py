@@ -0,0 +1,233 @@
+import re
+from config import PATCH_MAX_FUZZ
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(Exception):
+    """A patch that can't be parsed."""
+
+
+class Hunk:
+    """One hunk: `ops` are (op, text) pairs with op ' ' (context), '-' or '+', text without line ending."""
+
+    def __init__(self, header, old_start):
+        self.header = header
+        # 1-indexed line the hunk claims to start at; None when the header has no numbers
+        self.old_start = old_start
+        self.ops = []
+        self.old_ends_without_newline = False
+        self.new_ends_without_newline = False
+
+
+class FilePatch:
+    """The hunks for one file. `old_path`/`new_path` are None for /dev/null (creation/deletion)."""
+
+    def __init__(self, old_path, new_path):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.hunks = []
+
+    @property
+    def path(self):
+        return self.new_path if self.new_path is not None else self.old_path
+
+
+def _header_path(line):
+    path = line[4:].split("\t")[0].strip()
+    return None if path == "/dev/null" else path
+
+
+def parse_patch(text: str) -> list:
+    """
+    Parses a unified diff into `FilePatch`es.
+
+    Lenient about what language models tend to get wrong: line counts in
+    hunk headers are ignored (a hunk ends at the next header), headers may
+    omit line numbers ("@@ ... @@"), and an empty line inside a hunk is read
+    as an empty context line. A diff without `---`/`+++` headers yields one
+    `FilePatch` with no paths.
+    """
+    lines = text.splitlines()
+    while lines and not lines[-1].strip():
+        lines.pop()
+
+    patches = []
+    current = None
+    hunk = None
+    last_op = None
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            current = FilePatch(_header_path(line), _header_path(lines[i + 1]))
+            patches.append(current)
+            hunk = None
+            i += 2
+            continue
+        if line.startswith("@@"):
+            if current is None:
+                current = FilePatch(None, None)
+                patches.append(current)
+            match = _HUNK_HEADER.match(line)
+            hunk = Hunk(line, int(match.group(1)) if match else None)
+            current.hunks.append(hunk)
+            last_op = None
+        elif hunk is not None and (line == "" or line[0] in " -+"):
+            op, body = (" ", "") if line == "" else (line[0], line[1:])
+            hunk.ops.append((op, body))
+            last_op = op
+            # A marker only holds while its line stays the last one on that side
+            if op != "-":
+                hunk.new_ends_without_newline = False
+            if op != "+":
+                hunk.old_ends_without_newline = False
+        elif hunk is not None and line.startswith("\\"):
+            # "\ No newline at end of file" refers to the line before it
+            if last_op in (" ", "-"):
+                hunk.old_ends_without_newline = True
+            if last_op in (" ", "+"):
+                hunk.new_ends_without_newline = True
+        else:
+            # "diff --git", "index ...", prose around the diff
+            hunk = None
+        i += 1
+
+    patches = [p for p in patches if p.hunks]
+    if not patches:
+        raise PatchError("No hunks found; expected a unified diff with '@@' hunk headers.")
+    for patch in patches:
+        for n, h in enumerate(patch.hunks, 1):
+            if not any(op != " " for op, _ in h.ops):
+                raise PatchError(f"Hunk {n} ({h.header}) changes nothing.")
+    return patches
+
+
+def _normalize(line):
+    return " ".join(line.split())
+
+
+def _strip_eol(line):
+    return line[:-1] if line.endswith("\n") else line
+
+
+def apply_hunks(lines: list, hunks: list, max_fuzz: int = PATCH_MAX_FUZZ):
+    """
+    Applies `hunks` to `lines` (a file split with line endings kept) in one pass.
+
+    Each hunk is looked for near the line its header names, shifted by how far
+    the previous hunks were off, then anywhere after the previous hunk. If the
+    exact text isn't found, it is retried ignoring whitespace differences, then
+    with up to `max_fuzz` context lines dropped from each end. Context lines are
+    kept as they are in the file; only removed and added lines change.
+
+    Returns:
+        (new_lines, reports): `new_lines` is None if any hunk failed. `reports`
+        has one dict per hunk: "hunk", "applied", and "line", "offset", "fuzz",
+        "whitespace" or "error".
+    """
+    plain = [_strip_eol(line) for line in lines]
+    normalized = None
+    placements = []
+    reports = []
+    floor = 0
+    delta = 0
+    for n, hunk in enumerate(hunks, 1):
+        # Without line numbers a hunk is looked for right after the previous one
+        expected = hunk.old_start - 1 + delta if hunk.old_start else floor
+        found = None
+        for fuzz in range(max_fuzz + 1):
+            ops = _trim_context(hunk.ops, fuzz)
+            if ops is None:
+                break
+            dropped = _leading_context(hunk.ops) - _leading_context(ops)
+            old = [text for op, text in ops if op != "+"]
+            found = _find(plain, old, expected + dropped, floor)
+            whitespace = False
+            if found is None:
+                if normalized is None:
+                    normalized = [_normalize(line) for line in plain]
+                found = _find(normalized, [_normalize(text) for text in old], expected + dropped, floor)
+                whitespace = True
+            if found is not None:
+                break
+        if found is None:
+            after = f" after line {floor}" if floor else ""
+            reports.append({"hunk": n, "applied": False,
+                            "error": f"context not found{after} (expected near line {expected + 1})"})
+            continue
+        placements.append((found, ops, hunk))
+        floor = found + len(old)
+        offset = found - dropped - (hunk.old_start - 1) if hunk.old_start else 0
+        if hunk.old_start:
+            delta = offset
+        reports.append({"hunk": n, "applied": True, "line": found - dropped + 1, "offset": offset,
+                        "fuzz": fuzz, "whitespace": whitespace})
+
+    if not all(report["applied"] for report in reports):
+        return None, reports
+
+    out = []
+    pos = 0
+    for start, ops, hunk in placements:
+        _extend(out, lines[pos:start])
+        cursor = start
+        for op, text in ops:
+            if op == " ":
+                _extend(out, [lines[cursor]])
+                cursor += 1
+            elif op == "-":
+                cursor += 1
+            else:
+                _extend(out, [text + "\n"])
+        if hunk.new_ends_without_newline and cursor == len(lines) and out:
+            out[-1] = _strip_eol(out[-1])
+        pos = cursor
+    _extend(out, lines[pos:])
+    return out, reports
+
+
+def _extend(out, new_lines):
+    for line in new_lines:
+        # A line that used to be the last one may have lost that position
+        if out and not out[-1].endswith("\n"):
+            out[-1] += "\n"
+        out.append(line)
+
+
+def _leading_context(ops):
+    count = 0
+    for op, _ in ops:
+        if op != " ":
+            break
+        count += 1
+    return count
+
+
+def _trim_context(ops, fuzz):
+    """`ops` with up to `fuzz` context lines dropped from each end; None once there is nothing left to drop."""
+    if fuzz == 0:
+        return ops
+    lead = min(fuzz, _leading_context(ops))
+    trail = min(fuzz, _leading_context(reversed(ops)))
+    if lead < fuzz and trail < fuzz:
+        # Dropping more context than the hunk has changes nothing
+        return None
+    return ops[lead:len(ops) - trail]
+
+
+def _find(haystack, needle, expected, floor):
+    """Start of `needle` in `haystack` at or after `floor`, closest to `expected`; None if absent."""
+    size = len(needle)
+    last = len(haystack) - size
+    if last < floor:
+        return None
+    expected = min(max(expected, floor), last)
+    if size == 0:
+        return expected
+    first = needle[0]
+    for distance in range(max(expected - floor, last - expected) + 1):
+        for start in (expected - distance, expected + distance) if distance else (expected,):
+            if floor <= start <= last and haystack[start] == first and haystack[start:start + size] == needle:
+                return start
+    return None